@@ -3,6 +3,11 @@ ASGI config for mastertracker project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the project through this module (e.g. ``uvicorn mastertracker.asgi:application``)
+for live dashboard updates: the /events/ Server-Sent Events stream stays open under ASGI,
+while WSGI servers can only answer it one poll at a time. With several worker processes
+set TRACKER_EVENT_BROKER=database so every stream polls the shared change feed.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
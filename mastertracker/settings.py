@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+import django
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -48,6 +51,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'trackerapp.middleware.SnapshotMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -75,6 +79,11 @@ WSGI_APPLICATION = 'mastertracker.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Select the SQLite tuning profile with TRACKER_DB_PROFILE ('default' or 'production').
+# The production profile keeps connections open between requests and configures
+# SQLite for concurrent readers and writers (see SQLITE_PRAGMAS below).
+TRACKER_DB_PROFILE = os.environ.get('TRACKER_DB_PROFILE', 'default')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -82,6 +91,74 @@ DATABASES = {
     }
 }
 
+# PRAGMA statements run on every new SQLite connection (see trackerapp.signals).
+SQLITE_PRAGMAS = {}
+
+if TRACKER_DB_PROFILE == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': int(os.environ.get('TRACKER_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Seconds the sqlite3 driver waits on a locked database before raising
+            'timeout': 20,
+        },
+    })
+    if django.VERSION >= (5, 1):
+        # Take the write lock when the transaction starts instead of upgrading
+        # a read lock later, which fails immediately with "database is locked"
+        DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,       # negative value is KiB, i.e. 64 MB page cache
+        'mmap_size': 268435456,     # 256 MB memory-mapped I/O
+        'busy_timeout': 20000,      # milliseconds
+        'temp_store': 'MEMORY',
+    }
+
+
+# Live dashboard updates (trackerapp.events). 'local' wakes SSE streams in this process
+# immediately and polls every TRACKER_EVENT_KEEPALIVE seconds; use 'database' when
+# several worker processes serve the app so streams poll the shared change feed.
+TRACKER_EVENT_BROKER = os.environ.get('TRACKER_EVENT_BROKER', 'local')
+TRACKER_EVENT_POLL_INTERVAL = float(os.environ.get('TRACKER_EVENT_POLL_INTERVAL', 2))
+TRACKER_EVENT_KEEPALIVE = 15
+
+# Route the JSON endpoints to trackerapp.async_views. Turn on when serving through
+# mastertracker.asgi; under WSGI each async view costs an extra thread hop.
+TRACKER_ASYNC_VIEWS = os.environ.get('TRACKER_ASYNC_VIEWS', '0') == '1'
+
+# Stream the dashboard (trackerapp.views.demand_list): send the header, legend and
+# timeline first, then the demand rows in chunks as they are computed.
+TRACKER_STREAM_DASHBOARD = os.environ.get('TRACKER_STREAM_DASHBOARD', '0') == '1'
+
+# Static snapshots of the read-only pages (trackerapp.snapshots), written by the
+# publish_snapshots command or job. With TRACKER_SERVE_SNAPSHOTS on, anonymous GETs of
+# those pages are answered from the files, and every write queues a publish job for the
+# workers (run_workers), so pages lag writes until it has run. A front-end server can
+# also serve the directory directly (the .gz files are precompressed), but then the
+# pages' forms get no CSRF cookie, so only do that for read-only viewers.
+TRACKER_SNAPSHOT_DIR = os.environ.get('TRACKER_SNAPSHOT_DIR', BASE_DIR / 'snapshots')
+TRACKER_SERVE_SNAPSHOTS = os.environ.get('TRACKER_SERVE_SNAPSHOTS', '0') == '1'
+
+# Demands the archive_demands command and job move out of the live dashboard
+# (trackerapp.archive): those that reached one of 'stages', and those whose last date
+# is more than 'ended_days' days ago (None turns that rule off).
+TRACKER_ARCHIVE_RULES = {
+    'stages': ['available_for_integration'],
+    'ended_days': int(os.environ.get('TRACKER_ARCHIVE_ENDED_DAYS', 365)),
+}
+
+# Bearer token for the JSON API under api/ (trackerapp.api). When set, API requests
+# must send "Authorization: Bearer <token>" and skip CSRF; when empty, API writes need
+# a CSRF token like the dashboard's forms.
+TRACKER_API_TOKEN = os.environ.get('TRACKER_API_TOKEN', '')
+
+# CACHES is left at Django's default, a local-memory cache per process. That's fine for
+# runserver, but the trackerapp.versioning counters live in the default cache, so a
+# deployment with several worker processes needs a shared one (see
+# mastertracker.settings_production); `manage.py check --deploy` reports it otherwise.
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -0,0 +1,86 @@
+"""
+Production settings for mastertracker: the development settings with the request-path
+costs taken out.
+
+Select them with DJANGO_SETTINGS_MODULE=mastertracker.settings_production. Compare
+the two with `python manage.py bench_settings`.
+
+- DEBUG off: with DEBUG on, every connection keeps each SQL query it runs, and the
+  dashboard runs a lot of them
+- the cached template loader: each template is compiled once per process
+- a cache that all worker processes share. trackerapp.versioning keeps its version
+  counters in the default cache, and a per-process local-memory cache gives each
+  worker its own counters
+- cache-backed sessions: the dashboard stores demand_current_stages in the session on
+  most visits, and those writes leave the database. Cookie sessions aren't used: the
+  dict gains an entry for each demand, and cookies are limited to 4 KB.
+- persistent database connections and the SQLite production pragmas
+  (TRACKER_DB_PROFILE=production)
+- GZip compression of responses
+"""
+
+import os
+
+# settings.py builds DATABASES from the profile when it is imported
+os.environ.setdefault('TRACKER_DB_PROFILE', 'production')
+
+from .settings import *
+
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', SECRET_KEY)
+
+DEBUG = os.environ.get('TRACKER_DEBUG', '0') == '1'
+
+if os.environ.get('TRACKER_ALLOWED_HOSTS'):
+    ALLOWED_HOSTS = os.environ['TRACKER_ALLOWED_HOSTS'].split(',')
+
+# Compress responses before anything else sees the body. Streamed responses are
+# flushed chunk by chunk, and event streams are left uncompressed (see
+# trackerapp.middleware.StreamingGZipMiddleware).
+MIDDLEWARE = [MIDDLEWARE[0], 'trackerapp.middleware.StreamingGZipMiddleware', *MIDDLEWARE[1:]]
+
+TEMPLATES = [{
+    **TEMPLATES[0],
+    # Loaders replace APP_DIRS
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **TEMPLATES[0]['OPTIONS'],
+        'loaders': [
+            ('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ]),
+        ],
+    },
+}]
+
+# Redis when TRACKER_REDIS_URL is set (needs the redis package). Otherwise files under
+# TRACKER_CACHE_DIR, which the worker processes of one host share; the file cache lists
+# its directory on every write, so prefer Redis once there are many thousand sessions.
+TRACKER_REDIS_URL = os.environ.get('TRACKER_REDIS_URL', '')
+TRACKER_CACHE_DIR = os.environ.get('TRACKER_CACHE_DIR', BASE_DIR / 'cache')
+
+
+def _cache(name, max_entries):
+    if TRACKER_REDIS_URL:
+        # Redis evicts by its own memory policy
+        return {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': TRACKER_REDIS_URL,
+            'KEY_PREFIX': name,
+        }
+    return {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(TRACKER_CACHE_DIR, name),
+        'OPTIONS': {'MAX_ENTRIES': max_entries},
+    }
+
+
+CACHES = {
+    'default': _cache('default', 10000),
+    # Sessions in their own cache, so report entries can't push them out; each
+    # session's timeout is its expiry
+    'sessions': _cache('sessions', 100000),
+}
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+SESSION_CACHE_ALIAS = 'sessions'
@@ -1,3 +1,248 @@
-from django.contrib import admin
+"""Admin for inspecting and fixing tracker data
+
+Changelists are written to stay fast with ~1M weekly updates: related demands come in
+with the page query (list_select_related), searches are prefix lookups that use
+demand_name_idx instead of LIKE scans, the date hierarchy reads the date indexes, the
+unfiltered total count is skipped (show_full_result_count=False), and a demand's
+weekly updates are shown a page at a time. Actions change data with QuerySet.update()
+rather than a save() per row.
+"""
+from datetime import timedelta
+
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db.models import QuerySet, Subquery
+from django.forms.models import BaseInlineFormSet
+
+from . import archive
+from .bulk import data_changed
+from .maintenance import stage_number_case
+from .models import Demand, DemandStagePeriod, WeeklyUpdate
+
+# Highest code point; name >= term and name < term + this is a prefix match on the index
+_PREFIX_END = '\U0010ffff'
+
+
+def _demands_matching(search_term):
+    """Demands whose id is `search_term`, or whose name starts with it (case-sensitive)
+
+    LIKE and icontains can't use demand_name_idx on SQLite, so the prefix is a range
+    over the indexed name instead.
+    """
+    search_term = search_term.strip()
+    if search_term.isdigit():
+        return Demand.objects.filter(id=int(search_term))
+    return Demand.objects.filter(name__gte=search_term, name__lt=search_term + _PREFIX_END)
+
+
+class DemandSearchMixin:
+    """Search by demand id or name prefix; `demand_field` is the path to the demand"""
+
+    demand_field = 'demand'
+    search_help_text = 'Demand id, or the start of the demand name (case-sensitive).'
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        demands = _demands_matching(search_term)
+        if self.demand_field == 'pk':
+            return queryset & demands, False
+        return queryset.filter(**{f'{self.demand_field}__in': Subquery(demands.values('id'))}), False
+
+
+class IndexedDatesQuerySet(QuerySet):
+    """QuerySet whose dates() reads the distinct stored dates and truncates them in Python
+
+    The date hierarchy calls dates(), which on SQLite runs django_date_trunc() on every
+    row; DISTINCT on the indexed date column reads the index instead. Returns a list
+    rather than a QuerySet, which is all the date hierarchy needs.
+    """
+
+    def dates(self, field_name, kind, order='ASC'):
+        days = self.order_by(field_name).values_list(field_name, flat=True).distinct()
+        truncated = set()
+        for day in days:
+            if day is None:
+                continue
+            if kind == 'year':
+                day = day.replace(month=1, day=1)
+            elif kind == 'month':
+                day = day.replace(day=1)
+            elif kind == 'week':
+                day -= timedelta(days=day.weekday())
+            truncated.add(day)
+        return sorted(truncated, reverse=order == 'DESC')
+
+
+class IndexedDateHierarchyMixin:
+    """Serve date_hierarchy (an indexed DateField) from IndexedDatesQuerySet"""
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return IndexedDatesQuerySet(model=queryset.model, query=queryset.query, using=queryset.db)
+
+
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """Inline formset that holds one page of the related objects instead of all of them"""
+
+    per_page = 20
+    page_param = 'page'
+    # request.GET of the change view, set by PaginatedInline.get_formset
+    query = None
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            self.page = Paginator(super().get_queryset(), self.per_page).get_page(
+                self.query.get(self.page_param) if self.query else 1
+            )
+            self._queryset = self.page.object_list
+        return self._queryset
+
+    def page_links(self):
+        """(page number or '…', query string or None) for the pager under the inline"""
+        self.get_queryset()
+        links = []
+        for number in self.page.paginator.get_elided_page_range(self.page.number):
+            if number == self.page.paginator.ELLIPSIS or number == self.page.number:
+                links.append((number, None))
+            else:
+                query = self.query.copy()
+                query[self.page_param] = number
+                links.append((number, query.urlencode()))
+        return links
+
+
+class PaginatedInline(admin.TabularInline):
+    """Tabular inline showing `per_page` related objects per page, paged with ?`page_param`="""
+
+    formset = PaginatedInlineFormSet
+    template = 'admin/trackerapp/paginated_tabular.html'
+    per_page = 20
+    page_param = 'page'
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.per_page = self.per_page
+        formset.page_param = self.page_param
+        formset.query = request.GET
+        return formset
+
+
+class WeeklyUpdateInline(PaginatedInline):
+    model = WeeklyUpdate
+    fields = ('week_number', 'week_start_date', 'week_end_date', 'current_stage', 'progress_percentage')
+    # The full texts are edited on the weekly update's own page
+    show_change_link = True
+    page_param = 'weekly_page'
+    extra = 0
+
+    def get_queryset(self, request):
+        # Each row's label is str(update), which reads the demand's name
+        return super().get_queryset(request).select_related('demand').defer(*WeeklyUpdate.FULL_TEXT_FIELDS)
+
+
+class DemandStagePeriodInline(admin.TabularInline):
+    model = DemandStagePeriod
+    fields = ('stage', 'start_date', 'end_date')
+    extra = 0
+
+
+class ArchivedFilter(admin.SimpleListFilter):
+    title = 'archived'
+    parameter_name = 'archived'
+
+    def lookups(self, request, model_admin):
+        return (('no', 'Active'), ('yes', 'Archived'))
+
+    def queryset(self, request, queryset):
+        if self.value() == 'no':
+            return queryset.active()
+        if self.value() == 'yes':
+            return queryset.archived()
+        return queryset
+
+
+@admin.register(Demand)
+class DemandAdmin(DemandSearchMixin, admin.ModelAdmin):
+    list_display = (
+        'id', 'name', 'demand_ID', 'file_type', 'file_subtype', 'start_date', 'duration_months',
+        'demand_amount', 'is_archived',
+    )
+    list_display_links = ('id', 'name')
+    list_filter = (ArchivedFilter, 'file_type')
+    search_fields = ('name',)
+    demand_field = 'pk'
+    date_hierarchy = 'start_date'
+    show_full_result_count = False
+    list_per_page = 100
+    readonly_fields = ('created_at', 'archived_at')
+    inlines = (DemandStagePeriodInline, WeeklyUpdateInline)
+    actions = ('archive_selected', 'restore_selected')
+
+    @admin.display(boolean=True, description='Archived', ordering='archived_at')
+    def is_archived(self, demand):
+        return demand.archived_at is not None
+
+    @admin.action(description='Archive selected demands')
+    def archive_selected(self, request, queryset):
+        changed = archive.archive(queryset.values_list('id', flat=True))
+        self.message_user(request, f'Archived {len(changed)} demands.', messages.SUCCESS)
+
+    @admin.action(description='Restore selected demands to the dashboard')
+    def restore_selected(self, request, queryset):
+        changed = archive.restore(queryset.values_list('id', flat=True))
+        self.message_user(request, f'Restored {len(changed)} demands.', messages.SUCCESS)
+
+
+@admin.register(DemandStagePeriod)
+class DemandStagePeriodAdmin(IndexedDateHierarchyMixin, DemandSearchMixin, admin.ModelAdmin):
+    list_display = ('id', 'demand', 'stage', 'stage_number', 'start_date', 'end_date', 'duration_in_days')
+    list_select_related = ('demand',)
+    list_filter = ('stage',)
+    search_fields = ('demand__name',)
+    date_hierarchy = 'start_date'
+    ordering = ('-start_date', '-id')
+    show_full_result_count = False
+    list_per_page = 100
+    raw_id_fields = ('demand',)
+    actions = ('renumber_stages',)
+
+    @admin.action(description='Recompute stage numbers of selected periods')
+    def renumber_stages(self, request, queryset):
+        demand_ids = set(queryset.values_list('demand_id', flat=True))
+        count = queryset.update(stage_number=stage_number_case('stage'))
+        data_changed(demand_ids)
+        self.message_user(request, f'Renumbered {count} stage periods.', messages.SUCCESS)
+
+
+@admin.register(WeeklyUpdate)
+class WeeklyUpdateAdmin(IndexedDateHierarchyMixin, DemandSearchMixin, admin.ModelAdmin):
+    list_display = (
+        'id', 'demand', 'week_number', 'week_start_date', 'current_stage', 'progress_percentage',
+        'challenges_preview', 'achievements_preview',
+    )
+    list_select_related = ('demand',)
+    list_filter = ('current_stage',)
+    search_fields = ('demand__name',)
+    date_hierarchy = 'week_start_date'
+    ordering = ('-week_start_date', '-id')
+    show_full_result_count = False
+    list_per_page = 100
+    raw_id_fields = ('demand',)
+    readonly_fields = ('created_at', 'updated_at')
+    actions = ('renumber_stages',)
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if request.resolver_match and request.resolver_match.url_name.endswith('_changelist'):
+            # The list shows the previews; the full texts only load on the change page
+            queryset = queryset.defer(*WeeklyUpdate.FULL_TEXT_FIELDS)
+        return queryset
+
+    @admin.action(description='Recompute stage numbers of selected updates')
+    def renumber_stages(self, request, queryset):
+        demand_ids = set(queryset.values_list('demand_id', flat=True))
+        count = queryset.update(stage_number=stage_number_case('current_stage'))
+        data_changed(demand_ids)
+        self.message_user(request, f'Renumbered {count} weekly updates.', messages.SUCCESS)
 
-# Register your models here.
@@ -0,0 +1,418 @@
+"""JSON API for demands, stage periods and weekly updates
+
+Integrations sync from here instead of scraping the dashboard:
+
+    GET    api/<resource>/          a page of rows in id order
+    POST   api/<resource>/          create a JSON list of rows in one transaction
+    PATCH  api/<resource>/          update a JSON list of rows (each with its id) in one transaction
+    GET    api/<resource>/<id>/     one row
+    PATCH  api/<resource>/<id>/     update one row
+    DELETE api/<resource>/<id>/     delete one row
+
+where <resource> is demands, stages or weekly-updates. Lists take:
+
+    cursor=<id>         rows after this id; each page gives the next one as next_cursor
+    limit=<n>           rows per page, up to MAX_PAGE_SIZE
+    fields=a,b          only these fields (the id is always included), read with QuerySet.only()
+    since=<event id>    only rows of demands changed after this change event, plus the ids
+                        deleted since; pass the event_id of the first page of the last sync
+    demand, file_type, file_subtype, stage, archived
+                        the dashboard's filters; archived defaults to false, as on the dashboard
+
+Writes go through the page forms and the model signals, so rollups, stats, stage
+history and change events stay as they would after an edit on the dashboard.
+
+Responses carry an ETag built from the cache versions in trackerapp.versioning and a
+hash of the query string, so each page, filter and fields variant has its own. After
+authorization, If-None-Match is answered with 304 before any other query, and If-Match
+on a write is refused with 412 once the row (or, for lists, any tracker data) has
+changed; writes compare the versions only, so the ETag of any read of the same data
+passes. With several worker processes the versions need a shared cache backend.
+
+With settings.TRACKER_API_TOKEN set, every request needs an "Authorization: Bearer
+<token>" header and CSRF is not checked; otherwise reads are open like the dashboard
+and writes need a CSRF token like its forms.
+"""
+import hashlib
+import json
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils.crypto import constant_time_compare
+from django.utils.http import parse_etags
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
+
+from .forms import DemandApiForm, DemandStagePeriodForm, WeeklyUpdateApiForm
+from .models import ChangeEvent, Demand, DemandStagePeriod, Stage, WeeklyUpdate
+from .versioning import data_version, demand_version
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Rows per bulk create or update request
+MAX_BULK_SIZE = 500
+
+
+class Resource:
+    """How one model is listed, filtered, serialized and written through the API
+
+    fields are the readable field names; columns maps the ones that aren't a model field
+    of the same name to the fields .only() should load, and attributes to what is read
+    off the instance. demand_path is the lookup from the model to its demand ('' for
+    Demand itself).
+    """
+
+    def __init__(self, model, form, fields, demand_path, deleted_kind, deleted_key,
+                 stage_field=None, columns=None, attributes=None, form_takes_demand=False):
+        self.model = model
+        self.form = form
+        self.fields = fields
+        self.demand_path = demand_path
+        self.deleted_kind = deleted_kind
+        self.deleted_key = deleted_key
+        self.stage_field = stage_field
+        self.columns = columns or {}
+        self.attributes = attributes or {}
+        self.form_takes_demand = form_takes_demand
+
+    @property
+    def writable(self):
+        return list(self.form.base_fields)
+
+    def lookup(self, name):
+        return f'{self.demand_path}__{name}' if self.demand_path else name
+
+    @property
+    def demand_id_field(self):
+        return 'demand_id' if self.demand_path else 'id'
+
+    def serialize(self, obj, fields):
+        return {name: getattr(obj, self.attributes.get(name, name)) for name in fields}
+
+
+RESOURCES = {
+    'demands': Resource(
+        Demand, DemandApiForm,
+        fields=(
+            'id', 'name', 'demand_ID', 'file_type', 'file_subtype', 'file_detail', 'demand_amount', 'io_name',
+            'start_date', 'duration_months', 'weekly_start_date', 'weekly_end_date', 'selected_stages',
+            'created_at', 'archived_at',
+        ),
+        demand_path='',
+        deleted_kind=ChangeEvent.Kind.DEMAND_DELETED,
+        deleted_key=None,
+        columns={'selected_stages': 'selected_stages_mask'},
+    ),
+    'stages': Resource(
+        DemandStagePeriod, DemandStagePeriodForm,
+        fields=('id', 'demand', 'stage', 'stage_number', 'start_date', 'end_date'),
+        demand_path='demand',
+        deleted_kind=ChangeEvent.Kind.STAGE_DELETED,
+        deleted_key='stage_id',
+        stage_field='stage',
+        attributes={'demand': 'demand_id'},
+    ),
+    'weekly-updates': Resource(
+        WeeklyUpdate, WeeklyUpdateApiForm,
+        fields=(
+            'id', 'demand', 'week_number', 'week_start_date', 'week_end_date', 'current_stage', 'stage_number',
+            'progress_percentage', 'challenges', 'achievements', 'next_week_plan', 'created_at', 'updated_at',
+        ),
+        demand_path='demand',
+        deleted_kind=ChangeEvent.Kind.WEEKLY_UPDATE_DELETED,
+        deleted_key='update_id',
+        stage_field='current_stage',
+        attributes={'demand': 'demand_id'},
+        form_takes_demand=True,
+    ),
+}
+
+
+class ApiError(Exception):
+    def __init__(self, error, status=400, **extra):
+        super().__init__(error)
+        self.response = JsonResponse({'success': False, 'error': error, **extra}, status=status)
+
+
+def _resource(name):
+    try:
+        return RESOURCES[name]
+    except KeyError:
+        raise Http404(f'No API resource {name}')
+
+
+def _authorize(request):
+    token = getattr(settings, 'TRACKER_API_TOKEN', '')
+    if token:
+        scheme, _, given = request.headers.get('Authorization', '').partition(' ')
+        if scheme != 'Bearer' or not constant_time_compare(given, token):
+            raise ApiError('Missing or invalid API token', status=401)
+    elif request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        rejected = CsrfViewMiddleware(lambda request: None).process_view(request, None, (), {})
+        if rejected:
+            raise ApiError('CSRF verification failed', status=403)
+
+
+def _authorized(view):
+    # Authorize before the ETag conditions, so a client without access can't probe validators
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            _authorize(request)
+        except ApiError as exc:
+            return exc.response
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _int_param(request, name, default=None):
+    value = request.GET.get(name)
+    if value in (None, ''):
+        return default
+    if not value.isdigit():
+        raise ApiError(f'{name} must be a non-negative integer')
+    return int(value)
+
+
+def _selected_fields(request, resource):
+    # Field names to return and the model fields .only() loads for them
+    requested = request.GET.get('fields')
+    if not requested:
+        fields = list(resource.fields)
+    else:
+        fields = ['id'] + [name for name in dict.fromkeys(requested.split(',')) if name and name != 'id']
+        unknown = [name for name in fields if name not in resource.fields]
+        if unknown:
+            raise ApiError(f"Unknown fields: {', '.join(unknown)}", fields=list(resource.fields))
+    return fields, [resource.columns.get(name, name) for name in fields]
+
+
+def _filtered(request, resource):
+    """The resource's queryset with the dashboard filters from the query string applied"""
+    queryset = resource.model.objects.all()
+
+    demand_ids = request.GET.get('demand')
+    if demand_ids:
+        ids = demand_ids.split(',')
+        if not all(demand_id.isdigit() for demand_id in ids):
+            raise ApiError('demand must be a comma-separated list of demand ids')
+        queryset = queryset.filter(**{f'{resource.demand_id_field}__in': [int(demand_id) for demand_id in ids]})
+
+    for name in ('file_type', 'file_subtype'):
+        if request.GET.get(name):
+            queryset = queryset.filter(**{resource.lookup(name): request.GET[name]})
+
+    stage = request.GET.get('stage')
+    if stage:
+        if stage not in Stage.values:
+            raise ApiError(f'Unknown stage {stage}')
+        # Demands: those with the stage selected; stage periods and updates: those in it
+        queryset = queryset.with_stage(stage) if resource.stage_field is None else queryset.filter(**{resource.stage_field: stage})
+
+    archived = request.GET.get('archived', 'false')
+    if archived == 'false':
+        queryset = queryset.filter(**{resource.lookup('archived_at__isnull'): True})
+    elif archived == 'true':
+        queryset = queryset.filter(**{resource.lookup('archived_at__isnull'): False})
+    elif archived != 'all':
+        raise ApiError('archived must be true, false or all')
+    return queryset
+
+
+def _changes_since(resource, since, latest):
+    """(ids of demands changed in events since+1..latest, ids of rows deleted in them)"""
+    oldest = ChangeEvent.objects.order_by('id').values_list('id', flat=True).first()
+    if oldest is not None and since + 1 < oldest:
+        # Events since then were pruned (trackerapp.events.EVENT_RETENTION)
+        raise ApiError('since is older than the retained change events; sync again without since', status=410)
+
+    changes = ChangeEvent.objects.filter(id__gt=since, id__lte=latest)
+    deleted = changes.filter(kind=resource.deleted_kind).values_list(
+        f'payload__{resource.deleted_key}' if resource.deleted_key else 'demand_id', flat=True
+    )
+    return changes.values('demand_id'), sorted(set(deleted))
+
+
+def _list(request, resource):
+    fields, columns = _selected_fields(request, resource)
+    limit = min(_int_param(request, 'limit', DEFAULT_PAGE_SIZE) or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    cursor = _int_param(request, 'cursor')
+    since = _int_param(request, 'since')
+
+    # Read before the rows so a change made meanwhile is picked up by the next sync
+    latest = ChangeEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    queryset = _filtered(request, resource)
+    payload = {'success': True, 'event_id': latest}
+    if since is not None:
+        changed, deleted = _changes_since(resource, since, latest)
+        queryset = queryset.filter(**{f'{resource.demand_id_field}__in': changed})
+        if cursor is None:
+            payload['deleted'] = deleted
+    if cursor is not None:
+        queryset = queryset.filter(id__gt=cursor)
+
+    rows = list(queryset.only(*columns).order_by('id')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    payload['items'] = [resource.serialize(row, fields) for row in rows]
+    payload['next_cursor'] = rows[-1].id if has_more else None
+    return JsonResponse(payload)
+
+
+def _read_json(request):
+    try:
+        return json.loads(request.body or b'null')
+    except (ValueError, UnicodeDecodeError):
+        raise ApiError('Request body is not valid JSON')
+
+
+def _demand_id(value):
+    # Demand ids may come as JSON numbers or strings
+    return int(value) if isinstance(value, int) or (isinstance(value, str) and value.isdigit()) else None
+
+
+def _demands_for(resource, items, instances=()):
+    # The demand each form validates against (WeeklyUpdateForm limits stages to the demand's)
+    if not resource.form_takes_demand:
+        return {}
+    ids = {_demand_id(item.get('demand')) for item in items} | {instance.demand_id for instance in instances}
+    return Demand.objects.in_bulk([demand_id for demand_id in ids if demand_id is not None])
+
+
+def _form(resource, data, demands, instance=None):
+    kwargs = {'instance': instance}
+    if resource.form_takes_demand:
+        kwargs['demand'] = demands.get(_demand_id(data.get('demand')))
+    return resource.form(data=data, **kwargs)
+
+
+def _save_forms(forms):
+    # All rows or none: validation errors are reported per item of the request body
+    errors = {index: form.errors.get_json_data() for index, form in enumerate(forms) if not form.is_valid()}
+    if errors:
+        raise ApiError('Validation failed', errors=errors)
+    with transaction.atomic():
+        return [form.save() for form in forms]
+
+
+def _items(request):
+    items = _read_json(request)
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise ApiError('Request body must be a JSON list of objects')
+    if len(items) > MAX_BULK_SIZE:
+        raise ApiError(f'At most {MAX_BULK_SIZE} rows per request')
+    return items
+
+
+def _writable_data(resource, instance, changes):
+    # Fields left out keep their stored (or, for new rows, default) values, so PATCH only
+    # needs the changed ones
+    data = resource.serialize(instance or resource.model(), resource.writable)
+    data.update((name, value) for name, value in changes.items() if name in resource.writable)
+    return data
+
+
+def _create(request, resource):
+    items = _items(request)
+    demands = _demands_for(resource, items)
+    saved = _save_forms([_form(resource, _writable_data(resource, None, item), demands) for item in items])
+    return JsonResponse({'success': True, 'items': [resource.serialize(obj, resource.fields) for obj in saved]}, status=201)
+
+
+def _update(request, resource):
+    items = _items(request)
+    if not all(isinstance(item.get('id'), int) for item in items):
+        raise ApiError('Every row needs its integer id')
+    instances = resource.model.objects.in_bulk([item['id'] for item in items])
+    missing = [item['id'] for item in items if item['id'] not in instances]
+    if missing:
+        raise ApiError('Not found', status=404, ids=missing)
+
+    demands = _demands_for(resource, items, instances.values())
+    forms = []
+    for item in items:
+        instance = instances[item['id']]
+        forms.append(_form(resource, _writable_data(resource, instance, item), demands, instance))
+    saved = _save_forms(forms)
+    return JsonResponse({'success': True, 'items': [resource.serialize(obj, resource.fields) for obj in saved]})
+
+
+def _etag(request, version):
+    """The ETag for `version`: for reads with a hash of the query string added, for writes
+    the If-Match validator whose version part equals it, if any"""
+    if request.method in ('GET', 'HEAD'):
+        query = urlencode(sorted(request.GET.items()))
+        return f'{version}-{hashlib.sha1(query.encode()).hexdigest()[:12]}' if query else version
+    for etag in parse_etags(request.headers.get('If-Match', '')):
+        if etag.strip('"') == version or etag.strip('"').startswith(f'{version}-'):
+            return etag
+    return version
+
+
+def _collection_etag(request, resource):
+    return _etag(request, f'{resource}-{data_version()}')
+
+
+def _item_etag(request, resource, pk):
+    resource = RESOURCES.get(resource)
+    if resource is None:
+        return None
+    if resource.model is Demand:
+        demand_id = pk
+    else:
+        demand_id = resource.model.objects.filter(pk=pk).values_list('demand_id', flat=True).first()
+        if demand_id is None:
+            return None
+    return _etag(request, f'{resource.model._meta.model_name}-{pk}-{demand_version(demand_id)}')
+
+
+@csrf_exempt
+@_authorized
+@condition(etag_func=_collection_etag)
+def collection(request, resource):
+    """List (GET), bulk create (POST) or bulk update (PATCH) one resource"""
+    resource = _resource(resource)
+    try:
+        if request.method in ('GET', 'HEAD'):
+            return _list(request, resource)
+        if request.method == 'POST':
+            return _create(request, resource)
+        if request.method == 'PATCH':
+            return _update(request, resource)
+        raise ApiError('Method not allowed', status=405)
+    except ApiError as exc:
+        return exc.response
+
+
+@csrf_exempt
+@_authorized
+@condition(etag_func=_item_etag)
+def item(request, resource, pk):
+    """Read (GET), update (PATCH) or delete (DELETE) one row"""
+    resource = _resource(resource)
+    try:
+        fields, columns = _selected_fields(request, resource)
+        obj = resource.model.objects.only(*columns).filter(pk=pk).first()
+        if obj is None:
+            raise ApiError('Not found', status=404)
+
+        if request.method in ('GET', 'HEAD'):
+            return JsonResponse({'success': True, 'item': resource.serialize(obj, fields)})
+        if request.method == 'PATCH':
+            changes = _read_json(request)
+            if not isinstance(changes, dict):
+                raise ApiError('Request body must be a JSON object')
+            obj = resource.model.objects.get(pk=pk)
+            demands = _demands_for(resource, [changes], [obj])
+            [obj] = _save_forms([_form(resource, _writable_data(resource, obj, changes), demands, obj)])
+            return JsonResponse({'success': True, 'item': resource.serialize(obj, resource.fields)})
+        if request.method == 'DELETE':
+            resource.model.objects.get(pk=pk).delete()
+            return JsonResponse({'success': True})
+        raise ApiError('Method not allowed', status=405)
+    except ApiError as exc:
+        return exc.response
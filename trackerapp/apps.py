@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class TrackerappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'trackerapp'
+
+    def ready(self):
+        # Register signal handlers and system checks
+        from . import checks, signals  # noqa: F401
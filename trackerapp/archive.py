@@ -0,0 +1,115 @@
+"""Archiving finished demands out of the live dashboard
+
+Archived demands keep all their stage periods and weekly updates, but the dashboard
+reads Demand.objects.active(), so its cost follows the active portfolio only. The
+archive_demands command (or job) archives the demands matched by
+settings.TRACKER_ARCHIVE_RULES; archived_demands lists them a page at a time.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from . import bulk
+from .events import publish_many
+from .models import ChangeEvent, Demand, DemandStagePeriod, WeeklyUpdate
+
+# Demands per UPDATE statement and per chunk read by the ended rule
+BATCH_SIZE = 500
+
+DEFAULT_RULES = {
+    # Demands with a stage period or weekly update in any of these stages
+    'stages': ['available_for_integration'],
+    # Demands whose last date (end date, stage period or weekly update) is this many days ago; None turns it off
+    'ended_days': 365,
+}
+
+
+def archive_rules():
+    """DEFAULT_RULES overridden by settings.TRACKER_ARCHIVE_RULES"""
+    return {**DEFAULT_RULES, **getattr(settings, 'TRACKER_ARCHIVE_RULES', {})}
+
+
+def reached_stage_ids(stages):
+    """Ids of active demands with a stage period or weekly update in one of `stages`"""
+    return set(
+        Demand.objects.active()
+        .filter(
+            Exists(DemandStagePeriod.objects.filter(demand=OuterRef('pk'), stage__in=stages))
+            | Exists(WeeklyUpdate.objects.filter(demand=OuterRef('pk'), current_stage__in=stages))
+        )
+        .values_list('id', flat=True)
+    )
+
+
+def ended_ids(cutoff):
+    """Ids of active demands whose dates all fall before `cutoff`
+
+    Stage periods and weekly updates are checked in SQL; the end date computed from
+    start_date and duration_months is checked here, for the demands that remain.
+    Demands without any date are never matched.
+    """
+    candidates = (
+        Demand.objects.active()
+        .exclude(start_date__gte=cutoff)
+        .exclude(Exists(DemandStagePeriod.objects.filter(demand=OuterRef('pk'), end_date__gte=cutoff)))
+        .exclude(Exists(WeeklyUpdate.objects.filter(demand=OuterRef('pk'), week_end_date__gte=cutoff)))
+        .annotate(
+            has_stages=Exists(DemandStagePeriod.objects.filter(demand=OuterRef('pk'))),
+            has_updates=Exists(WeeklyUpdate.objects.filter(demand=OuterRef('pk'))),
+        )
+        .order_by()
+        .values_list('id', 'start_date', 'duration_months', 'has_stages', 'has_updates')
+    )
+    matched = set()
+    for demand_id, start_date, duration_months, has_stages, has_updates in candidates.iterator(chunk_size=BATCH_SIZE):
+        if start_date:
+            end_date = Demand(start_date=start_date, duration_months=duration_months).get_end_date() or start_date
+            if end_date < cutoff:
+                matched.add(demand_id)
+        elif has_stages or has_updates:
+            matched.add(demand_id)
+    return matched
+
+
+def archive_candidates(rules=None, today=None):
+    """{rule name: set of demand ids} for the active demands each rule matches"""
+    rules = rules or archive_rules()
+    today = today or timezone.localdate()
+    matched = {}
+    if rules.get('stages'):
+        matched['stages'] = reached_stage_ids(rules['stages'])
+    if rules.get('ended_days') is not None:
+        matched['ended_days'] = ended_ids(today - timedelta(days=rules['ended_days']))
+    return matched
+
+
+def _set_archived(demand_ids, archived_at):
+    # Returns the ids whose status changed; open dashboards drop or add their rows on the event
+    demand_ids = sorted(demand_ids)
+    changed = []
+    with transaction.atomic():
+        for start in range(0, len(demand_ids), BATCH_SIZE):
+            demands = Demand.objects.filter(id__in=demand_ids[start:start + BATCH_SIZE])
+            demands = demands.active() if archived_at else demands.archived()
+            batch = list(demands.values_list('id', flat=True))
+            Demand.objects.filter(id__in=batch).update(archived_at=archived_at)
+            changed.extend(batch)
+        publish_many((ChangeEvent.Kind.DEMAND_ARCHIVED, demand_id, {'archived': archived_at is not None}) for demand_id in changed)
+    if changed:
+        # QuerySet.update() skips the signals that bump the cache versions (the API's item
+        # ETags and the gantt cache read the per-demand ones)
+        bulk.data_changed(changed)
+    return changed
+
+
+def archive(demand_ids):
+    """Archive the given demands; returns the ids that weren't archived already"""
+    return _set_archived(demand_ids, timezone.now())
+
+
+def restore(demand_ids):
+    """Put archived demands back on the dashboard; returns the ids that were archived"""
+    return _set_archived(demand_ids, None)
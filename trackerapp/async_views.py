@@ -0,0 +1,130 @@
+"""Async versions of the tracker's JSON endpoints, for serving through mastertracker.asgi
+
+Each view matches the response of its namesake in trackerapp.views but awaits the
+async ORM, so a slow query doesn't hold a worker thread. trackerapp.urls routes to
+these when TRACKER_ASYNC_VIEWS is on.
+"""
+from datetime import datetime, date
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.shortcuts import aget_object_or_404
+
+from . import forecast
+from .models import Demand, WeeklyUpdate
+from .views import (
+    _debug_stage_info, _forecast_payload, _group_trend_rows, _snapshot_payload, _snapshot_rows,
+    _trend_rows, _trends_payload, _weekly_update_text,
+)
+
+
+async def update_weekly_dates(request):
+    """Handle AJAX request to update weekly start and end dates for a demand"""
+    if request.method == 'POST' and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        try:
+            demand_id = request.POST.get('demand_id')
+            weekly_start_date = request.POST.get('weekly_start_date')
+            weekly_end_date = request.POST.get('weekly_end_date')
+
+            if not demand_id or not weekly_start_date or not weekly_end_date:
+                return JsonResponse({'success': False, 'error': 'Missing required fields'})
+
+            demand = await aget_object_or_404(Demand, id=demand_id)
+
+            # Convert string dates to date objects
+            start_date = datetime.strptime(weekly_start_date, '%Y-%m-%d').date()
+            end_date = datetime.strptime(weekly_end_date, '%Y-%m-%d').date()
+
+            if start_date > end_date:
+                return JsonResponse({'success': False, 'error': 'Start date cannot be after end date'})
+
+            # Update the demand with new weekly dates
+            demand.weekly_start_date = start_date
+            demand.weekly_end_date = end_date
+            await demand.asave()
+
+            return JsonResponse({'success': True})
+
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Invalid date format'})
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+
+    return JsonResponse({'success': False, 'error': 'Invalid request method'})
+
+
+async def _update_demand_field(request, field, value_required, missing_error):
+    # Shared body of the weekly stage/progress/challenge endpoints
+    if request.method == 'POST' and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        try:
+            demand_id = request.POST.get('demand_id')
+            value = request.POST.get(field)
+
+            if not demand_id or (value_required and not value):
+                return JsonResponse({'success': False, 'error': missing_error})
+
+            demand = await aget_object_or_404(Demand, id=demand_id)
+
+            setattr(demand, field, value)
+            await demand.asave()
+
+            return JsonResponse({'success': True})
+
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)})
+
+    return JsonResponse({'success': False, 'error': 'Invalid request method'})
+
+
+async def update_weekly_stage(request):
+    """Handle AJAX request to update weekly stage for a demand"""
+    return await _update_demand_field(request, 'weekly_update_stage', True, 'Missing required fields')
+
+
+async def update_weekly_progress(request):
+    """Handle AJAX request to update weekly progress for a demand"""
+    return await _update_demand_field(request, 'weekly_update_progress', False, 'Missing demand ID')
+
+
+async def update_weekly_challenge(request):
+    """Handle AJAX request to update weekly challenge for a demand"""
+    return await _update_demand_field(request, 'weekly_update_challenge', False, 'Missing demand ID')
+
+
+async def weekly_update_text(request, update_id):
+    """Full text of a weekly update, fetched when a dashboard row's "View More" is first clicked"""
+    weekly_update = await aget_object_or_404(WeeklyUpdate.objects.only('id', *WeeklyUpdate.FULL_TEXT_FIELDS), id=update_id)
+    return JsonResponse(_weekly_update_text(weekly_update))
+
+
+async def debug_demand_stages(request, demand_id):
+    """Debug view to see what's in a demand's selected_stages field"""
+    demand = await aget_object_or_404(Demand, id=demand_id)
+    return JsonResponse(_debug_stage_info(demand))
+
+
+async def portfolio_snapshot(request):
+    """JSON view of every demand's stage as of ?date=YYYY-MM-DD (defaults to today)"""
+    date_str = request.GET.get('date')
+    try:
+        on_date = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else date.today()
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid date format'}, status=400)
+
+    demands = [d async for d in _snapshot_rows(on_date)]
+    return JsonResponse(_snapshot_payload(on_date, demands))
+
+
+async def trends_data(request):
+    """JSON version of the trends page for charts"""
+    file_type = request.GET.get('file_type', 'all')
+    weeks, stages = _group_trend_rows([row async for row in _trend_rows(file_type)])
+    return JsonResponse(_trends_payload(file_type, weeks, stages))
+
+
+async def portfolio_forecast_data(request):
+    """JSON version of the forecast page"""
+    file_type = request.GET.get('file_type', 'all')
+    # The forecast is one cached pass over several tables; run it off the event loop
+    forecasts = await sync_to_async(forecast.portfolio_forecast)()
+    return JsonResponse(_forecast_payload(file_type, forecasts))
@@ -0,0 +1,244 @@
+"""Chunked backup and restore of the tracker tables
+
+A backup is a gzip-compressed JSON Lines file. The first line is a header, then
+each model is a line naming its columns followed by one JSON array per row:
+
+    {"format": "trackerapp-backup", "version": 1, "created_at": "..."}
+    {"model": "trackerapp.demand", "fields": ["id", "name", ...]}
+    [1, "Demand A", ...]
+    {"model": "trackerapp.demandstageperiod", "fields": [...]}
+    ...
+
+Rows are read in primary-key chunks and written as they come, and a restore reads
+the file line by line and inserts CHUNK_SIZE rows per bulk_create, so memory stays
+at about one chunk however long the weekly history gets. Rollups and stage duration
+stats are derived, so they are rebuilt after a restore rather than backed up.
+
+A restore publishes a change event for every restored demand, and delete events for
+the rows a --replace removed that the backup doesn't have, so API ?since= clients and
+the static snapshots (trackerapp.snapshots) pick it up like any other write.
+"""
+import gzip
+import json
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from .bulk import data_changed
+from .events import publish_many
+from .forecast import rebuild_stage_stats
+from .models import ChangeEvent, Demand, DemandStagePeriod, StageTransition, WeeklyUpdate
+from .rollups import rebuild_rollups
+
+# Restored in this order, parents first; StageTransition is history that can't be rebuilt
+MODELS = (Demand, DemandStagePeriod, WeeklyUpdate, StageTransition)
+FORMAT = 'trackerapp-backup'
+VERSION = 1
+# Rows per SELECT when backing up and per bulk_create when restoring
+CHUNK_SIZE = 2000
+# zlib's default; level 9 is several times slower for a few percent smaller files
+COMPRESS_LEVEL = 6
+# Change events published for the rows a replacing restore removes: (kind, payload key
+# of the row id, or None when the id is the demand id)
+DELETED_EVENTS = {
+    Demand: (ChangeEvent.Kind.DEMAND_DELETED, None),
+    DemandStagePeriod: (ChangeEvent.Kind.STAGE_DELETED, 'stage_id'),
+    WeeklyUpdate: (ChangeEvent.Kind.WEEKLY_UPDATE_DELETED, 'update_id'),
+}
+
+
+class BackupError(Exception):
+    pass
+
+
+def _json_default(value):
+    # Full precision, unlike DjangoJSONEncoder, which drops microseconds
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+_encoder = json.JSONEncoder(default=_json_default, separators=(',', ':'), ensure_ascii=False)
+
+
+def _columns(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def _rows(model, chunk_size):
+    # values_list in primary-key chunks: each query is an index range scan, and no
+    # model instances are built
+    columns = _columns(model)
+    last_pk = None
+    while True:
+        queryset = model.objects.order_by('pk').values_list(*columns)
+        if last_pk is not None:
+            queryset = queryset.filter(pk__gt=last_pk)
+        rows = list(queryset[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last_pk = rows[-1][0]
+
+
+def dump(path, chunk_size=CHUNK_SIZE, progress=None):
+    """Write every tracker row to `path`; returns {model label: rows written}"""
+    counts = {}
+    with gzip.open(path, 'wt', encoding='utf-8', compresslevel=COMPRESS_LEVEL) as out:
+        out.write(_encoder.encode({'format': FORMAT, 'version': VERSION, 'created_at': timezone.now()}) + '\n')
+        for model in MODELS:
+            label = model._meta.label_lower
+            out.write(_encoder.encode({'model': label, 'fields': _columns(model)}) + '\n')
+            count = 0
+            for row in _rows(model, chunk_size):
+                out.write(_encoder.encode(row) + '\n')
+                count += 1
+            counts[label] = count
+            if progress:
+                progress(label, count)
+    return counts
+
+
+def _converters(model, columns):
+    # Parse the values JSON can't hold natively (dates, datetimes, decimals) back from strings
+    fields = {field.attname: field for field in model._meta.concrete_fields}
+    unknown = [column for column in columns if column not in fields]
+    if unknown:
+        raise BackupError(f"{model._meta.label_lower} has no fields {', '.join(unknown)}")
+    return [
+        fields[column].to_python
+        if isinstance(fields[column], (models.DateField, models.DecimalField)) else None
+        for column in columns
+    ]
+
+
+@contextmanager
+def _stored_timestamps():
+    # bulk_create would stamp auto_now/auto_now_add fields with the current time
+    fields = [
+        field for model in MODELS for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _clear():
+    # Children first; plain DELETEs, as nothing else references these rows
+    for model in reversed(MODELS):
+        queryset = model.objects.all()
+        queryset._raw_delete(queryset.db)
+
+
+def _event_rows(model):
+    # (id, demand id) of every row of a model with delete events
+    return set(model.objects.values_list('id', 'id' if model is Demand else 'demand_id').iterator(chunk_size=CHUNK_SIZE))
+
+
+def _restore_events(replaced):
+    # A saved event per restored demand, and a delete event per replaced row that's gone
+    events = [
+        (ChangeEvent.Kind.DEMAND_SAVED, demand_id, {'name': name, 'created': True})
+        for demand_id, name in Demand.objects.order_by('id').values_list('id', 'name').iterator(chunk_size=CHUNK_SIZE)
+    ]
+    for model, rows in replaced.items():
+        kind, key = DELETED_EVENTS[model]
+        for row_id, demand_id in sorted(rows - _event_rows(model)):
+            events.append((kind, demand_id, {key: row_id} if key else {}))
+    publish_many(events)
+
+
+def _records(path):
+    models_by_label = {model._meta.label_lower: model for model in MODELS}
+    with gzip.open(path, 'rt', encoding='utf-8') as lines:
+        try:
+            header = json.loads(next(lines))
+        except (StopIteration, ValueError, OSError) as exc:
+            raise BackupError(f'{path} is not a tracker backup: {exc}')
+        if not isinstance(header, dict) or header.get('format') != FORMAT:
+            raise BackupError(f'{path} is not a tracker backup')
+        if header.get('version') != VERSION:
+            raise BackupError(f"Unsupported backup version {header.get('version')}")
+
+        model = None
+        for line in lines:
+            record = json.loads(line)
+            if isinstance(record, dict):
+                model = models_by_label.get(record.get('model'))
+                if model is None:
+                    raise BackupError(f"Unknown model {record.get('model')} in backup")
+                yield model, record['fields']
+            elif model is None:
+                raise BackupError('Row before any model header in backup')
+            else:
+                yield None, record
+
+
+def load(path, replace=False, chunk_size=CHUNK_SIZE, progress=None):
+    """Restore a dump() file into the tracker tables; returns {model label: rows restored}
+
+    Everything is inserted in one transaction with foreign key checks deferred, as
+    loaddata does, and checked once at the end. The tables must be empty unless
+    `replace` is set, which deletes their rows first.
+    """
+    counts = {}
+    replaced = {}
+    with transaction.atomic(), connection.constraint_checks_disabled(), _stored_timestamps():
+        if any(model.objects.exists() for model in MODELS):
+            if not replace:
+                raise BackupError('The tracker tables are not empty (restore_tracker --replace overwrites them)')
+            replaced = {model: _event_rows(model) for model in DELETED_EVENTS}
+            _clear()
+
+        model, columns, converters, batch = None, None, None, []
+
+        def flush():
+            model.objects.bulk_create(batch, batch_size=chunk_size)
+            counts[model._meta.label_lower] = counts.get(model._meta.label_lower, 0) + len(batch)
+            batch.clear()
+
+        for record_model, record in _records(path):
+            if record_model is not None:
+                if batch:
+                    flush()
+                if model and progress:
+                    progress(model._meta.label_lower, counts.get(model._meta.label_lower, 0))
+                model, columns = record_model, record
+                converters = _converters(model, columns)
+                counts.setdefault(model._meta.label_lower, 0)
+                continue
+            values = {
+                column: convert(value) if convert and value is not None else value
+                for column, convert, value in zip(columns, converters, record)
+            }
+            batch.append(model(**values))
+            if len(batch) >= chunk_size:
+                flush()
+        if batch:
+            flush()
+        if model and progress:
+            progress(model._meta.label_lower, counts[model._meta.label_lower])
+
+        connection.check_constraints(table_names=[model._meta.db_table for model in MODELS])
+        # Explicit ids leave the primary key sequences behind on PostgreSQL and Oracle
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), MODELS):
+                cursor.execute(sql)
+        _restore_events(replaced)
+
+    rebuild_rollups()
+    rebuild_stage_stats()
+    data_changed(Demand.objects.values_list('id', flat=True).iterator(chunk_size=chunk_size))
+    return counts
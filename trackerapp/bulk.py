@@ -0,0 +1,305 @@
+"""Dashboard bulk actions on many demands at once
+
+Each action works in a fixed number of queries per BATCH_SIZE demands instead of a
+save() or delete() per row: stage sequences are validated with one grouped query,
+new stage periods go in with bulk_create, and deletes are one QuerySet.delete() per
+table. Because the model signals don't fire for these writes, or are told to skip
+their work (signals.bulk_deleting), each action does that work itself, once per batch:
+change events, stage transitions, rollups, stage duration stats and the cache versions.
+"""
+from django.db import transaction
+from django.db.models import Max
+
+from . import archive
+from .events import publish_many
+from .forms import DemandForm
+from .forecast import schedule_stage_stats
+from .history import record_stage_changes
+from .models import STAGE_ORDER, ChangeEvent, Demand, DemandStagePeriod, StageTransition, WeeklyUpdate
+from .rollups import refresh_weeks
+from .signals import bulk_deleting
+from .snapshots import schedule_publish
+from .stages import get_stage_catalog
+from .versioning import bump_data_version, bump_demand_version
+
+# Demands per IN (...) list
+BATCH_SIZE = 500
+
+
+class BulkResult:
+    """Outcome of a bulk action: the demand ids it changed and why others were skipped"""
+
+    def __init__(self):
+        self.changed = []
+        self.errors = {}
+        # advance_stage: the stage each changed demand moved to
+        self.stages = {}
+
+    def as_dict(self):
+        return {'changed': self.changed, 'errors': {str(k): v for k, v in self.errors.items()}}
+
+
+def _batches(demand_ids):
+    demand_ids = sorted(set(demand_ids))
+    for start in range(0, len(demand_ids), BATCH_SIZE):
+        yield demand_ids[start:start + BATCH_SIZE]
+
+
+def data_changed(demand_ids):
+    """Bump the cache versions, as tracker_data_changed does for each saved or deleted row"""
+    bump_data_version()
+    for demand_id in demand_ids:
+        bump_demand_version(demand_id)
+    schedule_publish()
+
+
+def _refresh_stage_stats(pairs):
+    # pairs: (stage, (file_type, file_subtype)); each distinct pair is queued once
+    schedule_stage_stats((stage, file_type, file_subtype) for stage, (file_type, file_subtype) in pairs)
+
+
+def validate_next_stages(demand_ids):
+    """Plan advancing each demand to the stage after the furthest one it has reached
+
+    One grouped query over stage numbers for all the demands. Returns (plan, errors):
+    plan maps demand id to the next stage, errors maps demand id to a message, as
+    update_stage would report it.
+    """
+    catalog = get_stage_catalog()
+    reached = {}
+    for batch in _batches(demand_ids):
+        reached.update(
+            DemandStagePeriod.objects.filter(demand_id__in=batch, stage_number__isnull=False)
+            .order_by()
+            .values_list('demand_id')
+            .annotate(number=Max('stage_number'))
+        )
+
+    existing = set()
+    for batch in _batches(demand_ids):
+        existing.update(Demand.objects.filter(id__in=batch).values_list('id', flat=True))
+
+    plan, errors = {}, {}
+    for demand_id in sorted(set(demand_ids)):
+        if demand_id not in existing:
+            errors[demand_id] = 'Demand not found.'
+            continue
+        # First stage is 0 (Demand to be Initiated), then each stage follows the last
+        next_number = reached[demand_id] + 1 if demand_id in reached else 0
+        next_stage = catalog.stage_for_number(next_number)
+        if next_stage is None:
+            errors[demand_id] = 'Already at the last stage.'
+        else:
+            plan[demand_id] = next_stage
+    return plan, errors
+
+
+def advance_stage(demand_ids, start_date, end_date):
+    """Add the next stage period (start_date to end_date) to each demand
+
+    Like update_stage, also creates or re-spans each demand's mini progress bar to its
+    start date and duration.
+    """
+    result = BulkResult()
+    plan, result.errors = validate_next_stages(demand_ids)
+    if not plan:
+        return result
+
+    with transaction.atomic():
+        periods = DemandStagePeriod.objects.bulk_create([
+            DemandStagePeriod(
+                demand_id=demand_id, stage=stage, stage_number=STAGE_ORDER[stage],
+                start_date=start_date, end_date=end_date,
+            )
+            for demand_id, stage in plan.items()
+        ], batch_size=BATCH_SIZE)
+
+        demands = {}
+        mini_bars = {}
+        for batch in _batches(plan):
+            demands.update(
+                (demand.id, demand)
+                for demand in Demand.objects.filter(id__in=batch).only('id', 'start_date', 'duration_months', 'file_type', 'file_subtype')
+            )
+            mini_bars.update(
+                (bar.demand_id, bar) for bar in DemandStagePeriod.objects.filter(demand_id__in=batch, stage='mini_progress')
+            )
+
+        new_bars, moved_bars = [], []
+        for demand_id, demand in demands.items():
+            demand_end = demand.get_end_date()
+            if not demand_end:
+                continue
+            bar = mini_bars.get(demand_id)
+            if bar is None:
+                new_bars.append(DemandStagePeriod(
+                    demand_id=demand_id, stage='mini_progress', start_date=demand.start_date, end_date=demand_end,
+                ))
+            elif (bar.start_date, bar.end_date) != (demand.start_date, demand_end):
+                bar.start_date, bar.end_date = demand.start_date, demand_end
+                moved_bars.append(bar)
+        DemandStagePeriod.objects.bulk_create(new_bars, batch_size=BATCH_SIZE)
+        DemandStagePeriod.objects.bulk_update(moved_bars, ['start_date', 'end_date'], batch_size=BATCH_SIZE)
+
+        publish_many(
+            [(ChangeEvent.Kind.STAGE_SAVED, period.demand_id, {'stage_id': period.id, 'stage': period.stage}) for period in periods]
+            + record_stage_changes(plan, StageTransition.Source.STAGE_PERIOD_SAVED)
+        )
+        _refresh_stage_stats(
+            (stage, (demands[demand_id].file_type, demands[demand_id].file_subtype)) for demand_id, stage in plan.items()
+        )
+
+    data_changed(plan)
+    result.changed = sorted(plan)
+    result.stages = plan
+    return result
+
+
+# The choices DemandForm offers for each field set_file_type can change
+FILE_FIELD_CHOICES = {
+    'file_type': DemandForm.FILE_TYPE_CHOICES,
+    'file_subtype': DemandForm.FILE_SUBTYPE_CHOICES,
+    'file_detail': DemandForm.FILE_DETAIL_CHOICES,
+}
+
+
+def _file_fields(fields, current):
+    """The columns to write to a demand with `current` (file_type, file_subtype,
+    file_detail) to set `fields`, or an error message, following DemandForm.clean
+
+    A subtype other than Project clears file_detail, as the demand form's file detail
+    select does; Project needs a file detail, given or already stored.
+    """
+    _, subtype, detail = current
+    subtype = fields.get('file_subtype', subtype)
+    detail = fields.get('file_detail', detail)
+    if subtype == 'Project':
+        if not detail:
+            return None, 'File Detail is required when File Subtype is Project.'
+        return fields, None
+    if fields.get('file_detail'):
+        return None, 'File Detail only applies when File Subtype is Project.'
+    if detail:
+        return {**fields, 'file_detail': None}, None
+    return fields, None
+
+
+def set_file_type(demand_ids, **fields):
+    """Set file_type, file_subtype and/or file_detail (the keyword arguments given) on each demand
+
+    Values must be among DemandForm's choices; demands the file detail rule rejects are
+    reported in result.errors and left unchanged.
+    """
+    result = BulkResult()
+    fields = {name: value for name, value in fields.items() if name in FILE_FIELD_CHOICES}
+    if not fields:
+        return result
+    for name, value in fields.items():
+        if value not in {choice for choice, _ in FILE_FIELD_CHOICES[name]}:
+            error = f'Select a valid choice. {value} is not one of the available {name} choices.'
+            result.errors = {demand_id: error for demand_id in set(demand_ids)}
+            return result
+    # '' in the subtype and detail choices is "none", which the demand form stores as empty
+    fields = {name: value or None for name, value in fields.items()}
+
+    with transaction.atomic():
+        previous = {}
+        for batch in _batches(demand_ids):
+            updates = {}
+            for demand_id, *current in (
+                Demand.objects.filter(id__in=batch).values_list('id', 'file_type', 'file_subtype', 'file_detail')
+            ):
+                values, error = _file_fields(fields, current)
+                if error:
+                    result.errors[demand_id] = error
+                    continue
+                previous[demand_id] = tuple(current[:2])
+                updates.setdefault(tuple(values.items()), []).append(demand_id)
+            # At most two UPDATEs: with and without clearing the file detail
+            for values, ids in updates.items():
+                Demand.objects.filter(id__in=ids).update(**dict(values))
+
+        # file_type feeds the rollups of every week the demands reported in, and moving
+        # between groups moves their stage durations between stat groups
+        weeks = set()
+        stat_pairs = []
+        for batch in _batches(previous):
+            weeks.update(
+                WeeklyUpdate.objects.filter(demand_id__in=batch).order_by().values_list('week_start_date', flat=True).distinct()
+            )
+            stages = (
+                DemandStagePeriod.objects.filter(demand_id__in=batch).exclude(stage='mini_progress')
+                .order_by().values_list('demand_id', 'stage').distinct()
+            )
+            for demand_id, stage in stages:
+                old_group = previous[demand_id]
+                new_group = (fields.get('file_type', old_group[0]), fields.get('file_subtype', old_group[1]))
+                if new_group != old_group:
+                    stat_pairs += [(stage, old_group), (stage, new_group)]
+        refresh_weeks(weeks)
+        _refresh_stage_stats(stat_pairs)
+
+        publish_many((ChangeEvent.Kind.DEMAND_SAVED, demand_id, {'created': False, **fields}) for demand_id in previous)
+
+    missing = set(demand_ids) - set(previous) - set(result.errors)
+    result.errors.update({demand_id: 'Demand not found.' for demand_id in missing})
+    data_changed(previous)
+    result.changed = sorted(previous)
+    return result
+
+
+def archive_demands(demand_ids):
+    result = BulkResult()
+    result.changed = archive.archive(demand_ids)
+    return result
+
+
+def delete_demands(demand_ids):
+    """Delete the demands and everything that cascades from them, one delete() per table and batch
+
+    Children go first, so each delete() has nothing left to cascade to. Their delete
+    signals still fire for every row, but inside signals.bulk_deleting() the receivers
+    return at once; the rollups, stats and events they maintain are refreshed here.
+    """
+    result = BulkResult()
+    with transaction.atomic():
+        names = {}
+        weeks = set()
+        stat_pairs = []
+        for batch in _batches(demand_ids):
+            groups = {}
+            for demand_id, name, file_type, file_subtype in (
+                Demand.objects.filter(id__in=batch).values_list('id', 'name', 'file_type', 'file_subtype')
+            ):
+                names[demand_id] = name
+                groups[demand_id] = (file_type, file_subtype)
+            weeks.update(
+                WeeklyUpdate.objects.filter(demand_id__in=batch).order_by().values_list('week_start_date', flat=True).distinct()
+            )
+            stat_pairs += [
+                (stage, groups[demand_id])
+                for demand_id, stage in DemandStagePeriod.objects.filter(demand_id__in=batch)
+                .exclude(stage='mini_progress').order_by().values_list('demand_id', 'stage').distinct()
+            ]
+
+            with bulk_deleting():
+                for model in (StageTransition, WeeklyUpdate, DemandStagePeriod, Demand):
+                    field = 'id' if model is Demand else 'demand_id'
+                    model.objects.filter(**{f'{field}__in': batch}).delete()
+
+        refresh_weeks(weeks)
+        _refresh_stage_stats(stat_pairs)
+        publish_many((ChangeEvent.Kind.DEMAND_DELETED, demand_id, {'name': name}) for demand_id, name in names.items())
+
+    result.errors = {demand_id: 'Demand not found.' for demand_id in set(demand_ids) - set(names)}
+    data_changed(names)
+    result.changed = sorted(names)
+    return result
+
+
+ACTIONS = {
+    'advance_stage': 'Advance to next stage',
+    'set_file_type': 'Set file type / subtype',
+    'archive': 'Archive',
+    'delete': 'Delete',
+}
@@ -0,0 +1,39 @@
+"""System checks for the settings trackerapp depends on"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Backends whose entries, and so the trackerapp.versioning counters, live in one process
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+DUMMY_CACHE = 'django.core.cache.backends.dummy.DummyCache'
+
+
+def _default_cache_backend():
+    return settings.CACHES.get('default', {}).get('BACKEND', '')
+
+
+@register(Tags.caches)
+def check_version_cache(app_configs, **kwargs):
+    """The version counters must be stored somewhere: with a dummy cache every write
+    leaves them at 1, so API ETags answer 304 and cached pages never change"""
+    if _default_cache_backend() == DUMMY_CACHE:
+        return [Error(
+            'The default cache is a DummyCache, so the trackerapp.versioning counters never change.',
+            hint='Point CACHES["default"] at a real backend; API ETags, the gantt, forecast and report '
+                 'caches are keyed on those counters.',
+            id='trackerapp.E001',
+        )]
+    return []
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_version_cache(app_configs, **kwargs):
+    """Deployments serve from several worker processes, which must share the version counters"""
+    if _default_cache_backend() in PROCESS_LOCAL_CACHES:
+        return [Error(
+            'The default cache is local to each process, so each worker keeps its own '
+            'trackerapp.versioning counters and misses the writes made through the others.',
+            hint='Use a cache all workers share (mastertracker.settings_production uses Redis or files). '
+                 'Add trackerapp.E002 to SILENCED_SYSTEM_CHECKS if exactly one process serves the app.',
+            id='trackerapp.E002',
+        )]
+    return []
@@ -0,0 +1,340 @@
+"""Differential testing of demand_list against an alternative implementation
+
+run() builds randomized synthetic portfolios in a throwaway test database, requests
+the dashboard from a baseline and a candidate view with the same query string and
+session, and compares what they produce field by field: the context the dashboard
+template is rendered with, the session they leave behind and the HTML. It also times
+both views on every case, so a performance rewrite of the dashboard can show that it
+is faster and behaves identically before it replaces the original.
+
+Portfolios deliberately cover the dashboard's edge cases: demands without dates,
+mini progress bars, several weekly updates in one stage, current stages remembered
+by the session or only in the database, and stages short enough to be widened.
+"""
+import copy
+import io
+import math
+import random
+import re
+import time
+from contextlib import contextmanager, redirect_stdout
+from datetime import date, timedelta
+from importlib import import_module
+
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.core.cache import cache
+from django.db import connection, models, reset_queries, transaction
+from django.template import Template, engines
+from django.test import RequestFactory
+from django.test.signals import template_rendered
+from django.test.utils import CaptureQueriesContext, instrumented_test_render, override_settings
+from django.urls import reverse
+from django.utils.functional import Promise
+
+from .models import STAGE_ORDER, Demand, DemandStagePeriod, WeeklyUpdate, text_preview
+from .rows import as_dict
+from .stages import get_stage_catalog
+
+DASHBOARD_TEMPLATE = 'trackerapp/demand_list.html'
+FILE_TYPES = ['CASH', 'GEM', 'LPC']
+# Masked CSRF tokens differ on every render
+CSRF_INPUT = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*"')
+WORDS = ['vendor', 'delay', 'approval', 'pending', 'sample', 'review', 'budget', 'quote', 'meeting', 'spec']
+
+# The harness's own cache, so cached gantt markup can't leak between runs or into a shared cache
+HARNESS_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'trackerapp-equivalence',
+    }
+}
+
+
+class _Missing:
+    def __repr__(self):
+        return '<missing>'
+
+
+MISSING = _Missing()
+
+
+def load_view(path):
+    """The view function at a dotted path such as 'trackerapp.views.demand_list'"""
+    module_name, _, name = path.rpartition('.')
+    return getattr(import_module(module_name), name)
+
+
+@contextmanager
+def throwaway_database():
+    """Point the default database at a fresh, migrated test database for the duration"""
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def _text(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randrange(0, 12))) or None
+
+
+def build_portfolio(rng, size):
+    """Create `size` random demands with stage periods and weekly updates
+
+    Returns the session's demand_current_stages for the portfolio, which remembers a
+    current stage for some of the demands (not always one they have a period for).
+    Rows are bulk created: the dashboard reads nothing the model signals maintain, and
+    running them would make building a portfolio take far longer than comparing it.
+    """
+    stages = get_stage_catalog().by_number
+    base = date(2024, 1, 1) + timedelta(days=rng.randrange(730))
+    demands, periods, updates, remembered = [], [], [], []
+
+    for index in range(size):
+        start = base + timedelta(days=rng.randrange(-200, 400))
+        # Some demands have no dates and are placed by their stages, or skipped without any
+        dated = rng.random() < 0.85
+        demand = Demand(
+            name=f'[equivalence] demand {index}',
+            file_type=rng.choice(FILE_TYPES + [None]),
+            start_date=start if dated else None,
+            duration_months=rng.choice([None, 1, 3, 6, 12, 18, 24]) if dated else None,
+            demand_amount=rng.randrange(1000, 10_000_000),
+        )
+        selected = sorted(rng.sample(range(len(stages)), rng.randrange(0, 12)))
+        demand.selected_stages = [stages[number] for number in selected]
+        demands.append(demand)
+
+        # Periods for most of the selected stages, with gaps and overlaps; one to three
+        # day periods are narrower than the dashboard's minimum widths
+        demand_stages = []
+        day = start
+        for number in selected:
+            if rng.random() < 0.2:
+                continue
+            day += timedelta(days=rng.randrange(-5, 15))
+            length = rng.choice([1, 2, 3, rng.randrange(4, 90)])
+            periods.append(DemandStagePeriod(
+                demand=demand, stage=stages[number], stage_number=STAGE_ORDER.get(stages[number]),
+                start_date=day, end_date=day + timedelta(days=length - 1),
+            ))
+            demand_stages.append(stages[number])
+            day += timedelta(days=length)
+
+        if rng.random() < 0.5:
+            periods.append(DemandStagePeriod(
+                demand=demand, stage='mini_progress', start_date=start,
+                end_date=demand.get_end_date() or start + timedelta(days=rng.randrange(30, 400)),
+            ))
+
+        # Weekly updates, often several in the same stage; now and then in a stage without a period
+        week_start = start + timedelta(days=rng.randrange(0, 60))
+        for week_number in range(1, rng.randrange(0, 8) + 1):
+            if demand_stages and rng.random() < 0.8:
+                current_stage = rng.choice(demand_stages)
+            else:
+                current_stage = rng.choice([None, rng.choice(stages)])
+            update = WeeklyUpdate(
+                demand=demand,
+                week_number=week_number,
+                week_start_date=week_start,
+                week_end_date=week_start + timedelta(days=6),
+                current_stage=current_stage,
+                stage_number=STAGE_ORDER.get(current_stage),
+                progress_percentage=rng.randrange(101),
+                challenges=_text(rng),
+                achievements=_text(rng),
+                next_week_plan=_text(rng),
+            )
+            # What WeeklyUpdate.save() would fill in
+            update.challenges_preview, update.challenges_truncated = text_preview(update.challenges)
+            update.achievements_preview, update.achievements_truncated = text_preview(update.achievements)
+            updates.append(update)
+            week_start += timedelta(days=rng.choice([7, 7, 7, 14]))
+
+        if rng.random() < 0.4:
+            remembered.append((demand, rng.choice(demand_stages or stages)))
+
+    Demand.objects.bulk_create(demands)
+    DemandStagePeriod.objects.bulk_create(periods)
+    WeeklyUpdate.objects.bulk_create(updates)
+    return {str(demand.id): stage for demand, stage in remembered}
+
+
+def portfolio_queries(rng):
+    """Query strings to request a portfolio's dashboard with: all rows, one file type, one demand"""
+    demand_ids = list(Demand.objects.values_list('id', flat=True))
+    queries = ['', f'file_type={rng.choice(FILE_TYPES)}']
+    if demand_ids:
+        queries.append(f'demand={rng.choice(demand_ids)}')
+    return queries
+
+
+def _request(query, session_stages):
+    request = RequestFactory().get(f"{reverse('demand_list')}?{query}" if query else reverse('demand_list'))
+    request.session = SessionStore()
+    if session_stages:
+        # Views update the remembered stages in place; each call gets its own copy
+        request.session['demand_current_stages'] = copy.deepcopy(session_stages)
+    return request
+
+
+def _content(response):
+    return b''.join(response.streaming_content) if response.streaming else response.content
+
+
+def capture(view, query, session_stages):
+    """Call `view` once and return what it produced, with its query count
+
+    The result is a dict with the template context ('context', without the keys
+    context processors add), 'session' and 'html', or just 'error' if the view raised.
+    """
+    request = _request(query, session_stages)
+    processor_keys = {'True', 'False', 'None'}
+    for processor in engines['django'].engine.template_context_processors:
+        processor_keys.update(processor(request))
+
+    contexts = []
+
+    def record(sender, template, context, **kwargs):
+        if template.name == DASHBOARD_TEMPLATE and not contexts:
+            contexts.append({key: value for key, value in context.flatten().items() if key not in processor_keys})
+
+    template_rendered.connect(record)
+    original_render = Template._render
+    Template._render = instrumented_test_render
+    cache.clear()
+    # The query log is capped; start from empty so the count can't be cut short
+    reset_queries()
+    try:
+        with CaptureQueriesContext(connection) as queries, redirect_stdout(io.StringIO()):
+            try:
+                response = view(request)
+                html = CSRF_INPUT.sub(r'\1"', _content(response).decode())
+            except Exception as exc:
+                return {'error': f'{type(exc).__name__}: {exc}'}, len(queries)
+    finally:
+        Template._render = original_render
+        template_rendered.disconnect(record)
+
+    return {
+        'context': contexts[0] if contexts else MISSING,
+        'session': dict(request.session.items()),
+        'html': html,
+    }, len(queries)
+
+
+def time_view(view, query, session_stages, repeat):
+    """Best of `repeat` timed calls of `view`, each with a cold cache, in seconds"""
+    best = None
+    for _ in range(repeat):
+        request = _request(query, session_stages)
+        cache.clear()
+        with redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            try:
+                _content(view(request))
+            except Exception:
+                pass
+            elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def normalize(value):
+    """Plain data for comparing: model instances by label and pk, row types as their dicts"""
+    if isinstance(value, models.Model):
+        return f'{value._meta.label}#{value.pk}'
+    if isinstance(value, models.QuerySet):
+        value = list(value)
+    if isinstance(value, tuple) and hasattr(value, '_fields'):
+        value = as_dict(value)
+    if isinstance(value, dict):
+        return {str(key): normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+    if isinstance(value, (str, Promise)):
+        # SafeStrings and lazy labels compare as the text they render
+        return str(value)
+    return value
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def differences(baseline, candidate, path='', tolerance=0.0):
+    """Yield (path, baseline value, candidate value) for every leaf that differs
+
+    Floats within `tolerance` of each other count as equal.
+    """
+    if isinstance(baseline, dict) and isinstance(candidate, dict):
+        for key in sorted(baseline.keys() | candidate.keys()):
+            key_path = f'{path}.{key}' if path else key
+            yield from differences(
+                baseline.get(key, MISSING), candidate.get(key, MISSING), key_path, tolerance
+            )
+    elif isinstance(baseline, list) and isinstance(candidate, list):
+        if len(baseline) != len(candidate):
+            yield f'{path} length', len(baseline), len(candidate)
+        for index, (left, right) in enumerate(zip(baseline, candidate)):
+            yield from differences(left, right, f'{path}[{index}]', tolerance)
+    elif _is_number(baseline) and _is_number(candidate) and (isinstance(baseline, float) or isinstance(candidate, float)):
+        if not math.isclose(baseline, candidate, rel_tol=0, abs_tol=tolerance):
+            yield path, baseline, candidate
+    elif baseline != candidate:
+        yield path, baseline, candidate
+
+
+def _html_difference(baseline, candidate):
+    # The first line where two pages differ, as (path, baseline line, candidate line)
+    baseline_lines = baseline.splitlines()
+    candidate_lines = candidate.splitlines()
+    for number, (left, right) in enumerate(zip(baseline_lines, candidate_lines), 1):
+        if left != right:
+            return f'html line {number}', left.strip(), right.strip()
+    return 'html length', len(baseline_lines), len(candidate_lines)
+
+
+def run(baseline, candidate, portfolios=20, demands=30, seed=0, repeat=3, tolerance=1e-9, progress=None):
+    """Compare two dashboard views on random portfolios
+
+    `baseline` and `candidate` are view functions. Returns a dict with the number of
+    cases compared, the differences as (case, path, baseline value, candidate value),
+    and total best-of-`repeat` seconds and queries for each view. `progress(done,
+    total)` is called after each portfolio.
+    """
+    rng = random.Random(seed)
+    report = {
+        'cases': 0,
+        'differences': [],
+        'baseline_seconds': 0.0,
+        'candidate_seconds': 0.0,
+        'baseline_queries': 0,
+        'candidate_queries': 0,
+    }
+    with throwaway_database(), override_settings(CACHES=HARNESS_CACHES, TRACKER_STREAM_DASHBOARD=False):
+        for number in range(1, portfolios + 1):
+            # Each portfolio is rolled back once compared, so the next starts from an empty database
+            with transaction.atomic():
+                session_stages = build_portfolio(rng, demands)
+                for query in portfolio_queries(rng):
+                    case = f'portfolio {number} ?{query}'
+                    expected, expected_queries = capture(baseline, query, session_stages)
+                    actual, actual_queries = capture(candidate, query, session_stages)
+                    report['cases'] += 1
+                    report['baseline_queries'] += expected_queries
+                    report['candidate_queries'] += actual_queries
+                    expected_html, actual_html = expected.pop('html', ''), actual.pop('html', '')
+                    if expected_html != actual_html:
+                        report['differences'].append((case, *_html_difference(expected_html, actual_html)))
+                    for path, left, right in differences(normalize(expected), normalize(actual), tolerance=tolerance):
+                        report['differences'].append((case, path, left, right))
+
+                    report['baseline_seconds'] += time_view(baseline, query, session_stages, repeat)
+                    report['candidate_seconds'] += time_view(candidate, query, session_stages, repeat)
+                transaction.set_rollback(True)
+            if progress:
+                progress(number, portfolios)
+    return report
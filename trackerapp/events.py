@@ -0,0 +1,139 @@
+import asyncio
+import json
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ChangeEvent
+
+# Events older than this are pruned; a client that reconnects later just reloads
+EVENT_RETENTION = timedelta(days=1)
+PRUNE_EVERY = 200
+# Most events a stream reads per query
+EVENT_BATCH = 100
+
+
+class LocalBroker:
+    """Wakes the SSE streams of this process as soon as a change event is committed
+
+    Streams always read the events themselves from the ChangeEvent table; the broker
+    only saves them waiting for the next poll. Writes made by other worker processes
+    are picked up by polling (see poll_interval()).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = set()
+
+    def subscribe(self):
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.add(waiter)
+        return waiter
+
+    def unsubscribe(self, waiter):
+        with self._lock:
+            self._waiters.discard(waiter)
+
+    def notify(self):
+        # Called from sync request threads, so hand the wake-up to each stream's loop
+        with self._lock:
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The stream's event loop has already closed
+                self.unsubscribe((loop, event))
+
+
+broker = LocalBroker()
+
+
+def poll_interval():
+    """Seconds a stream waits before re-reading the feed without a local wake-up"""
+    if getattr(settings, 'TRACKER_EVENT_BROKER', 'local') == 'database':
+        return getattr(settings, 'TRACKER_EVENT_POLL_INTERVAL', 2)
+    return getattr(settings, 'TRACKER_EVENT_KEEPALIVE', 15)
+
+
+def _prune():
+    ChangeEvent.objects.filter(created_at__lt=timezone.now() - EVENT_RETENTION).delete()
+
+
+def publish(kind, demand_id, **payload):
+    """Record a change event once the current transaction commits and wake local streams"""
+    def write():
+        event = ChangeEvent.objects.create(kind=kind, demand_id=demand_id, payload=payload)
+        if event.id % PRUNE_EVERY == 0:
+            _prune()
+        broker.notify()
+
+    transaction.on_commit(write)
+
+
+def publish_many(events):
+    """publish() for many (kind, demand_id, payload) events, written in one bulk insert"""
+    events = [ChangeEvent(kind=kind, demand_id=demand_id, payload=payload) for kind, demand_id, payload in events]
+    if not events:
+        return
+
+    def write():
+        ChangeEvent.objects.bulk_create(events, batch_size=500)
+        first, last = events[0].id, events[-1].id
+        # Prune as publish() would if any of the new ids is a multiple of PRUNE_EVERY
+        if first is None or first % PRUNE_EVERY == 0 or first // PRUNE_EVERY != last // PRUNE_EVERY:
+            _prune()
+        broker.notify()
+
+    transaction.on_commit(write)
+
+
+def format_event(event):
+    data = json.dumps({'kind': event.kind, 'demand_id': event.demand_id, **event.payload})
+    return f"id: {event.id}\nevent: {event.kind}\ndata: {data}\n\n"
+
+
+async def latest_event_id():
+    latest = await ChangeEvent.objects.order_by('-id').values_list('id', flat=True).afirst()
+    return latest or 0
+
+
+async def events_after(last_id):
+    return [event async for event in ChangeEvent.objects.filter(id__gt=last_id).order_by('id')[:EVENT_BATCH]]
+
+
+async def stream(last_id, follow=True):
+    """Async iterator of SSE frames for events after `last_id`
+
+    With follow=False (WSGI servers, which can't hold a stream open) it sends what is
+    pending and ends; EventSource reconnects after the retry delay, resuming from the
+    last event id.
+    """
+    interval = poll_interval()
+    yield f"retry: {int(interval * 1000)}\n\n"
+
+    waiter = broker.subscribe() if follow else None
+    try:
+        while True:
+            if waiter:
+                waiter[1].clear()
+            events = await events_after(last_id)
+            for event in events:
+                last_id = event.id
+                yield format_event(event)
+            if not follow:
+                return
+            if len(events) == EVENT_BATCH:
+                continue
+            try:
+                await asyncio.wait_for(waiter[1].wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+    finally:
+        if waiter:
+            broker.unsubscribe(waiter)
@@ -0,0 +1,249 @@
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
+
+from .models import STAGE_ORDER, Demand, DemandStagePeriod, StageDurationStat, StageTransition, WeeklyUpdate
+from .stages import get_stage_catalog
+from .versioning import bump_stats_version, data_version, stats_version
+
+ANY = StageDurationStat.ANY
+
+# Assumed duration for stages that have no history in any group yet
+DEFAULT_STAGE_DAYS = 30
+
+FORECAST_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def _stat_values(samples):
+    samples = sorted(samples)
+    return {
+        'sample_count': len(samples),
+        'mean_days': sum(samples) / len(samples) if samples else 0.0,
+        'p50_days': _percentile(samples, 0.5),
+        'p90_days': _percentile(samples, 0.9),
+        'min_days': samples[0] if samples else 0,
+        'max_days': samples[-1] if samples else 0,
+    }
+
+
+def _groups(file_type, file_subtype):
+    """The stat groups a demand contributes to, most specific first"""
+    file_type = file_type or ''
+    file_subtype = file_subtype or ''
+    return [(file_type, file_subtype), (file_type, ANY), (ANY, ANY)]
+
+
+def _demand_filter(prefix, file_type, file_subtype):
+    q = Q()
+    for field, value in ((f'{prefix}file_type', file_type), (f'{prefix}file_subtype', file_subtype)):
+        if value == ANY:
+            continue
+        if value == '':
+            q &= Q(**{field: ''}) | Q(**{f'{field}__isnull': True})
+        else:
+            q &= Q(**{field: value})
+    return q
+
+
+def _durations(periods, spans):
+    """Stage durations as shown on the dashboard: the weekly update span when a stage
+    has more than one update, otherwise the stage period's own length"""
+    multi_week = {
+        (row['demand_id'], row['current_stage']): (row['last_end'] - row['first_start']).days + 1
+        for row in spans
+    }
+    for demand_id, stage, start_date, end_date, file_type, file_subtype in periods:
+        duration = multi_week.get((demand_id, stage), (end_date - start_date).days + 1)
+        yield stage, file_type, file_subtype, duration
+
+
+def _weekly_spans(updates):
+    return (
+        updates.order_by()
+        .values('demand_id', 'current_stage')
+        .annotate(update_count=Count('id'), first_start=Min('week_start_date'), last_end=Max('week_end_date'))
+        .filter(update_count__gt=1)
+    )
+
+
+def _periods(periods):
+    return periods.exclude(stage='mini_progress').values_list(
+        'demand_id', 'stage', 'start_date', 'end_date', 'demand__file_type', 'demand__file_subtype'
+    )
+
+
+def refresh_stage_stat(stage, file_type, file_subtype):
+    """Recompute one stats row (file_type/file_subtype may be ANY); returns its sample count"""
+    periods = _periods(DemandStagePeriod.objects.filter(
+        _demand_filter('demand__', file_type, file_subtype), stage=stage
+    ))
+    spans = _weekly_spans(WeeklyUpdate.objects.filter(
+        _demand_filter('demand__', file_type, file_subtype), current_stage=stage
+    ))
+    samples = [duration for _, _, _, duration in _durations(periods, spans)]
+    if not samples:
+        # rebuild_stage_stats() only writes groups that have samples
+        StageDurationStat.objects.filter(file_type=file_type, file_subtype=file_subtype, stage=stage).delete()
+    else:
+        StageDurationStat.objects.update_or_create(
+            file_type=file_type,
+            file_subtype=file_subtype,
+            stage=stage,
+            defaults={'stage_number': STAGE_ORDER.get(stage), **_stat_values(samples)},
+        )
+    bump_stats_version()
+    return len(samples)
+
+
+def schedule_stage_stats(pairs):
+    """Queue a refresh_stage_stats job for each stats row fed by the (stage, file_type,
+    file_subtype) pairs, after the current transaction commits
+
+    The (ANY, ANY) row covers the whole portfolio, so writes leave the recompute to the
+    workers (run_workers) and the stats lag writes until it has run. A row whose job is
+    still queued isn't queued again: the job reads the stage history when it runs.
+    """
+    rows = {
+        (stage, group_type, group_subtype)
+        for stage, file_type, file_subtype in pairs if stage in STAGE_ORDER
+        for group_type, group_subtype in _groups(file_type, file_subtype)
+    }
+    if not rows:
+        return
+
+    def enqueue():
+        from . import jobs
+        from .models import Job
+
+        queued = {
+            (kwargs.get('stage'), kwargs.get('file_type'), kwargs.get('file_subtype'))
+            for kwargs in Job.objects.filter(
+                task='refresh_stage_stats', status=Job.Status.QUEUED,
+            ).values_list('kwargs', flat=True)
+        }
+        for stage, file_type, file_subtype in sorted(rows - queued):
+            jobs.enqueue('refresh_stage_stats', stage=stage, file_type=file_type, file_subtype=file_subtype)
+
+    transaction.on_commit(enqueue)
+
+
+def rebuild_stage_stats():
+    """Recompute every stats row from all stage periods; returns the number of rows written"""
+    samples = {}
+    spans = _weekly_spans(WeeklyUpdate.objects.exclude(current_stage__isnull=True))
+    for stage, file_type, file_subtype, duration in _durations(_periods(DemandStagePeriod.objects.all()), spans):
+        for group in _groups(file_type, file_subtype):
+            samples.setdefault(group + (stage,), []).append(duration)
+
+    rows = [
+        StageDurationStat(
+            file_type=file_type,
+            file_subtype=file_subtype,
+            stage=stage,
+            stage_number=STAGE_ORDER.get(stage),
+            **_stat_values(values),
+        )
+        for (file_type, file_subtype, stage), values in samples.items()
+    ]
+    with transaction.atomic():
+        StageDurationStat.objects.all().delete()
+        StageDurationStat.objects.bulk_create(rows, batch_size=500)
+    bump_stats_version()
+    return len(rows)
+
+
+def _expected_days(stats, file_type, file_subtype, stage):
+    for group in _groups(file_type, file_subtype):
+        stat = stats.get(group + (stage,))
+        if stat and stat.sample_count:
+            return max(1, round(stat.p50_days))
+    return DEFAULT_STAGE_DAYS
+
+
+def build_portfolio_forecast(today=None):
+    """Forecast remaining stage dates and completion for every active demand in one pass
+
+    Reads every stats row once and each demand's current stage from the transition
+    log, so no per-demand history is scanned.
+    """
+    today = today or date.today()
+    catalog = get_stage_catalog()
+    final_stage = catalog.by_number[-1]
+    stats = {(s.file_type, s.file_subtype, s.stage): s for s in StageDurationStat.objects.all()}
+
+    latest = StageTransition.objects.filter(demand_id__in=Demand.objects.active().values('id')).as_of(today)
+    current = {t.demand_id: (t.stage, t.effective_date) for t in latest}
+
+    forecasts = []
+    demands = Demand.objects.active().order_by('name').only(
+        'id', 'name', 'file_type', 'file_subtype', 'start_date', 'duration_months', 'selected_stages_mask'
+    )
+    for demand in demands:
+        stage, stage_start = current.get(demand.id, (None, None))
+        if stage == final_stage:
+            continue
+
+        if stage:
+            current_number = catalog.numbers[stage]
+        else:
+            # No stage recorded yet: the first stage can't start before today
+            current_number = -1
+            stage_start = max(demand.start_date or today, today)
+
+        selected = demand.selected_stages_mask
+        remaining = [
+            s for s in catalog.by_number[current_number + 1:]
+            if not selected or demand.has_stage(s)
+        ]
+
+        stage_dates = []
+        cursor = stage_start
+        if stage:
+            days = _expected_days(stats, demand.file_type, demand.file_subtype, stage)
+            cursor = max(today, stage_start + timedelta(days=days - 1))
+            stage_dates.append({'stage': stage, 'label': catalog.labels[stage], 'start': stage_start, 'end': cursor})
+            cursor += timedelta(days=1)
+
+        for next_stage in remaining:
+            days = _expected_days(stats, demand.file_type, demand.file_subtype, next_stage)
+            end = cursor + timedelta(days=days - 1)
+            stage_dates.append({'stage': next_stage, 'label': catalog.labels[next_stage], 'start': cursor, 'end': end})
+            cursor = end + timedelta(days=1)
+
+        completion = stage_dates[-1]['end'] if stage_dates else None
+        planned_end = demand.get_end_date()
+        forecasts.append({
+            'demand_id': demand.id,
+            'demand_name': demand.name,
+            'file_type': demand.file_type,
+            'file_subtype': demand.file_subtype,
+            'current_stage': catalog.labels[stage] if stage else '',
+            'current_stage_number': current_number if stage else None,
+            'stages': stage_dates,
+            'forecast_completion': completion,
+            'planned_end': planned_end,
+            'slip_days': (completion - planned_end).days if completion and planned_end else None,
+        })
+    return forecasts
+
+
+def portfolio_forecast(today=None):
+    """build_portfolio_forecast cached until tracker data or the stats change or the day rolls over"""
+    today = today or date.today()
+    cache_key = f'trackerapp:forecast:{today.isoformat()}:{data_version()}:{stats_version()}'
+    forecasts = cache.get(cache_key)
+    if forecasts is None:
+        forecasts = build_portfolio_forecast(today)
+        cache.set(cache_key, forecasts, FORECAST_CACHE_TIMEOUT)
+    return forecasts
@@ -1,5 +1,6 @@
 from django import forms
-from .models import Demand, DemandStagePeriod, WeeklyUpdate, Stage
+from .models import Demand, DemandStagePeriod, Stage, WeeklyUpdate
+from .stages import get_stage_catalog
 from datetime import datetime, timedelta
 
 class DemandForm(forms.ModelForm):
@@ -142,34 +143,11 @@ class WeeklyUpdateForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         
         # Filter choices based on selected stages for this demand
-        if demand and demand.selected_stages:
+        if demand and demand.selected_stages_mask:
             # Only show stages that were selected when creating the demand
-            available_choices = [('', 'Select Stage')]
-            # print(f"DEBUG: Demand {demand.id} selected_stages: {demand.selected_stages}")
-            # print(f"DEBUG: Selected stages type: {type(demand.selected_stages)}")
-            
-            for stage_value in demand.selected_stages:
-                # print(f"DEBUG: Processing stage_value: {stage_value}")
-                # Get the stage label from Stage.choices
-                stage_label = None
-                for choice_value, choice_label in Stage.choices:
-                    if choice_value == stage_value:
-                        stage_label = choice_label
-                        break
-                
-                if stage_label:
-                    available_choices.append((stage_value, stage_label))
-                    # print(f"DEBUG: Added stage {stage_value} with label {stage_label}")
-                else:
-                    # Fallback to the value itself if label not found
-                    available_choices.append((stage_value, stage_value))
-                    # print(f"DEBUG: Added stage {stage_value} with fallback label")
-            
-            # print(f"DEBUG: Final available choices: {available_choices}")
-            self.fields['current_stage'].choices = available_choices
+            self.fields['current_stage'].choices = get_stage_catalog().choices_for(demand.selected_stages_mask)
         else:
             # If no stages were selected, show only the default option
-            # print(f"DEBUG: No selected stages for demand {demand.id if demand else 'None'}")
             self.fields['current_stage'].choices = [('', 'No stages selected for this demand')]
         
         # Set date restrictions based on demand duration
@@ -222,3 +200,20 @@ class WeeklyUpdateForm(forms.ModelForm):
                 self.add_error('current_stage', f'Select a valid choice. {current_stage} is not one of the available choices.')
         
         return cleaned_data
+
+# JSON API forms (trackerapp.api): the same validation as the pages, plus the fields
+# the pages edit elsewhere
+
+class DemandApiForm(DemandForm):
+    selected_stages = forms.MultipleChoiceField(choices=Stage.choices, required=False)
+
+    class Meta(DemandForm.Meta):
+        fields = DemandForm.Meta.fields + ['weekly_start_date', 'weekly_end_date']
+
+    def save(self, commit=True):
+        self.instance.selected_stages = self.cleaned_data.get('selected_stages') or []
+        return super().save(commit)
+
+class WeeklyUpdateApiForm(WeeklyUpdateForm):
+    class Meta(WeeklyUpdateForm.Meta):
+        fields = ['demand'] + WeeklyUpdateForm.Meta.fields + ['progress_percentage', 'next_week_plan']
@@ -0,0 +1,101 @@
+"""SVG rendering of the dashboard's per-demand stage bars and stage detail boxes
+
+Each demand row gets one small <svg> per strip instead of a positioned div (plus
+tooltip and label children) per bar, four times over across the dashboard tabs.
+Positions are percentages of the row width, so the SVGs need no viewBox and text
+isn't stretched. Rendered markup is cached per demand and invalidated by its
+demand_version().
+"""
+from django.core.cache import cache
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+from .versioning import demand_version
+
+GANTT_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+
+BAR_HEIGHT = 30
+BOX_HEIGHT = 36
+BOX_WIDTH = 3.0
+
+
+def _pct(value):
+    # Three decimals is well under a pixel on any screen
+    return f'{value:.3f}'.rstrip('0').rstrip('.') + '%'
+
+
+def timeline_svg(bars):
+    """The demand's mini progress bars as one SVG; rects carry the data openModal() reads"""
+    parts = []
+    for bar in bars:
+        if 'mini_progress' not in bar.stage:
+            continue
+        parts.append(format_html(
+            '<rect x="{}" width="{}" height="{}" fill="{}" data-stage-id="{}" data-stage-name="{}" '
+            'data-stage-number="{}" data-start-date="{}" data-end-date="{}" data-duration="{}"/>',
+            _pct(bar.start_percent), _pct(bar.width_percent), BAR_HEIGHT, bar.color, bar.id,
+            bar.stage_verbose, bar.number, bar.start_date, bar.end_date, bar.duration,
+        ))
+        if bar.should_show_number:
+            parts.append(format_html(
+                '<text x="{}" y="{}" class="gantt-number">{}</text>',
+                _pct(bar.start_percent + bar.width_percent / 2), BAR_HEIGHT / 2, bar.number,
+            ))
+    return format_html(
+        '<svg class="stage-gantt" width="100%" height="{}" onclick="ganttClick(event)" '
+        'onmouseover="ganttTooltip(event)" onmouseout="ganttTooltip(event)">{}</svg>',
+        BAR_HEIGHT, mark_safe(''.join(parts)),
+    )
+
+
+def detail_svg(boxes, na_labels=True):
+    """The 26 stage detail boxes as one SVG, spaced evenly across the row
+
+    With na_labels=False, stages that weren't selected show "0d" rather than "N/A",
+    as the per-file-type tabs always have.
+    """
+    gap = (100 - BOX_WIDTH * len(boxes)) / (len(boxes) + 1)
+    parts = []
+    for index, box in enumerate(boxes):
+        x = gap * (index + 1) + BOX_WIDTH * index
+        centre = _pct(x + BOX_WIDTH / 2)
+        if box.has_data:
+            title = f"Stage {box.number}: {box.stage_name}\nDuration: {box.duration} days\nStart: {box.start_date}\nEnd: {box.end_date}"
+            label_class = 'gantt-box-data'
+        else:
+            title = f"Stage {box.number}: {box.stage_name}\nNo data available"
+            label_class = 'gantt-box-empty'
+        if na_labels and box.stage_name == 'N/A':
+            duration = format_html('<text x="{}" y="29" class="gantt-box-na">N/A</text>', centre)
+        else:
+            duration = format_html('<text x="{}" y="29" class="gantt-box-days">{}d</text>', centre, box.duration)
+        parts.append(format_html(
+            '<g class="{}"{}><title>{}</title><rect x="{}" y="0.5" width="{}" height="{}" fill="{}"/>'
+            '<text x="{}" y="16" class="gantt-box-number">{}</text>{}</g>',
+            label_class,
+            format_html(' id="stage-detail-segment-{}"', box.id) if box.has_data else '',
+            title, _pct(x), _pct(BOX_WIDTH), BOX_HEIGHT - 1, box.color, centre, box.number, duration,
+        ))
+    return format_html(
+        '<svg class="stage-detail-gantt" width="100%" height="{}">{}</svg>',
+        BOX_HEIGHT, mark_safe(''.join(parts)),
+    )
+
+
+def demand_gantt(demand_id, bars, boxes, session_stage=None):
+    """Timeline and detail SVGs for one demand row, cached until the demand changes
+
+    `session_stage` is the current stage the viewer's session remembers for the
+    demand, the one input to the bars that doesn't come from the database.
+    Returns a dict with 'timeline', 'detail' and 'detail_plain' (no N/A labels).
+    """
+    cache_key = f'trackerapp:gantt:{demand_id}:{demand_version(demand_id)}:{session_stage or ""}'
+    gantt = cache.get(cache_key)
+    if gantt is None:
+        gantt = {
+            'timeline': timeline_svg(bars),
+            'detail': detail_svg(boxes),
+            'detail_plain': detail_svg(boxes, na_labels=False),
+        }
+        cache.set(cache_key, gantt, GANTT_CACHE_TIMEOUT)
+    return gantt
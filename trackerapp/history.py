@@ -0,0 +1,96 @@
+from datetime import date
+
+from django.db.models import OuterRef, Subquery
+
+from .models import STAGE_ORDER, ChangeEvent, Demand, DemandStagePeriod, StageTransition, WeeklyUpdate
+
+
+def current_stage_for(demand_id):
+    """Return (stage, effective_date) for a demand's current stage, or (None, None)
+
+    Mirrors demand_list: the latest weekly update's current_stage wins, otherwise
+    the most recently started stage period.
+    """
+    latest_update = WeeklyUpdate.objects.filter(demand_id=demand_id).order_by('-week_number').first()
+    if latest_update and latest_update.current_stage:
+        return latest_update.current_stage, latest_update.week_start_date
+
+    latest_period = (
+        DemandStagePeriod.objects.filter(demand_id=demand_id)
+        .exclude(stage='mini_progress')
+        .order_by('-start_date')
+        .first()
+    )
+    if latest_period:
+        return latest_period.stage, latest_period.start_date
+
+    return None, None
+
+
+def record_stage_change(demand_id, source):
+    """Append a StageTransition if the demand's current stage differs from the last one logged"""
+    if not Demand.objects.filter(id=demand_id).exists():
+        return None
+
+    stage, effective_date = current_stage_for(demand_id)
+    last = StageTransition.objects.filter(demand_id=demand_id).order_by('-id').first()
+    last_stage = last.stage if last else None
+    if stage == last_stage:
+        return None
+
+    effective_date = effective_date or date.today()
+    if last and effective_date < last.effective_date:
+        # Reverts (e.g. deleting the latest weekly update) fall back to older evidence;
+        # keep the log monotonic so the revert supersedes the retracted transition
+        effective_date = last.effective_date
+
+    return StageTransition.objects.create(
+        demand_id=demand_id,
+        from_stage=last_stage,
+        stage=stage,
+        effective_date=effective_date,
+        source=source,
+    )
+
+
+def record_stage_changes(demand_ids, source):
+    """record_stage_change() for many demands, reading their stages in one query
+
+    Transitions are bulk created, so the stage_changed events their post_save signal
+    would publish are returned as (kind, demand_id, payload) for events.publish_many().
+    """
+    latest_update = WeeklyUpdate.objects.filter(demand=OuterRef('pk')).order_by('-week_number')
+    latest_period = DemandStagePeriod.objects.filter(demand=OuterRef('pk')).exclude(stage='mini_progress').order_by('-start_date')
+    last = StageTransition.objects.filter(demand=OuterRef('pk')).order_by('-id')
+    rows = Demand.objects.filter(id__in=demand_ids).annotate(
+        update_stage=Subquery(latest_update.values('current_stage')[:1]),
+        update_date=Subquery(latest_update.values('week_start_date')[:1]),
+        period_stage=Subquery(latest_period.values('stage')[:1]),
+        period_date=Subquery(latest_period.values('start_date')[:1]),
+        last_stage=Subquery(last.values('stage')[:1]),
+        last_date=Subquery(last.values('effective_date')[:1]),
+    ).values_list('id', 'update_stage', 'update_date', 'period_stage', 'period_date', 'last_stage', 'last_date')
+
+    transitions = []
+    for demand_id, update_stage, update_date, period_stage, period_date, last_stage, last_date in rows:
+        if update_stage:
+            stage, effective_date = update_stage, update_date
+        else:
+            stage, effective_date = period_stage, period_date
+        if stage == last_stage:
+            continue
+        effective_date = effective_date or date.today()
+        if last_date and effective_date < last_date:
+            effective_date = last_date
+        transitions.append(StageTransition(
+            demand_id=demand_id, from_stage=last_stage, stage=stage, stage_number=STAGE_ORDER.get(stage),
+            effective_date=effective_date, source=source,
+        ))
+
+    StageTransition.objects.bulk_create(transitions, batch_size=500)
+    return [
+        (ChangeEvent.Kind.STAGE_CHANGED, transition.demand_id, {
+            'from_stage': transition.from_stage, 'stage': transition.stage, 'stage_number': transition.stage_number,
+        })
+        for transition in transitions
+    ]
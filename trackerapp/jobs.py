@@ -0,0 +1,233 @@
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import archive, forecast, maintenance, reports, snapshots
+from .models import Job
+from .rollups import rebuild_rollups
+
+# Base retry delay; attempt n waits RETRY_DELAY * 2 ** (n - 1)
+RETRY_DELAY = timedelta(seconds=30)
+
+# Running jobs whose worker hasn't finished them in this long are assumed dead and requeued
+STALE_AFTER = timedelta(minutes=30)
+
+# Registered task functions by name; each is called as func(job, **job.kwargs)
+TASKS = {}
+
+
+def task(name):
+    """Register a function as a job task under `name`"""
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(task_name, max_attempts=3, delay=None, **kwargs):
+    """Queue a job and return it; the caller doesn't wait for it to run"""
+    if task_name not in TASKS:
+        raise ValueError(f'Unknown job task: {task_name}')
+
+    return Job.objects.create(
+        task=task_name,
+        kwargs=kwargs,
+        max_attempts=max_attempts,
+        run_after=timezone.now() + (delay or timedelta()),
+    )
+
+
+def set_progress(job, progress, message=''):
+    """Record progress (0-100) for the status page without touching other job fields"""
+    job.progress = progress
+    job.message = message[:255]
+    Job.objects.filter(pk=job.pk).update(progress=job.progress, message=job.message)
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _due_jobs():
+    return Job.objects.filter(status=Job.Status.QUEUED, run_after__lte=timezone.now()).order_by('run_after', 'id')
+
+
+def claim(worker):
+    """Take the next due job for `worker`, or return None when nothing is due
+
+    Databases with SELECT ... FOR UPDATE SKIP LOCKED lock the row so concurrent workers
+    skip it. SQLite has no row locks, so there the claim is a conditional UPDATE on the
+    status that only one worker can win; losers move on to the next candidate.
+    """
+    now = timezone.now()
+    claimed = {
+        'status': Job.Status.RUNNING,
+        'locked_by': worker,
+        'locked_at': now,
+        'progress': 0,
+        'message': '',
+    }
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = _due_jobs().select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            for field, value in claimed.items():
+                setattr(job, field, value)
+            job.attempts += 1
+            job.save(update_fields=[*claimed, 'attempts'])
+            return job
+
+    for job_id in _due_jobs().values_list('id', flat=True)[:10]:
+        won = Job.objects.filter(id=job_id, status=Job.Status.QUEUED).update(
+            attempts=F('attempts') + 1, **claimed
+        )
+        if won:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def run_job(job):
+    """Run a claimed job, then mark it succeeded, queue a retry or mark it failed"""
+    func = TASKS.get(job.task)
+    try:
+        if func is None:
+            raise ValueError(f'Unknown job task: {job.task}')
+        result = func(job, **job.kwargs)
+    except Exception:
+        job.error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.Status.QUEUED
+            job.run_after = timezone.now() + RETRY_DELAY * 2 ** (job.attempts - 1)
+            job.message = f'Retrying after attempt {job.attempts} of {job.max_attempts}'
+        else:
+            job.status = Job.Status.FAILED
+            job.finished_at = timezone.now()
+            job.message = f'Failed after {job.attempts} attempts'
+    else:
+        job.status = Job.Status.SUCCEEDED
+        job.result = result
+        job.progress = 100
+        job.message = ''
+        job.error = ''
+        job.finished_at = timezone.now()
+
+    job.locked_by = ''
+    job.locked_at = None
+    job.save(update_fields=[
+        'status', 'result', 'progress', 'message', 'error', 'run_after', 'locked_by', 'locked_at', 'finished_at',
+    ])
+    return job
+
+
+def requeue_stale():
+    """Put jobs left running by a crashed worker back in the queue; returns how many
+
+    claim() already counted the crashed run as an attempt, so a job that has used up
+    max_attempts is marked failed instead, and the others wait the same backoff as a
+    retry. Each update is conditional on the lock, so a worker that finishes the job
+    in the meantime wins.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.Status.RUNNING, locked_at__lt=now - STALE_AFTER)
+    requeued = 0
+    for job in stale.only('id', 'attempts', 'max_attempts', 'locked_by', 'locked_at'):
+        error = f'Worker {job.locked_by} stopped responding during attempt {job.attempts}'
+        running = Job.objects.filter(pk=job.pk, status=Job.Status.RUNNING, locked_at=job.locked_at)
+        if job.attempts < job.max_attempts:
+            requeued += running.update(
+                status=Job.Status.QUEUED, locked_by='', locked_at=None, error=error,
+                run_after=now + RETRY_DELAY * 2 ** (job.attempts - 1),
+                message=f'Retrying after attempt {job.attempts} of {job.max_attempts}',
+            )
+        else:
+            running.update(
+                status=Job.Status.FAILED, locked_by='', locked_at=None, error=error, finished_at=now,
+                message=f'Failed after {job.attempts} attempts',
+            )
+    return requeued
+
+
+def work(poll_interval=2.0, burst=False, max_jobs=None):
+    """Claim and run jobs until stopped; with burst=True, return once the queue is empty
+
+    Returns the number of jobs run.
+    """
+    worker = worker_name()
+    completed = 0
+    while max_jobs is None or completed < max_jobs:
+        close_old_connections()
+        job = claim(worker)
+        if job is None:
+            if burst:
+                break
+            requeue_stale()
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        completed += 1
+    return completed
+
+
+@task('rebuild_rollups')
+def rebuild_rollups_task(job):
+    return {'rows': rebuild_rollups()}
+
+
+@task('rebuild_stage_stats')
+def rebuild_stage_stats_task(job):
+    return {'rows': forecast.rebuild_stage_stats()}
+
+
+@task('refresh_stage_stats')
+def refresh_stage_stats_task(job, stage, file_type, file_subtype):
+    """Recompute one stage duration stats row (queued by forecast.schedule_stage_stats)"""
+    return {'samples': forecast.refresh_stage_stat(stage, file_type, file_subtype)}
+
+
+@task('warm_caches')
+def warm_caches_task(job):
+    """Fill the forecast and weekly-changes caches
+
+    Only useful when CACHES points at a backend shared with the web processes; the
+    default local-memory cache is per process.
+    """
+    set_progress(job, 10, 'Forecasting portfolio')
+    forecast.portfolio_forecast()
+    set_progress(job, 60, 'Building weekly changes')
+    reports.weekly_changes()
+    return {'cache': settings.CACHES['default']['BACKEND']}
+
+
+@task('publish_snapshots')
+def publish_snapshots_task(job, force=False):
+    return snapshots.publish(
+        force=force,
+        progress=lambda done, total: set_progress(job, done * 100 // total, f'Rendered {done} of {total} pages'),
+    )
+
+
+@task('archive_demands')
+def archive_demands_task(job):
+    """Archive the demands matched by settings.TRACKER_ARCHIVE_RULES"""
+    matched = archive.archive_candidates()
+    archived = archive.archive(set().union(*matched.values()))
+    return {'archived': len(archived), **{rule: len(ids) for rule, ids in matched.items()}}
+
+
+@task('maintain_tracker')
+def maintain_tracker_task(job, checks=maintenance.DEFAULT_CHECKS):
+    """Session cleanup, derived-state checks, ANALYZE and incremental vacuum"""
+    report = maintenance.maintain(
+        list(checks), progress=lambda name, message: set_progress(job, job.progress, f'{name}: {message}'),
+    )
+    report.pop('samples')
+    return report
@@ -0,0 +1,359 @@
+"""Database upkeep and checks of derived tracker data
+
+The maintain_tracker command (or job) runs, in order:
+
+- expired session cleanup: the dashboard writes demand_current_stages into the session
+  on most visits, so every visitor leaves a session row behind until it is cleared
+- the derived-state checks below
+- ANALYZE, so the query planner picks indexes from current table statistics
+- an incremental vacuum, which returns the pages freed by deletes to the filesystem.
+  SQLite only does this when the database was created, or converted with
+  enable_incremental_vacuum(), with auto_vacuum=INCREMENTAL
+
+Each check compares stored rows with what they are derived from and writes the
+differences with bulk_create/bulk_update, BATCH_SIZE demands at a time, each batch in
+its own transaction so the write lock is never held for long. The model signals don't
+fire for these writes, so each batch publishes the change events, records the stage
+transitions and queues the stats refresh itself, as the bulk actions do. With dry_run the
+checks only count and describe what they would change.
+"""
+from importlib import import_module
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from .bulk import data_changed
+from .events import publish_many
+from .forecast import schedule_stage_stats
+from .history import record_stage_changes
+from .models import STAGE_ORDER, ChangeEvent, Demand, DemandStagePeriod, StageTransition, WeeklyUpdate
+
+# Demands per batch
+BATCH_SIZE = 500
+# Changes described per check in a dry-run report
+SAMPLE_SIZE = 10
+
+
+class MaintenanceError(Exception):
+    pass
+
+
+class CheckResult:
+    """What a check found: rows created and updated (or to be, in a dry run) and examples"""
+
+    def __init__(self, name):
+        self.name = name
+        self.checked = 0
+        self.created = 0
+        self.updated = 0
+        self.samples = []
+        self.demand_ids = set()
+
+    def add(self, demand_id, description, created=False):
+        if created:
+            self.created += 1
+        else:
+            self.updated += 1
+        self.demand_ids.add(demand_id)
+        if len(self.samples) < SAMPLE_SIZE:
+            self.samples.append(f'#{demand_id}: {description}')
+
+    def as_dict(self):
+        return {'checked': self.checked, 'created': self.created, 'updated': self.updated, 'demands': len(self.demand_ids)}
+
+
+def stage_number_case(field):
+    """STAGE_ORDER as SQL, so stage numbers can be recomputed in one UPDATE"""
+    return Case(
+        *(When(**{field: stage}, then=Value(number)) for stage, number in STAGE_ORDER.items()),
+        default=None, output_field=IntegerField(),
+    )
+
+
+def _demand_batches(fields):
+    # Demands in primary-key chunks, as lists of values_list rows (the id first)
+    last_pk = 0
+    while True:
+        rows = list(Demand.objects.filter(pk__gt=last_pk).order_by('pk').values_list('id', *fields)[:BATCH_SIZE])
+        if rows:
+            yield rows
+        if len(rows) < BATCH_SIZE:
+            return
+        last_pk = rows[-1][0]
+
+
+def _refresh_stats(pairs):
+    # pairs: (stage, file_type, file_subtype); each distinct group is queued once
+    schedule_stage_stats(pairs)
+
+
+def check_mini_progress(dry_run=False):
+    """Span each demand's mini progress bar from its start date to get_end_date()
+
+    Creates missing bars and moves bars whose dates drifted from the demand's, as
+    add_demand and edit_demand would set them. Demands without an end date keep theirs.
+    """
+    result = CheckResult('mini_progress')
+    for rows in _demand_batches(('start_date', 'duration_months')):
+        result.checked += len(rows)
+        bars = {
+            bar.demand_id: bar
+            for bar in DemandStagePeriod.objects.filter(demand_id__in=[row[0] for row in rows], stage='mini_progress')
+        }
+        new_bars, moved_bars = [], []
+        for demand_id, start_date, duration_months in rows:
+            end_date = Demand(start_date=start_date, duration_months=duration_months).get_end_date()
+            if not end_date:
+                continue
+            bar = bars.get(demand_id)
+            if bar is None:
+                result.add(demand_id, f'create {start_date} to {end_date}', created=True)
+                new_bars.append(DemandStagePeriod(
+                    demand_id=demand_id, stage='mini_progress', start_date=start_date, end_date=end_date,
+                ))
+            elif (bar.start_date, bar.end_date) != (start_date, end_date):
+                result.add(demand_id, f'move {bar.start_date} to {bar.end_date} -> {start_date} to {end_date}')
+                bar.start_date, bar.end_date = start_date, end_date
+                moved_bars.append(bar)
+
+        if dry_run or not (new_bars or moved_bars):
+            continue
+        with transaction.atomic():
+            DemandStagePeriod.objects.bulk_create(new_bars, batch_size=BATCH_SIZE)
+            DemandStagePeriod.objects.bulk_update(moved_bars, ['start_date', 'end_date'], batch_size=BATCH_SIZE)
+            publish_many(
+                (ChangeEvent.Kind.STAGE_SAVED, bar.demand_id, {'stage_id': bar.id, 'stage': bar.stage})
+                for bar in new_bars + moved_bars
+            )
+    return result
+
+
+def check_stage_periods(dry_run=False, realign=False):
+    """Give every stage a demand reported in a weekly update a stage period
+
+    add_weekly_update and edit_weekly_update create the period of the update's stage,
+    spanning its week, when it is missing; this creates the ones that are still
+    missing, from the latest such update. With `realign`, existing periods are also
+    moved to the week of their stage's latest update, as saving that update would
+    have done; that overwrites spans set by hand since, so it is opt-in.
+    """
+    result = CheckResult('stage_period_spans' if realign else 'stage_periods')
+    for rows in _demand_batches(('file_type', 'file_subtype')):
+        groups = {demand_id: (file_type, file_subtype) for demand_id, file_type, file_subtype in rows}
+        latest = {}
+        updates = (
+            WeeklyUpdate.objects.filter(demand_id__in=groups, current_stage__in=STAGE_ORDER)
+            .order_by()
+            .values_list('demand_id', 'current_stage', 'week_number', 'week_start_date', 'week_end_date')
+        )
+        for demand_id, stage, week_number, start_date, end_date in updates:
+            key = (demand_id, stage)
+            if key not in latest or week_number > latest[key][0]:
+                latest[key] = (week_number, start_date, end_date)
+        result.checked += len(latest)
+
+        periods = {
+            (period.demand_id, period.stage): period
+            for period in DemandStagePeriod.objects.filter(demand_id__in=groups).exclude(stage='mini_progress')
+        }
+        new_periods, moved_periods = [], []
+        for (demand_id, stage), (week_number, start_date, end_date) in sorted(latest.items()):
+            period = periods.get((demand_id, stage))
+            if period is None:
+                result.add(demand_id, f'create {stage} {start_date} to {end_date} (week {week_number})', created=True)
+                new_periods.append(DemandStagePeriod(
+                    demand_id=demand_id, stage=stage, stage_number=STAGE_ORDER[stage],
+                    start_date=start_date, end_date=end_date,
+                ))
+            elif realign and (period.start_date, period.end_date) != (start_date, end_date):
+                result.add(
+                    demand_id,
+                    f'move {stage} {period.start_date} to {period.end_date} -> {start_date} to {end_date} (week {week_number})',
+                )
+                period.start_date, period.end_date = start_date, end_date
+                moved_periods.append(period)
+
+        if dry_run or not (new_periods or moved_periods):
+            continue
+        changed = {period.demand_id for period in new_periods + moved_periods}
+        with transaction.atomic():
+            DemandStagePeriod.objects.bulk_create(new_periods, batch_size=BATCH_SIZE)
+            DemandStagePeriod.objects.bulk_update(moved_periods, ['start_date', 'end_date'], batch_size=BATCH_SIZE)
+            publish_many(
+                [
+                    (ChangeEvent.Kind.STAGE_SAVED, period.demand_id, {'stage_id': period.id, 'stage': period.stage})
+                    for period in new_periods + moved_periods
+                ]
+                + record_stage_changes(changed, StageTransition.Source.STAGE_PERIOD_SAVED)
+            )
+            _refresh_stats((period.stage,) + groups[period.demand_id] for period in new_periods + moved_periods)
+    return result
+
+
+def check_stage_numbers(dry_run=False):
+    """Set stage_number to the STAGE_ORDER number of the stage on periods and weekly updates
+
+    save() keeps them in sync, but QuerySet.update(), raw SQL and imports bypass it.
+    One UPDATE per BATCH_SIZE rows.
+    """
+    result = CheckResult('stage_numbers')
+    for model, field in ((DemandStagePeriod, 'stage'), (WeeklyUpdate, 'current_stage')):
+        result.checked += model.objects.count()
+        wrong = model.objects.annotate(expected=stage_number_case(field)).exclude(
+            Q(stage_number=F('expected')) | Q(stage_number__isnull=True, expected__isnull=True)
+        )
+        pks = []
+        for demand_id, pk, stage, number, expected in wrong.order_by('pk').values_list(
+            'demand_id', 'pk', field, 'stage_number', 'expected'
+        ).iterator(chunk_size=BATCH_SIZE):
+            result.add(demand_id, f'{model._meta.model_name} {pk} ({stage}): stage_number {number} -> {expected}')
+            pks.append(pk)
+        if dry_run:
+            continue
+        with transaction.atomic():
+            for start in range(0, len(pks), BATCH_SIZE):
+                model.objects.filter(pk__in=pks[start:start + BATCH_SIZE]).update(stage_number=stage_number_case(field))
+    return result
+
+
+CHECKS = {
+    'mini_progress': check_mini_progress,
+    'stage_periods': check_stage_periods,
+    'stage_period_spans': lambda dry_run=False: check_stage_periods(dry_run, realign=True),
+    'stage_numbers': check_stage_numbers,
+}
+# stage_period_spans overwrites spans set by hand, so it only runs when asked for
+DEFAULT_CHECKS = ('mini_progress', 'stage_periods', 'stage_numbers')
+
+
+def run_checks(names=DEFAULT_CHECKS, dry_run=False, progress=None):
+    """Run the named checks; returns {name: CheckResult}"""
+    unknown = [name for name in names if name not in CHECKS]
+    if unknown:
+        raise MaintenanceError(f"Unknown checks: {', '.join(unknown)}")
+    results = {}
+    for name in names:
+        results[name] = CHECKS[name](dry_run=dry_run)
+        if progress:
+            progress(results[name])
+        if not dry_run and results[name].demand_ids:
+            data_changed(results[name].demand_ids)
+    return results
+
+
+def clear_expired_sessions(dry_run=False):
+    """Delete expired sessions; returns how many there were, or None if the engine can't count them
+
+    Cache and cookie sessions expire on their own; their clear_expired() does nothing
+    or isn't implemented.
+    """
+    store = import_module(settings.SESSION_ENGINE).SessionStore
+    count = None
+    if hasattr(store, 'get_model_class'):
+        count = store.get_model_class().objects.filter(expire_date__lt=timezone.now()).count()
+    if not dry_run and count != 0:
+        try:
+            store.clear_expired()
+        except NotImplementedError:
+            pass
+    return count
+
+
+def analyze(dry_run=False):
+    """Refresh the query planner statistics; returns False if the database has no ANALYZE"""
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        return False
+    if not dry_run:
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+    return True
+
+
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+
+def vacuum_state():
+    """SQLite's auto_vacuum mode and free pages, or None for other databases"""
+    if connection.vendor != 'sqlite':
+        return None
+    with connection.cursor() as cursor:
+        state = {}
+        for pragma in ('auto_vacuum', 'freelist_count', 'page_count', 'page_size'):
+            cursor.execute(f'PRAGMA {pragma}')
+            state[pragma] = cursor.fetchone()[0]
+    state['auto_vacuum'] = AUTO_VACUUM_MODES.get(state['auto_vacuum'], state['auto_vacuum'])
+    return state
+
+
+def incremental_vacuum(pages=None, dry_run=False):
+    """Return up to `pages` free pages (all when None) to the filesystem; returns how many were freed
+
+    Only does anything in auto_vacuum=INCREMENTAL mode; returns None otherwise.
+    """
+    state = vacuum_state()
+    if not state or state['auto_vacuum'] != 'incremental':
+        return None
+    if dry_run:
+        return state['freelist_count'] if pages is None else min(pages, state['freelist_count'])
+    if connection.in_atomic_block:
+        raise MaintenanceError('Vacuuming cannot run inside a transaction')
+    connection.ensure_connection()
+    # The pragma frees one page per step, and the sqlite3 module's execute() steps once;
+    # executescript() runs it to completion
+    connection.connection.executescript(
+        'PRAGMA incremental_vacuum' if pages is None else f'PRAGMA incremental_vacuum({int(pages)})'
+    )
+    return state['freelist_count'] - vacuum_state()['freelist_count']
+
+
+def enable_incremental_vacuum():
+    """Switch the SQLite database to auto_vacuum=INCREMENTAL
+
+    Takes a full VACUUM, which rewrites the whole file and needs as much free disk
+    space again; run it once, when nothing else is writing.
+    """
+    if connection.vendor != 'sqlite':
+        raise MaintenanceError('Incremental vacuum is SQLite only')
+    if connection.in_atomic_block:
+        raise MaintenanceError('VACUUM cannot run inside a transaction')
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        cursor.execute('VACUUM')
+    return vacuum_state()
+
+
+def maintain(checks=DEFAULT_CHECKS, dry_run=False, vacuum_pages=None, progress=None):
+    """Session cleanup, the derived-state checks, ANALYZE and an incremental vacuum
+
+    Returns a report dict; `progress` is called with each step's name and a message.
+    """
+    def step(name, message):
+        if progress:
+            progress(name, message)
+
+    report = {'dry_run': dry_run}
+    report['expired_sessions'] = clear_expired_sessions(dry_run)
+    step('sessions', f"{'unknown' if report['expired_sessions'] is None else report['expired_sessions']} expired")
+
+    done = ('to create', 'to update') if dry_run else ('created', 'updated')
+    results = run_checks(checks, dry_run, progress=lambda result: step(
+        result.name, f'{result.checked} checked, {result.created} {done[0]}, {result.updated} {done[1]}'
+    ))
+    report['checks'] = {name: result.as_dict() for name, result in results.items()}
+    report['samples'] = {name: result.samples for name, result in results.items()}
+
+    report['analyzed'] = analyze(dry_run)
+    step('analyze', 'statistics refreshed' if report['analyzed'] and not dry_run else 'skipped')
+
+    report['vacuum'] = vacuum_state()
+    report['vacuumed_pages'] = incremental_vacuum(vacuum_pages, dry_run)
+    if report['vacuum'] is None:
+        step('vacuum', 'not SQLite')
+    elif report['vacuumed_pages'] is None:
+        step('vacuum', f"auto_vacuum is {report['vacuum']['auto_vacuum']}; "
+                       f"{report['vacuum']['freelist_count']} free pages stay in the file")
+    else:
+        step('vacuum', f"{report['vacuumed_pages']} of {report['vacuum']['freelist_count']} free pages released")
+    return report
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trackerapp import archive
+from trackerapp.models import Demand, Stage
+
+
+class Command(BaseCommand):
+    help = (
+        'Archive the demands matched by settings.TRACKER_ARCHIVE_RULES (reached a final '
+        'stage, or ended long ago) so the live dashboard skips them. Options override the '
+        'configured rules; --restore puts demands back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stage', action='append', dest='stages', choices=Stage.values, metavar='STAGE',
+            help='Archive demands that reached this stage (repeatable; replaces the configured stages)',
+        )
+        parser.add_argument('--no-stage-rule', action='store_true', help='Turn off the stage rule')
+        parser.add_argument('--ended-days', type=int, help='Archive demands whose last date is this many days ago')
+        parser.add_argument('--no-ended-rule', action='store_true', help='Turn off the ended rule')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be archived without changing anything')
+        parser.add_argument('--restore', type=int, nargs='+', metavar='DEMAND_ID', help='Restore these archived demands instead')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['restore']:
+            if options['dry_run']:
+                raise CommandError('--dry-run does not apply to --restore')
+            restored = archive.restore(options['restore'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Restored {len(restored)} demands in {time.perf_counter() - started:.2f}s'
+            ))
+            return
+
+        rules = archive.archive_rules()
+        if options['stages']:
+            rules['stages'] = options['stages']
+        if options['no_stage_rule']:
+            rules['stages'] = []
+        if options['ended_days'] is not None:
+            rules['ended_days'] = options['ended_days']
+        if options['no_ended_rule']:
+            rules['ended_days'] = None
+
+        matched = archive.archive_candidates(rules)
+        demand_ids = set().union(*matched.values())
+        for rule, ids in matched.items():
+            self.stdout.write(f'{rule}: {len(ids)} demands')
+
+        if options['dry_run']:
+            for demand in Demand.objects.filter(id__in=demand_ids).order_by('id').only('id', 'name'):
+                self.stdout.write(f'  #{demand.id} {demand.name}')
+            self.stdout.write(f'Would archive {len(demand_ids)} demands')
+            return
+
+        archived = archive.archive(demand_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {len(archived)} demands in {time.perf_counter() - started:.2f}s; '
+            f'{Demand.objects.active().count()} remain on the dashboard'
+        ))
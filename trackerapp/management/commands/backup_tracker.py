@@ -0,0 +1,66 @@
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trackerapp import backup
+
+
+def _peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        'Back up demands, stage periods, weekly updates and stage transitions to a '
+        'gzip-compressed JSON Lines file, read in primary-key chunks. '
+        '--compare-dumpdata also runs dumpdata on the same models and compares throughput.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Backup file to write, e.g. tracker.jsonl.gz')
+        parser.add_argument('--chunk-size', type=int, default=backup.CHUNK_SIZE, help='Rows per query')
+        parser.add_argument(
+            '--compare-dumpdata', action='store_true',
+            help='Also run dumpdata --format jsonl to a temporary .gz file in a child process and '
+                 'compare time, size and peak memory',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = backup.dump(
+            options['path'], chunk_size=options['chunk_size'],
+            progress=lambda label, count: self.stdout.write(f'{label}: {count} rows'),
+        )
+        elapsed = time.perf_counter() - started
+        rows = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Backed up {rows} rows to {options['path']} ({os.path.getsize(options['path']) / 1024 / 1024:.1f} MB) "
+            f'in {elapsed:.2f}s, {rows / elapsed if elapsed else 0:.0f} rows/s, peak RSS {_peak_rss_mb():.0f} MB'
+        ))
+        if options['compare_dumpdata']:
+            self.compare_dumpdata(rows)
+
+    def compare_dumpdata(self, rows):
+        # A child process, so its peak RSS is its own
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'dumpdata.jsonl.gz')
+            labels = [model._meta.label for model in backup.MODELS]
+            started = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable, '-m', 'django', 'dumpdata', *labels, '--format', 'jsonl', '--output', path],
+                env={**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ['DJANGO_SETTINGS_MODULE']},
+                capture_output=True, text=True,
+            )
+            elapsed = time.perf_counter() - started
+            if result.returncode:
+                raise CommandError(f'dumpdata failed: {result.stderr.strip()}')
+            self.stdout.write(
+                f'dumpdata: {elapsed:.2f}s, {rows / elapsed if elapsed else 0:.0f} rows/s, '
+                f'{os.path.getsize(path) / 1024 / 1024:.1f} MB, peak RSS {_peak_rss_mb(resource.RUSAGE_CHILDREN):.0f} MB'
+            )
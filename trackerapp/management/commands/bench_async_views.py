@@ -0,0 +1,223 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from io import BytesIO
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.urls import reverse
+
+from trackerapp.models import Demand
+
+# Any 32 alphanumeric characters are a valid unmasked CSRF token
+CSRF_TOKEN = 'benchmark' * 3 + 'token'
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test the JSON endpoints with concurrent clients, once as sync views behind '
+        'the WSGI handler and once as trackerapp.async_views behind the ASGI handler, and '
+        'report requests per second and p50/p99 latency for each.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=16, help='Concurrent clients')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per server mode')
+        parser.add_argument('--mode', choices=['wsgi', 'asgi'], help=(
+            'Run a single mode in this process (used internally; the URLconf must match '
+            'TRACKER_ASYNC_VIEWS)'
+        ))
+        parser.add_argument('--demand', type=int, help='Demand the write requests update (with --mode)')
+
+    def handle(self, *args, **options):
+        if options['mode']:
+            self.run_mode(options)
+            return
+
+        demand = Demand.objects.create(name='[bench] async views', start_date=date.today(), duration_months=12)
+        try:
+            self.stdout.write(f"{options['clients']} clients, {options['requests']} requests per mode")
+            for mode in ('wsgi', 'asgi'):
+                result = self.spawn(mode, demand.id, options)
+                self.stdout.write(
+                    f"{mode} ({result['views']} views): {result['rps']:.1f} req/s, "
+                    f"p50 {result['p50']:.1f} ms, p99 {result['p99']:.1f} ms, {result['errors']} errors"
+                )
+        finally:
+            demand.delete()
+
+    def spawn(self, mode, demand_id, options):
+        # The URLconf picks sync or async views at import time, so each mode gets its own process
+        env = dict(os.environ, TRACKER_ASYNC_VIEWS='1' if mode == 'asgi' else '0')
+        completed = subprocess.run(
+            [
+                sys.executable, '-m', 'django', 'bench_async_views',
+                '--mode', mode, '--demand', str(demand_id),
+                '--clients', str(options['clients']), '--requests', str(options['requests']),
+            ],
+            env=env, cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if completed.returncode != 0:
+            raise CommandError(f'{mode} run failed:\n{completed.stderr}')
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    def request_mix(self, demand_id):
+        """(method, path, query, form) tuples cycled by every client: four reads, one write"""
+        return [
+            ('GET', reverse('debug_demand_stages', kwargs={'demand_id': demand_id}), '', None),
+            ('GET', reverse('portfolio_snapshot'), '', None),
+            ('GET', reverse('trends_data'), '', None),
+            ('GET', reverse('portfolio_forecast_data'), '', None),
+            ('POST', reverse('update_weekly_progress'), '', {
+                'demand_id': demand_id, 'weekly_update_progress': 'benchmark',
+            }),
+        ]
+
+    def run_mode(self, options):
+        if options['demand'] is None:
+            raise CommandError('--mode needs --demand')
+        expect_async = options['mode'] == 'asgi'
+        if settings.TRACKER_ASYNC_VIEWS != expect_async:
+            raise CommandError(f"--mode {options['mode']} needs TRACKER_ASYNC_VIEWS={int(expect_async)}")
+
+        mix = self.request_mix(options['demand'])
+        run = self.run_asgi if expect_async else self.run_wsgi
+        started = time.perf_counter()
+        samples = run(mix, options['clients'], options['requests'])
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for latency, _ in samples)
+        self.stdout.write(json.dumps({
+            'views': 'async' if expect_async else 'sync',
+            'rps': len(samples) / elapsed,
+            'p50': latencies[len(latencies) // 2] * 1000,
+            'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+            'errors': sum(1 for _, status in samples if status != 200),
+        }))
+
+    def encode(self, form):
+        return urlencode(form).encode() if form else b''
+
+    def run_wsgi(self, mix, clients, total):
+        from django.core.handlers.wsgi import WSGIHandler
+
+        handler = WSGIHandler()
+        samples = []
+        lock = threading.Lock()
+        counter = iter(range(total))
+
+        def call(method, path, query, form):
+            body = self.encode(form)
+            environ = {
+                'REQUEST_METHOD': method,
+                'PATH_INFO': path,
+                'QUERY_STRING': query,
+                'SERVER_NAME': 'testserver',
+                'SERVER_PORT': '80',
+                'HTTP_HOST': 'testserver',
+                'HTTP_COOKIE': f'{settings.CSRF_COOKIE_NAME}={CSRF_TOKEN}',
+                'HTTP_X_CSRFTOKEN': CSRF_TOKEN,
+                'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest',
+                'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+                'CONTENT_LENGTH': str(len(body)),
+                'wsgi.input': BytesIO(body),
+                'wsgi.errors': sys.stderr,
+                'wsgi.url_scheme': 'http',
+                'wsgi.version': (1, 0),
+                'wsgi.multithread': True,
+                'wsgi.multiprocess': False,
+                'wsgi.run_once': False,
+            }
+            status = []
+            response = handler(environ, lambda s, headers, exc_info=None: status.append(int(s.split()[0])))
+            try:
+                b''.join(response)
+            finally:
+                response.close()
+            return status[0]
+
+        def client():
+            try:
+                for i in counter:
+                    started = time.perf_counter()
+                    status = call(*mix[i % len(mix)])
+                    with lock:
+                        samples.append((time.perf_counter() - started, status))
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(clients) as pool:
+            for _ in range(clients):
+                pool.submit(client)
+        return samples
+
+    def run_asgi(self, mix, clients, total):
+        from django.core.handlers.asgi import ASGIHandler
+
+        handler = ASGIHandler()
+        samples = []
+
+        async def call(method, path, query, form):
+            body = self.encode(form)
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': method,
+                'scheme': 'http',
+                'path': path,
+                'raw_path': path.encode(),
+                'query_string': query.encode(),
+                'root_path': '',
+                'server': ('testserver', 80),
+                'client': ('127.0.0.1', 50000),
+                'headers': [
+                    (b'host', b'testserver'),
+                    (b'cookie', f'{settings.CSRF_COOKIE_NAME}={CSRF_TOKEN}'.encode()),
+                    (b'x-csrftoken', CSRF_TOKEN.encode()),
+                    (b'x-requested-with', b'XMLHttpRequest'),
+                    (b'content-type', b'application/x-www-form-urlencoded'),
+                    (b'content-length', str(len(body)).encode()),
+                ],
+            }
+            messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+            status = []
+            done = asyncio.Event()
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                # Only asked again to watch for a disconnect; hold until the response is sent
+                await done.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+                elif message['type'] == 'http.response.body' and not message.get('more_body'):
+                    done.set()
+
+            await handler(scope, receive, send)
+            return status[0]
+
+        async def main():
+            counter = iter(range(total))
+
+            async def client():
+                for i in counter:
+                    started = time.perf_counter()
+                    status = await call(*mix[i % len(mix)])
+                    samples.append((time.perf_counter() - started, status))
+
+            await asyncio.gather(*(client() for _ in range(clients)))
+
+        asyncio.run(main())
+        return samples
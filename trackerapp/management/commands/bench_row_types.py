@@ -0,0 +1,103 @@
+import gc
+import random
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+from trackerapp.rows import DemandPosition, DetailBox, StageBar, as_dict, empty_detail_box
+from trackerapp.stages import get_stage_catalog
+
+DETAIL_BOXES = 26
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the dashboard's per-demand stage bars, detail boxes and positions for a "
+        'synthetic portfolio, once as the trackerapp.rows types and once as the dicts '
+        'demand_list used to build, and report time and tracemalloc memory for each. '
+        'Uses no database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--demands', type=int, default=10000, help='Synthetic demands')
+        parser.add_argument('--stages', type=int, default=8, help='Stage periods per demand')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    def handle(self, *args, **options):
+        self.catalog = get_stage_catalog()
+        self.stdout.write(
+            f"{options['demands']} demands, {options['stages']} stage periods and "
+            f"{DETAIL_BOXES} detail boxes each"
+        )
+        for label, convert in (('dicts', as_dict), ('row types', None)):
+            rows, elapsed, current, peak, blocks = self.measure(options, convert)
+            self.stdout.write(
+                f'{label}: {elapsed:.2f} s, {current / 1024 / 1024:.1f} MB retained, '
+                f'{peak / 1024 / 1024:.1f} MB peak, {blocks} blocks'
+            )
+            del rows
+
+    def measure(self, options, convert):
+        rng = random.Random(options['seed'])
+        gc.collect()
+        tracemalloc.start()
+        started = time.perf_counter()
+        rows = [self.build_row(rng, index, options['stages'], convert) for index in range(options['demands'])]
+        elapsed = time.perf_counter() - started
+        current, peak = tracemalloc.get_traced_memory()
+        blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+        tracemalloc.stop()
+        return rows, elapsed, current, peak, blocks
+
+    def build_row(self, rng, index, stage_count, convert):
+        """One demand's stages, stage_detail_boxes and position, shaped like _demand_row()'s"""
+        demand_start = date(2025, 1, 1) + timedelta(days=rng.randrange(730))
+        demand_end = demand_start + timedelta(days=rng.randrange(90, 720))
+        stage_names = list(self.catalog.numbers)
+
+        bars = []
+        boxes = []
+        cursor = demand_start
+        for number in range(1, stage_count + 1):
+            stage = rng.choice(stage_names)
+            start = cursor
+            end = start + timedelta(days=rng.randrange(7, 60))
+            cursor = end + timedelta(days=1)
+            bars.append(StageBar(
+                id=index * 100 + number,
+                stage=stage,
+                stage_number=self.catalog.numbers[stage],
+                stage_verbose=self.catalog.labels[stage],
+                color=self.catalog.colors.get(stage, '#888'),
+                start_percent=rng.uniform(0, 90),
+                width_percent=rng.uniform(1, 10),
+                relative_start_percent=rng.uniform(0, 90),
+                relative_width_percent=rng.uniform(1, 10),
+                duration=(end - start).days + 1,
+                start=start,
+                end=end,
+                span_start=start,
+                span_end=end,
+                quarter_start_pos=rng.uniform(0, 90),
+                quarter_end_pos=rng.uniform(10, 100),
+                quarter_width=rng.uniform(1, 10),
+                number=self.catalog.numbers[stage],
+                should_show_number=True,
+            ))
+            boxes.append(DetailBox(
+                number, (end - start).days + 1, self.catalog.colors.get(stage, '#888'), index * 100 + number,
+                self.catalog.labels[stage], start, end, True,
+            ))
+        for number in range(stage_count + 1, DETAIL_BOXES + 1):
+            boxes.append(empty_detail_box(number, rng.random() < 0.5))
+
+        position = DemandPosition(
+            rng.uniform(0, 90), rng.uniform(1, 10), demand_start, demand_end, (demand_end - demand_start).days + 1,
+        )
+        if convert is not None:
+            bars = [convert(bar) for bar in bars]
+            boxes = [convert(box) for box in boxes]
+            position = convert(position)
+        return {'stages': bars, 'stage_detail_boxes': boxes, 'position': position}
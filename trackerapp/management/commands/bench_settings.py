@@ -0,0 +1,146 @@
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from io import BytesIO
+from statistics import median
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from trackerapp.models import Demand
+
+SETTINGS_MODULES = ('mastertracker.settings', 'mastertracker.settings_production')
+
+
+class Command(BaseCommand):
+    help = (
+        'Start a process for each settings module (mastertracker.settings and '
+        'mastertracker.settings_production by default) and report how long startup and '
+        'the first request take, then the median warm request time, response size and '
+        'peak memory for the dashboard, JSON and API pages.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--settings-module', action='append', dest='modules', metavar='MODULE',
+            help='Settings module to compare (repeatable; default the development and production settings)',
+        )
+        parser.add_argument('--requests', type=int, default=20, help='Warm requests per page')
+        parser.add_argument('--child', action='store_true', help='Measure this process (used internally)')
+        parser.add_argument('--started', type=float, help='time.time() when the child was started (with --child)')
+
+    def handle(self, *args, **options):
+        if options['child']:
+            self.run_child(options)
+            return
+
+        self.stdout.write(f"{options['requests']} warm requests per page")
+        for module in options['modules'] or SETTINGS_MODULES:
+            result = self.spawn(module, options)
+            self.stdout.write(
+                f"{module} (DEBUG={result['debug']}, sessions {result['sessions']}, "
+                f"CONN_MAX_AGE={result['conn_max_age']}): startup {result['startup'] * 1000:.0f} ms, "
+                f"peak RSS {result['peak_rss_mb']:.1f} MB"
+            )
+            for page in result['pages']:
+                self.stdout.write(
+                    f"  {page['name']}: first {page['first'] * 1000:.1f} ms, "
+                    f"warm p50 {page['p50'] * 1000:.1f} ms, {page['bytes']} bytes"
+                    f"{' gzip' if page['gzip'] else ''}"
+                )
+
+    def spawn(self, module, options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=module)
+        completed = subprocess.run(
+            [
+                sys.executable, '-m', 'django', 'bench_settings', '--child',
+                '--requests', str(options['requests']), '--started', repr(time.time()),
+            ],
+            env=env, cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if completed.returncode != 0:
+            raise CommandError(f'{module} run failed:\n{completed.stderr}')
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    def pages(self):
+        """(name, path, query) of the pages measured"""
+        demand_id = Demand.objects.order_by('id').values_list('id', flat=True).first()
+        pages = [
+            ('dashboard', reverse('demand_list'), ''),
+            ('portfolio snapshot', reverse('portfolio_snapshot'), ''),
+            ('trends data', reverse('trends_data'), ''),
+            ('api demands', reverse('api_collection', kwargs={'resource': 'demands'}), 'limit=100'),
+        ]
+        if demand_id is not None:
+            pages.append(('weekly history', reverse('weekly_history', kwargs={'demand_id': demand_id}), ''))
+        return pages
+
+    def run_child(self, options):
+        from django.core.handlers.wsgi import WSGIHandler
+
+        # Startup: interpreter, django.setup() and the handler with its middleware and URLconf
+        handler = WSGIHandler()
+        reverse('demand_list')
+        startup = time.time() - options['started'] if options['started'] else None
+        cookies = {}
+
+        def call(path, query):
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path,
+                'QUERY_STRING': query,
+                'SERVER_NAME': 'testserver',
+                'SERVER_PORT': '80',
+                'HTTP_HOST': 'testserver',
+                'HTTP_ACCEPT_ENCODING': 'gzip',
+                'HTTP_COOKIE': '; '.join(f'{name}={value}' for name, value in cookies.items()),
+                'wsgi.input': BytesIO(),
+                'wsgi.errors': sys.stderr,
+                'wsgi.url_scheme': 'http',
+                'wsgi.version': (1, 0),
+                'wsgi.multithread': False,
+                'wsgi.multiprocess': True,
+                'wsgi.run_once': False,
+            }
+            started = time.perf_counter()
+            headers = {}
+
+            def start_response(status, response_headers, exc_info=None):
+                headers['status'] = int(status.split()[0])
+                headers['items'] = response_headers
+
+            response = handler(environ, start_response)
+            try:
+                body = b''.join(response)
+            finally:
+                response.close()
+            elapsed = time.perf_counter() - started
+            if headers['status'] != 200:
+                raise CommandError(f"{path} returned {headers['status']}")
+            for name, value in headers['items']:
+                if name.lower() == 'set-cookie':
+                    # Keep the session, as a browser would
+                    cookie_name, _, rest = value.partition('=')
+                    cookies[cookie_name] = rest.split(';', 1)[0]
+            encoding = dict((name.lower(), value) for name, value in headers['items']).get('content-encoding')
+            return elapsed, len(body), encoding == 'gzip'
+
+        pages = []
+        for name, path, query in self.pages():
+            first, size, gzipped = call(path, query)
+            warm = [call(path, query)[0] for _ in range(options['requests'])]
+            pages.append({'name': name, 'first': first, 'p50': median(warm), 'bytes': size, 'gzip': gzipped})
+
+        self.stdout.write(json.dumps({
+            'debug': settings.DEBUG,
+            'sessions': settings.SESSION_ENGINE.rsplit('.', 1)[-1],
+            'conn_max_age': settings.DATABASES['default'].get('CONN_MAX_AGE', 0),
+            'startup': startup,
+            # ru_maxrss is in kilobytes on Linux
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            'pages': pages,
+        }))
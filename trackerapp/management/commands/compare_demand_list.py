@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from trackerapp import equivalence
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the dashboard view with an alternative implementation on randomized '
+        'synthetic portfolios in a throwaway test database. Reports every field of the '
+        'template context, session or HTML that differs, and the speedup. Exits with an '
+        'error if anything differs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'candidate', nargs='?', default='trackerapp.views.demand_list',
+            help='Dotted path of the view to check (default: the baseline itself, as a self-check)',
+        )
+        parser.add_argument('--baseline', default='trackerapp.views.demand_list', help='Dotted path of the reference view')
+        parser.add_argument('--portfolios', type=int, default=20, help='Random portfolios to generate')
+        parser.add_argument('--demands', type=int, default=30, help='Demands per portfolio')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed calls per view and case (best is kept)')
+        parser.add_argument('--tolerance', type=float, default=1e-9, help='Largest float difference treated as equal')
+        parser.add_argument('--show', type=int, default=20, help='Differences to print')
+
+    def handle(self, *args, **options):
+        try:
+            baseline = equivalence.load_view(options['baseline'])
+            candidate = equivalence.load_view(options['candidate'])
+        except (ImportError, AttributeError, ValueError) as exc:
+            raise CommandError(f'Cannot load view: {exc}')
+
+        report = equivalence.run(
+            baseline, candidate,
+            portfolios=options['portfolios'],
+            demands=options['demands'],
+            seed=options['seed'],
+            repeat=options['repeat'],
+            tolerance=options['tolerance'],
+            progress=lambda done, total: self.stdout.write(f'Compared portfolio {done} of {total}'),
+        )
+
+        differences = report['differences']
+        for case, path, expected, actual in differences[:options['show']]:
+            self.stdout.write(f'{case}: {path}\n  baseline:  {expected!r}\n  candidate: {actual!r}')
+        if len(differences) > options['show']:
+            self.stdout.write(f"... and {len(differences) - options['show']} more")
+
+        speedup = report['baseline_seconds'] / report['candidate_seconds'] if report['candidate_seconds'] else 0
+        self.stdout.write(
+            f"{report['cases']} cases: baseline {report['baseline_seconds']:.3f} s and "
+            f"{report['baseline_queries']} queries, candidate {report['candidate_seconds']:.3f} s and "
+            f"{report['candidate_queries']} queries ({speedup:.2f}x)"
+        )
+        if differences:
+            raise CommandError(f"{len(differences)} differences in {len({case for case, *_ in differences})} cases")
+        self.stdout.write(self.style.SUCCESS('No differences'))
@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trackerapp import maintenance
+
+
+class Command(BaseCommand):
+    help = (
+        'Clear expired sessions, check and rebuild derived data (mini progress bars, stage '
+        'periods from weekly updates, stage numbers) in batches, then ANALYZE and run an '
+        'incremental vacuum. --dry-run reports what would change.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing anything')
+        parser.add_argument(
+            '--check', action='append', dest='checks', choices=list(maintenance.CHECKS), metavar='CHECK',
+            help=f"Run this check (repeatable; default {', '.join(maintenance.DEFAULT_CHECKS)}; "
+                 f"choices {', '.join(maintenance.CHECKS)})",
+        )
+        parser.add_argument('--no-checks', action='store_true', help='Only do the database upkeep')
+        parser.add_argument('--vacuum-pages', type=int, help='Free at most this many pages (default all)')
+        parser.add_argument(
+            '--enable-incremental-vacuum', action='store_true',
+            help='Switch SQLite to auto_vacuum=INCREMENTAL first; takes a full VACUUM of the file',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        dry_run = options['dry_run']
+        checks = () if options['no_checks'] else options['checks'] or maintenance.DEFAULT_CHECKS
+
+        if options['enable_incremental_vacuum']:
+            if dry_run:
+                raise CommandError('--dry-run does not apply to --enable-incremental-vacuum')
+            try:
+                state = maintenance.enable_incremental_vacuum()
+            except maintenance.MaintenanceError as exc:
+                raise CommandError(str(exc))
+            self.stdout.write(
+                f"vacuum: auto_vacuum is {state['auto_vacuum']} after {time.perf_counter() - started:.2f}s"
+            )
+
+        step_started = [time.perf_counter()]
+
+        def progress(name, message):
+            now = time.perf_counter()
+            self.stdout.write(f'{name}: {message} ({now - step_started[0]:.2f}s)')
+            step_started[0] = now
+
+        report = maintenance.maintain(checks, dry_run=dry_run, vacuum_pages=options['vacuum_pages'], progress=progress)
+
+        if dry_run:
+            for name, samples in report['samples'].items():
+                for sample in samples:
+                    self.stdout.write(f'  {name} {sample}')
+            changes = sum(result['created'] + result['updated'] for result in report['checks'].values())
+            self.stdout.write(f'Would change {changes} rows; nothing was written')
+            return
+        self.stdout.write(self.style.SUCCESS(f'Maintenance finished in {time.perf_counter() - started:.2f}s'))
@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from trackerapp.snapshots import publish
+
+
+class Command(BaseCommand):
+    help = (
+        'Render the dashboard, file type pages, weekly summary and weekly history pages '
+        'to precompressed static HTML in TRACKER_SNAPSHOT_DIR, skipping pages whose data '
+        'has not changed since the last run'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, help='Worker processes (default: CPU count)')
+        parser.add_argument('--force', action='store_true', help='Render every page')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = publish(processes=options['processes'], force=options['force'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {result['rendered']} page(s), removed {result['removed']}, "
+            f"{result['bytes'] / 1024:.0f} KiB to {settings.TRACKER_SNAPSHOT_DIR} "
+            f"in {time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from trackerapp.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the weekly portfolio rollup table from all weekly updates'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {count} rollup rows in {time.perf_counter() - started:.2f}s'
+        ))
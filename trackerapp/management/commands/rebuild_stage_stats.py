@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from trackerapp.forecast import rebuild_stage_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild stage duration statistics by file type/subtype from all stage periods'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rebuild_stage_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {count} stage duration stat rows in {time.perf_counter() - started:.2f}s'
+        ))
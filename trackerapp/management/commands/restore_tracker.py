@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trackerapp import backup
+
+
+class Command(BaseCommand):
+    help = (
+        'Restore a backup_tracker file with bulk_create, in one transaction with foreign '
+        'key checks deferred to the end, then rebuild the weekly rollups and stage '
+        'duration stats and publish change events for the restored and removed rows.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Backup file written by backup_tracker')
+        parser.add_argument('--chunk-size', type=int, default=backup.CHUNK_SIZE, help='Rows per bulk_create')
+        parser.add_argument(
+            '--replace', action='store_true',
+            help='Delete the current demands, stage periods, weekly updates and transitions first',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            counts = backup.load(
+                options['path'], replace=options['replace'], chunk_size=options['chunk_size'],
+                progress=lambda label, count: self.stdout.write(f'{label}: {count} rows'),
+            )
+        except (backup.BackupError, OSError) as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+        rows = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Restored {rows} rows in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:.0f} rows/s, '
+            'including the rollup and stats rebuild)'
+        ))
@@ -0,0 +1,47 @@
+import multiprocessing
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _worker_main(options):
+    # Spawned (non-fork) workers start without Django set up
+    django.setup()
+    from trackerapp.jobs import work
+
+    try:
+        return work(poll_interval=options['poll_interval'], burst=options['burst'])
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Run background jobs from the trackerapp Job table in a pool of worker processes. '
+        'Use --burst to exit once the queue is empty (e.g. from cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2, help='Number of worker processes')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds between polls of an empty queue')
+        parser.add_argument('--burst', action='store_true', help='Exit when no jobs are due')
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        worker_options = {'poll_interval': options['poll_interval'], 'burst': options['burst']}
+        self.stdout.write(f'Starting {processes} job worker(s)' + (' in burst mode' if options['burst'] else ''))
+
+        if processes == 1:
+            completed = [_worker_main(worker_options)]
+        else:
+            # Forked workers must not share this process's database connection
+            connections.close_all()
+            with multiprocessing.Pool(processes) as pool:
+                try:
+                    completed = pool.map(_worker_main, [worker_options] * processes)
+                except KeyboardInterrupt:
+                    pool.terminate()
+                    raise
+
+        self.stdout.write(self.style.SUCCESS(f'Ran {sum(completed)} job(s)'))
@@ -0,0 +1,141 @@
+import threading
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from django.test import Client
+from django.urls import reverse
+
+from trackerapp.models import Demand
+
+# Name prefix of the demands the writers write to
+STRESS_PREFIX = '[stress] '
+
+
+class Command(BaseCommand):
+    help = (
+        'Run parallel weekly-update writers and dashboard readers against the tracker '
+        'views and report throughput and "database is locked" errors. Run it once per '
+        'TRACKER_DB_PROFILE to compare the default and production SQLite settings. '
+        'The demands it writes to are deleted afterwards, also when it is interrupted; '
+        'a run that was killed outright leaves them for the next run to delete.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help='Number of writer threads')
+        parser.add_argument('--readers', type=int, default=4, help='Number of reader threads')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run')
+
+    def handle(self, *args, **options):
+        writers = options['writers']
+        readers = options['readers']
+        duration = options['duration']
+
+        # Left behind by a run that was killed before it could clean up
+        Demand.objects.filter(name__startswith=STRESS_PREFIX).delete()
+
+        demands = []
+        stats = {'write': [], 'read': []}
+        lock = threading.Lock()
+        # Set at the deadline, or early when the run is interrupted
+        stop = threading.Event()
+
+        def record(kind, elapsed, ok, locked):
+            with lock:
+                stats[kind].append((elapsed, ok, locked))
+
+        def write_loop(demand):
+            client = Client()
+            url = reverse('add_weekly_update', kwargs={'demand_id': demand.id})
+            week = 0
+            try:
+                while not stop.is_set():
+                    week += 1
+                    week_start = demand.start_date + timedelta(weeks=week - 1)
+                    started = time.perf_counter()
+                    ok, locked = False, False
+                    try:
+                        response = client.post(url, {
+                            'week_number': week,
+                            'week_start_date': week_start.isoformat(),
+                            'week_end_date': (week_start + timedelta(days=6)).isoformat(),
+                            'current_stage': '',
+                            'challenges': 'stress test',
+                            'achievements': 'stress test',
+                        })
+                        ok = response.status_code == 302
+                    except OperationalError as e:
+                        locked = 'locked' in str(e)
+                    record('write', time.perf_counter() - started, ok, locked)
+            finally:
+                connections.close_all()
+
+        def read_loop(index):
+            client = Client()
+            urls = [reverse('demand_list')] + [
+                reverse('weekly_history', kwargs={'demand_id': d.id}) for d in demands
+            ]
+            i = index
+            try:
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    ok, locked = False, False
+                    try:
+                        response = client.get(urls[i % len(urls)])
+                        ok = response.status_code == 200
+                    except OperationalError as e:
+                        locked = 'locked' in str(e)
+                    record('read', time.perf_counter() - started, ok, locked)
+                    i += 1
+            finally:
+                connections.close_all()
+
+        self.stdout.write(
+            f'Profile: {settings.TRACKER_DB_PROFILE} | '
+            f'{writers} writers, {readers} readers, {duration:.0f}s'
+        )
+        threads = []
+        try:
+            for i in range(writers):
+                demands.append(Demand.objects.create(
+                    name=f'{STRESS_PREFIX}writer {i}',
+                    start_date=date.today(),
+                    duration_months=12,
+                ))
+
+            threads = [threading.Thread(target=write_loop, args=(d,)) for d in demands]
+            threads += [threading.Thread(target=read_loop, args=(i,)) for i in range(readers)]
+            for thread in threads:
+                thread.start()
+            stop.wait(duration)
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+            for kind in ('write', 'read'):
+                self.report(kind, stats[kind], duration)
+        finally:
+            # Writers must be done before their demands go, or they recreate rows for them
+            stop.set()
+            for thread in threads:
+                if thread.is_alive():
+                    thread.join()
+            Demand.objects.filter(id__in=[d.id for d in demands]).delete()
+
+    def report(self, kind, samples, duration):
+        if not samples:
+            self.stdout.write(f'{kind}: no requests completed')
+            return
+
+        latencies = sorted(elapsed for elapsed, _, _ in samples)
+        succeeded = sum(1 for _, ok, _ in samples if ok)
+        locked = sum(1 for _, _, was_locked in samples if was_locked)
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+
+        self.stdout.write(
+            f'{kind}: {len(samples)} requests, {succeeded / duration:.1f} ok/s, '
+            f'{locked} lock errors, p50 {p50:.1f} ms, p99 {p99:.1f} ms'
+        )
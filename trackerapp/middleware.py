@@ -0,0 +1,80 @@
+import zlib
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.middleware.gzip import GZipMiddleware
+
+from .snapshots import snapshot_path
+
+
+class SnapshotMiddleware:
+    """Answer anonymous GETs of published pages from the static snapshots (see trackerapp.snapshots)
+
+    Enabled with TRACKER_SERVE_SNAPSHOTS. Sends the precompressed .gz file to clients
+    that accept gzip, and the CSRF cookie the page's script copies into its forms.
+    Must come after AuthenticationMiddleware and MessageMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.TRACKER_SERVE_SNAPSHOTS or request.method not in ('GET', 'HEAD'):
+            return None
+        if request.user.is_authenticated or len(getattr(request, '_messages', ())):
+            # Signed-in users and pages with pending flash messages get the live view
+            return None
+
+        path = snapshot_path(request)
+        if path is None:
+            return None
+
+        gzip_path = path.with_name(path.name + '.gz')
+        use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '') and gzip_path.exists()
+        response = HttpResponse(
+            (gzip_path if use_gzip else path).read_bytes(),
+            content_type='text/html; charset=utf-8',
+        )
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+        response['Vary'] = 'Accept-Encoding'
+        response['X-Tracker-Snapshot'] = path.name
+        # CsrfViewMiddleware sets (or renews) the cookie on the way out
+        get_token(request)
+        return response
+
+
+def _gzip_chunks(chunks):
+    # One gzip stream, flushed after each chunk so the client can decode what it has so far
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class StreamingGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that keeps streamed responses streaming
+
+    Django compresses a streamed response through a GzipFile that is never flushed, so
+    nothing reaches the browser until the compressor's buffer fills: the streamed
+    dashboard would lose its early header and timeline. Here each chunk is flushed as
+    it is yielded. Event streams are sent uncompressed.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming and response.get('Content-Type', '').startswith('text/event-stream'):
+            return response
+        if not response.streaming or response.is_async or response.has_header('Content-Encoding'):
+            return super().process_response(request, response)
+
+        chunks = response.streaming_content
+        response = super().process_response(request, response)
+        if response.get('Content-Encoding') == 'gzip':
+            response.streaming_content = _gzip_chunks(chunks)
+        return response
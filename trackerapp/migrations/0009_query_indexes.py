@@ -0,0 +1,25 @@
+# Generated by Django 5.2.3 on 2026-10-19 08:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackerapp', '0008_demand_selected_stages'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='demand',
+            index=models.Index(fields=['file_type', 'name'], name='demand_file_type_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='demand',
+            index=models.Index(fields=['name'], name='demand_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weeklyupdate',
+            index=models.Index(fields=['demand', 'current_stage', 'week_start_date'], name='weekly_demand_stage_start_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.3 on 2026-10-19 08:14
+
+from django.db import migrations, models
+
+# Stage values in STAGE_ORDER order, frozen at the time of this migration
+STAGE_SEQUENCE = [
+    'demand_to_be_initiated', 'demand_initiated', 'spc_cleared', 'demand_approved',
+    'tender_enquiry_floated', 'receipt_of_quotations', 'tender_opening', 'tcec_approved',
+    'tpc_approved', 'financial_sanction', 'order_placement', 'pdr',
+    'so_for_critical_bom_by_dev_partner', 'ddr', 'cdr', 'acceptance_of_critical_bom_by_dev_partner',
+    'realization_completed', 'fat_completed', 'atp_qtp_completed', 'delivery_at_stores',
+    'sat_soft', 'inward_inspection_clearance', 'payment_process', 'partially_paid',
+    'payment_released', 'available_for_integration',
+]
+
+
+def backfill_stage_numbers(apps, schema_editor):
+    DemandStagePeriod = apps.get_model('trackerapp', 'DemandStagePeriod')
+    WeeklyUpdate = apps.get_model('trackerapp', 'WeeklyUpdate')
+
+    for number, stage in enumerate(STAGE_SEQUENCE):
+        DemandStagePeriod.objects.filter(stage=stage).update(stage_number=number)
+        WeeklyUpdate.objects.filter(current_stage=stage).update(stage_number=number)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackerapp', '0009_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='demandstageperiod',
+            name='stage_number',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='weeklyupdate',
+            name='stage_number',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='demandstageperiod',
+            index=models.Index(fields=['demand', 'stage_number'], name='stage_demand_number_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weeklyupdate',
+            index=models.Index(fields=['demand', 'stage_number'], name='weekly_demand_number_idx'),
+        ),
+        migrations.RunPython(backfill_stage_numbers, migrations.RunPython.noop),
+    ]
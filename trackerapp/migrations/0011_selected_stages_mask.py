@@ -0,0 +1,55 @@
+# Generated by Django 5.2.3 on 2026-10-19 08:15
+
+from django.db import migrations, models
+
+# Stage values in STAGE_ORDER order, frozen at the time of this migration
+STAGE_SEQUENCE = [
+    'demand_to_be_initiated', 'demand_initiated', 'spc_cleared', 'demand_approved',
+    'tender_enquiry_floated', 'receipt_of_quotations', 'tender_opening', 'tcec_approved',
+    'tpc_approved', 'financial_sanction', 'order_placement', 'pdr',
+    'so_for_critical_bom_by_dev_partner', 'ddr', 'cdr', 'acceptance_of_critical_bom_by_dev_partner',
+    'realization_completed', 'fat_completed', 'atp_qtp_completed', 'delivery_at_stores',
+    'sat_soft', 'inward_inspection_clearance', 'payment_process', 'partially_paid',
+    'payment_released', 'available_for_integration',
+]
+
+
+def stages_to_mask(apps, schema_editor):
+    Demand = apps.get_model('trackerapp', 'Demand')
+    for demand in Demand.objects.only('id', 'selected_stages'):
+        selected = set(demand.selected_stages or [])
+        mask = 0
+        for number, stage in enumerate(STAGE_SEQUENCE):
+            if stage in selected:
+                mask |= 1 << number
+        Demand.objects.filter(id=demand.id).update(selected_stages_mask=mask)
+
+
+def mask_to_stages(apps, schema_editor):
+    Demand = apps.get_model('trackerapp', 'Demand')
+    for demand in Demand.objects.only('id', 'selected_stages_mask'):
+        stages = [
+            stage for number, stage in enumerate(STAGE_SEQUENCE)
+            if demand.selected_stages_mask & (1 << number)
+        ]
+        Demand.objects.filter(id=demand.id).update(selected_stages=stages)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackerapp', '0010_stage_number'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='demand',
+            name='selected_stages_mask',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(stages_to_mask, mask_to_stages),
+        migrations.RemoveField(
+            model_name='demand',
+            name='selected_stages',
+        ),
+    ]
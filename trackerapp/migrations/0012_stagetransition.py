@@ -0,0 +1,83 @@
+# Generated by Django 5.2.3 on 2026-10-19 08:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Stage values in STAGE_ORDER order, frozen at the time of this migration
+STAGE_SEQUENCE = [
+    'demand_to_be_initiated', 'demand_initiated', 'spc_cleared', 'demand_approved',
+    'tender_enquiry_floated', 'receipt_of_quotations', 'tender_opening', 'tcec_approved',
+    'tpc_approved', 'financial_sanction', 'order_placement', 'pdr',
+    'so_for_critical_bom_by_dev_partner', 'ddr', 'cdr', 'acceptance_of_critical_bom_by_dev_partner',
+    'realization_completed', 'fat_completed', 'atp_qtp_completed', 'delivery_at_stores',
+    'sat_soft', 'inward_inspection_clearance', 'payment_process', 'partially_paid',
+    'payment_released', 'available_for_integration',
+]
+
+
+def backfill_transitions(apps, schema_editor):
+    """Replay existing weekly updates (or stage periods when a demand has none) into the log"""
+    Demand = apps.get_model('trackerapp', 'Demand')
+    DemandStagePeriod = apps.get_model('trackerapp', 'DemandStagePeriod')
+    StageTransition = apps.get_model('trackerapp', 'StageTransition')
+    WeeklyUpdate = apps.get_model('trackerapp', 'WeeklyUpdate')
+    stage_numbers = {stage: number for number, stage in enumerate(STAGE_SEQUENCE)}
+
+    transitions = []
+    for demand_id in Demand.objects.values_list('id', flat=True):
+        events = list(
+            WeeklyUpdate.objects.filter(demand_id=demand_id, current_stage__isnull=False)
+            .exclude(current_stage='')
+            .order_by('week_number')
+            .values_list('current_stage', 'week_start_date')
+        )
+        if not events:
+            events = list(
+                DemandStagePeriod.objects.filter(demand_id=demand_id)
+                .exclude(stage='mini_progress')
+                .order_by('start_date')
+                .values_list('stage', 'start_date')
+            )
+
+        previous = None
+        for stage, effective_date in events:
+            if stage == previous:
+                continue
+            transitions.append(StageTransition(
+                demand_id=demand_id,
+                from_stage=previous,
+                stage=stage,
+                stage_number=stage_numbers.get(stage),
+                effective_date=effective_date,
+                source='backfill',
+            ))
+            previous = stage
+
+    StageTransition.objects.bulk_create(transitions, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackerapp', '0011_selected_stages_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StageTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_stage', models.CharField(blank=True, choices=[('demand_to_be_initiated', 'Demand to be Initiated'), ('demand_initiated', 'Demand Initiated'), ('spc_cleared', 'SPC Cleared'), ('demand_approved', 'Demand Approved'), ('tender_enquiry_floated', 'Tender Enquiry Floated'), ('receipt_of_quotations', 'Receipt of Quotations'), ('tender_opening', 'Tender Opening'), ('tcec_approved', 'TCEC Approved'), ('tpc_approved', 'TPC Approved'), ('financial_sanction', 'Financial Sanction'), ('order_placement', 'Order Placement'), ('pdr', 'PDR'), ('so_for_critical_bom_by_dev_partner', 'SO for Critical BoM by Dev Partner'), ('ddr', 'DDR'), ('cdr', 'CDR'), ('acceptance_of_critical_bom_by_dev_partner', 'Acceptance of Critical BoM by Dev Partner'), ('realization_completed', 'Realization Completed'), ('fat_completed', 'FAT Completed'), ('atp_qtp_completed', 'ATP/QTP Completed'), ('delivery_at_stores', 'Delivery at Stores'), ('sat_soft', 'SAT/SoFT'), ('inward_inspection_clearance', 'Inward Inspection Clearance'), ('payment_process', 'Payment Process'), ('partially_paid', 'Partially Paid'), ('payment_released', 'Payment Released'), ('available_for_integration', 'Available for Integration')], max_length=50, null=True)),
+                ('stage', models.CharField(blank=True, choices=[('demand_to_be_initiated', 'Demand to be Initiated'), ('demand_initiated', 'Demand Initiated'), ('spc_cleared', 'SPC Cleared'), ('demand_approved', 'Demand Approved'), ('tender_enquiry_floated', 'Tender Enquiry Floated'), ('receipt_of_quotations', 'Receipt of Quotations'), ('tender_opening', 'Tender Opening'), ('tcec_approved', 'TCEC Approved'), ('tpc_approved', 'TPC Approved'), ('financial_sanction', 'Financial Sanction'), ('order_placement', 'Order Placement'), ('pdr', 'PDR'), ('so_for_critical_bom_by_dev_partner', 'SO for Critical BoM by Dev Partner'), ('ddr', 'DDR'), ('cdr', 'CDR'), ('acceptance_of_critical_bom_by_dev_partner', 'Acceptance of Critical BoM by Dev Partner'), ('realization_completed', 'Realization Completed'), ('fat_completed', 'FAT Completed'), ('atp_qtp_completed', 'ATP/QTP Completed'), ('delivery_at_stores', 'Delivery at Stores'), ('sat_soft', 'SAT/SoFT'), ('inward_inspection_clearance', 'Inward Inspection Clearance'), ('payment_process', 'Payment Process'), ('partially_paid', 'Partially Paid'), ('payment_released', 'Payment Released'), ('available_for_integration', 'Available for Integration')], max_length=50, null=True)),
+                ('stage_number', models.IntegerField(blank=True, null=True)),
+                ('effective_date', models.DateField()),
+                ('recorded_at', models.DateTimeField(auto_now_add=True)),
+                ('source', models.CharField(choices=[('stage_period_saved', 'Stage period saved'), ('stage_period_deleted', 'Stage period deleted'), ('weekly_update_saved', 'Weekly update saved'), ('weekly_update_deleted', 'Weekly update deleted'), ('backfill', 'Backfill')], max_length=30)),
+                ('demand', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stage_transitions', to='trackerapp.demand')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['demand', 'effective_date', 'id'], name='transition_demand_date_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_transitions, migrations.RunPython.noop),
+    ]
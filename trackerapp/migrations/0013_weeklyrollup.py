@@ -0,0 +1,75 @@
+# Generated by Django 5.2.3 on 2026-10-19 08:19
+
+from django.db import migrations, models
+
+
+# Stage values in STAGE_ORDER order, frozen at the time of this migration
+STAGE_SEQUENCE = [
+    'demand_to_be_initiated', 'demand_initiated', 'spc_cleared', 'demand_approved',
+    'tender_enquiry_floated', 'receipt_of_quotations', 'tender_opening', 'tcec_approved',
+    'tpc_approved', 'financial_sanction', 'order_placement', 'pdr',
+    'so_for_critical_bom_by_dev_partner', 'ddr', 'cdr', 'acceptance_of_critical_bom_by_dev_partner',
+    'realization_completed', 'fat_completed', 'atp_qtp_completed', 'delivery_at_stores',
+    'sat_soft', 'inward_inspection_clearance', 'payment_process', 'partially_paid',
+    'payment_released', 'available_for_integration',
+]
+
+
+def populate_rollups(apps, schema_editor):
+    WeeklyRollup = apps.get_model('trackerapp', 'WeeklyRollup')
+    WeeklyUpdate = apps.get_model('trackerapp', 'WeeklyUpdate')
+    stage_numbers = {stage: number for number, stage in enumerate(STAGE_SEQUENCE)}
+
+    seen = set()
+    totals = {}
+    updates = (
+        WeeklyUpdate.objects.filter(current_stage__isnull=False)
+        .exclude(current_stage='')
+        .values_list('week_start_date', 'demand_id', 'demand__file_type', 'current_stage', 'demand__demand_amount')
+    )
+    for week_start_date, demand_id, file_type, stage, amount in updates:
+        key = (week_start_date, file_type or '', stage)
+        if (key, demand_id) not in seen:
+            seen.add((key, demand_id))
+            count, total = totals.get(key, (0, 0))
+            totals[key] = (count + 1, total + (amount or 0))
+
+    WeeklyRollup.objects.bulk_create([
+        WeeklyRollup(
+            week_start_date=week_start_date,
+            file_type=file_type,
+            stage=stage,
+            stage_number=stage_numbers.get(stage),
+            demand_count=count,
+            total_amount=total,
+        )
+        for (week_start_date, file_type, stage), (count, total) in totals.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackerapp', '0012_stagetransition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start_date', models.DateField()),
+                ('file_type', models.CharField(blank=True, default='', max_length=100)),
+                ('stage', models.CharField(choices=[('demand_to_be_initiated', 'Demand to be Initiated'), ('demand_initiated', 'Demand Initiated'), ('spc_cleared', 'SPC Cleared'), ('demand_approved', 'Demand Approved'), ('tender_enquiry_floated', 'Tender Enquiry Floated'), ('receipt_of_quotations', 'Receipt of Quotations'), ('tender_opening', 'Tender Opening'), ('tcec_approved', 'TCEC Approved'), ('tpc_approved', 'TPC Approved'), ('financial_sanction', 'Financial Sanction'), ('order_placement', 'Order Placement'), ('pdr', 'PDR'), ('so_for_critical_bom_by_dev_partner', 'SO for Critical BoM by Dev Partner'), ('ddr', 'DDR'), ('cdr', 'CDR'), ('acceptance_of_critical_bom_by_dev_partner', 'Acceptance of Critical BoM by Dev Partner'), ('realization_completed', 'Realization Completed'), ('fat_completed', 'FAT Completed'), ('atp_qtp_completed', 'ATP/QTP Completed'), ('delivery_at_stores', 'Delivery at Stores'), ('sat_soft', 'SAT/SoFT'), ('inward_inspection_clearance', 'Inward Inspection Clearance'), ('payment_process', 'Payment Process'), ('partially_paid', 'Partially Paid'), ('payment_released', 'Payment Released'), ('available_for_integration', 'Available for Integration')], max_length=50)),
+                ('stage_number', models.IntegerField(blank=True, null=True)),
+                ('demand_count', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['week_start_date', 'stage_number'],
+                'unique_together': {('week_start_date', 'file_type', 'stage')},
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.2.3 on 2026-10-19 08:21
+
+from django.db import migrations, models
+
+
+# Stage values in STAGE_ORDER order, frozen at the time of this migration
+STAGE_SEQUENCE = [
+    'demand_to_be_initiated', 'demand_initiated', 'spc_cleared', 'demand_approved',
+    'tender_enquiry_floated', 'receipt_of_quotations', 'tender_opening', 'tcec_approved',
+    'tpc_approved', 'financial_sanction', 'order_placement', 'pdr',
+    'so_for_critical_bom_by_dev_partner', 'ddr', 'cdr', 'acceptance_of_critical_bom_by_dev_partner',
+    'realization_completed', 'fat_completed', 'atp_qtp_completed', 'delivery_at_stores',
+    'sat_soft', 'inward_inspection_clearance', 'payment_process', 'partially_paid',
+    'payment_released', 'available_for_integration',
+]
+
+
+def _percentile(values, fraction):
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def populate_stats(apps, schema_editor):
+    StageDurationStat = apps.get_model('trackerapp', 'StageDurationStat')
+    DemandStagePeriod = apps.get_model('trackerapp', 'DemandStagePeriod')
+    WeeklyUpdate = apps.get_model('trackerapp', 'WeeklyUpdate')
+    stage_numbers = {stage: number for number, stage in enumerate(STAGE_SEQUENCE)}
+
+    # A stage with several weekly updates is measured by their span, as on the dashboard
+    spans = {}
+    for demand_id, stage, start, end in WeeklyUpdate.objects.filter(current_stage__isnull=False).values_list(
+        'demand_id', 'current_stage', 'week_start_date', 'week_end_date'
+    ):
+        count, first, last = spans.get((demand_id, stage), (0, start, end))
+        spans[(demand_id, stage)] = (count + 1, min(first, start), max(last, end))
+
+    samples = {}
+    periods = DemandStagePeriod.objects.exclude(stage='mini_progress').values_list(
+        'demand_id', 'stage', 'start_date', 'end_date', 'demand__file_type', 'demand__file_subtype'
+    )
+    for demand_id, stage, start, end, file_type, file_subtype in periods:
+        count, first, last = spans.get((demand_id, stage), (0, start, end))
+        duration = (last - first).days + 1 if count > 1 else (end - start).days + 1
+        file_type, file_subtype = file_type or '', file_subtype or ''
+        for group in ((file_type, file_subtype), (file_type, '*'), ('*', '*')):
+            samples.setdefault(group + (stage,), []).append(duration)
+
+    rows = []
+    for (file_type, file_subtype, stage), values in samples.items():
+        values.sort()
+        rows.append(StageDurationStat(
+            file_type=file_type,
+            file_subtype=file_subtype,
+            stage=stage,
+            stage_number=stage_numbers.get(stage),
+            sample_count=len(values),
+            mean_days=sum(values) / len(values),
+            p50_days=_percentile(values, 0.5),
+            p90_days=_percentile(values, 0.9),
+            min_days=values[0],
+            max_days=values[-1],
+        ))
+    StageDurationStat.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackerapp', '0013_weeklyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StageDurationStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_type', models.CharField(blank=True, default='', max_length=100)),
+                ('file_subtype', models.CharField(blank=True, default='', max_length=100)),
+                ('stage', models.CharField(choices=[('demand_to_be_initiated', 'Demand to be Initiated'), ('demand_initiated', 'Demand Initiated'), ('spc_cleared', 'SPC Cleared'), ('demand_approved', 'Demand Approved'), ('tender_enquiry_floated', 'Tender Enquiry Floated'), ('receipt_of_quotations', 'Receipt of Quotations'), ('tender_opening', 'Tender Opening'), ('tcec_approved', 'TCEC Approved'), ('tpc_approved', 'TPC Approved'), ('financial_sanction', 'Financial Sanction'), ('order_placement', 'Order Placement'), ('pdr', 'PDR'), ('so_for_critical_bom_by_dev_partner', 'SO for Critical BoM by Dev Partner'), ('ddr', 'DDR'), ('cdr', 'CDR'), ('acceptance_of_critical_bom_by_dev_partner', 'Acceptance of Critical BoM by Dev Partner'), ('realization_completed', 'Realization Completed'), ('fat_completed', 'FAT Completed'), ('atp_qtp_completed', 'ATP/QTP Completed'), ('delivery_at_stores', 'Delivery at Stores'), ('sat_soft', 'SAT/SoFT'), ('inward_inspection_clearance', 'Inward Inspection Clearance'), ('payment_process', 'Payment Process'), ('partially_paid', 'Partially Paid'), ('payment_released', 'Payment Released'), ('available_for_integration', 'Available for Integration')], max_length=50)),
+                ('stage_number', models.IntegerField(blank=True, null=True)),
+                ('sample_count', models.IntegerField(default=0)),
+                ('mean_days', models.FloatField(default=0)),
+                ('p50_days', models.FloatField(default=0)),
+                ('p90_days', models.FloatField(default=0)),
+                ('min_days', models.IntegerField(default=0)),
+                ('max_days', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('file_type', 'file_subtype', 'stage')},
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
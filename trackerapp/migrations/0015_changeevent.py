@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-19 08:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackerapp', '0014_stagedurationstat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('demand_saved', 'Demand saved'), ('demand_deleted', 'Demand deleted'), ('stage_saved', 'Stage period saved'), ('stage_deleted', 'Stage period deleted'), ('stage_changed', 'Current stage changed'), ('weekly_update_saved', 'Weekly update saved'), ('weekly_update_deleted', 'Weekly update deleted')], max_length=30)),
+                ('demand_id', models.IntegerField()),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
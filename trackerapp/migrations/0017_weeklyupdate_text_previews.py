@@ -0,0 +1,52 @@
+# Generated by Django 5.2.3 on 2026-10-19 08:53
+
+from django.db import migrations, models
+from django.template.defaultfilters import truncatechars
+
+# PREVIEW_LENGTH at the time of this migration
+PREVIEW_LENGTH = 20
+
+
+def fill_previews(apps, schema_editor):
+    WeeklyUpdate = apps.get_model('trackerapp', 'WeeklyUpdate')
+    updates = []
+    for update in WeeklyUpdate.objects.only('id', 'challenges', 'achievements').iterator(chunk_size=500):
+        for field in ('challenges', 'achievements'):
+            text = getattr(update, field) or ''
+            setattr(update, f'{field}_preview', truncatechars(text, PREVIEW_LENGTH))
+            setattr(update, f'{field}_truncated', len(text) > PREVIEW_LENGTH)
+        updates.append(update)
+    WeeklyUpdate.objects.bulk_update(updates, [
+        'challenges_preview', 'challenges_truncated', 'achievements_preview', 'achievements_truncated',
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackerapp', '0016_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='weeklyupdate',
+            name='achievements_preview',
+            field=models.CharField(blank=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='weeklyupdate',
+            name='achievements_truncated',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='weeklyupdate',
+            name='challenges_preview',
+            field=models.CharField(blank=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='weeklyupdate',
+            name='challenges_truncated',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(fill_previews, migrations.RunPython.noop),
+    ]
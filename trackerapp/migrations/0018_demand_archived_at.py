@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-19 09:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackerapp', '0017_weeklyupdate_text_previews'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='demand',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='changeevent',
+            name='kind',
+            field=models.CharField(choices=[('demand_saved', 'Demand saved'), ('demand_deleted', 'Demand deleted'), ('stage_saved', 'Stage period saved'), ('stage_deleted', 'Stage period deleted'), ('stage_changed', 'Current stage changed'), ('weekly_update_saved', 'Weekly update saved'), ('weekly_update_deleted', 'Weekly update deleted'), ('demand_archived', 'Demand archived or restored')], max_length=30),
+        ),
+        migrations.AddIndex(
+            model_name='demand',
+            index=models.Index(fields=['archived_at', 'id'], name='demand_archived_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-19 09:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackerapp', '0018_demand_archived_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='demandstageperiod',
+            index=models.Index(fields=['start_date'], name='stage_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weeklyupdate',
+            index=models.Index(fields=['week_start_date'], name='weekly_start_idx'),
+        ),
+    ]
@@ -1,7 +1,78 @@
 from django.db import models
+from django.template.defaultfilters import truncatechars
 from django.utils.translation import gettext_lazy as _
 from datetime import timedelta
 
+
+class SelectedStages(list):
+    """List of selected stage names with O(1) membership tests backed by the stage bitmask
+
+    Read-only: the list is built from the mask, so changing it in place would be lost on
+    save. Assign a new list to Demand.selected_stages instead.
+    """
+
+    def __init__(self, stages, mask):
+        super().__init__(stages)
+        self.mask = mask
+
+    def __contains__(self, stage):
+        return bool(self.mask & stage_bit(stage))
+
+    def __reduce__(self):
+        # copy and pickle would otherwise rebuild the list with append()
+        return type(self), (list(self), self.mask)
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('Selected stages are read-only; assign a new list to Demand.selected_stages')
+
+    append = extend = insert = remove = pop = clear = sort = reverse = _read_only
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+
+
+def stage_bit(stage):
+    """Bit for `stage` in Demand.selected_stages_mask (0 for unknown stages)"""
+    number = STAGE_ORDER.get(stage)
+    return 0 if number is None else 1 << number
+
+
+def stages_to_mask(stages):
+    mask = 0
+    for stage in stages:
+        mask |= stage_bit(stage)
+    return mask
+
+
+def mask_to_stages(mask):
+    return [stage.value for stage, number in STAGE_ORDER.items() if mask & (1 << number)]
+
+
+class DemandQuerySet(models.QuerySet):
+    def active(self):
+        """Demands on the live dashboard, i.e. not archived"""
+        return self.filter(archived_at__isnull=True)
+
+    def archived(self):
+        return self.filter(archived_at__isnull=False)
+
+    def with_stage(self, stage):
+        """Demands whose selected stages include `stage`
+
+        A b-tree index can't seek on `mask & bit = bit`, so this scans every demand: the
+        selected_stages_mask index only makes it a covering-index scan when nothing but
+        ids or the mask are read.
+        """
+        bit = stage_bit(stage)
+        return self.alias(stage_bit=models.F('selected_stages_mask').bitand(bit)).filter(stage_bit=bit)
+
+    def with_stage_on(self, on_date):
+        """Annotate `stage_on_date` with each demand's current stage as of `on_date`"""
+        latest = StageTransition.objects.filter(
+            demand=models.OuterRef('pk'),
+            effective_date__lte=on_date,
+        ).order_by('-effective_date', '-id')
+        return self.annotate(stage_on_date=models.Subquery(latest.values('stage')[:1]))
+
+
 class Demand(models.Model):
     name = models.CharField(max_length=200)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -15,10 +86,36 @@ class Demand(models.Model):
     duration_months = models.IntegerField(null=True, blank=True)
     weekly_start_date = models.DateField(null=True, blank=True)
     weekly_end_date = models.DateField(null=True, blank=True)
-    selected_stages = models.JSONField(default=list, blank=True)  # Store list of selected stage names
+    # Selected stages as a bitmask, bit n set for the stage with STAGE_ORDER number n
+    selected_stages_mask = models.IntegerField(default=0, db_index=True)
+    # Set when the demand is archived (trackerapp.archive); archived demands are left out of the dashboard
+    archived_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = DemandQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # File type tabs/summary filter on file_type; pickers order by name
+            models.Index(fields=['file_type', 'name'], name='demand_file_type_name_idx'),
+            models.Index(fields=['name'], name='demand_name_idx'),
+            # The dashboard reads active demands in id order; the archive lists newest archived first
+            models.Index(fields=['archived_at', 'id'], name='demand_archived_idx'),
+        ]
 
     def __str__(self):
         return self.name
+
+    @property
+    def selected_stages(self):
+        """Selected stage names in stage order; assign a new list to change the selection"""
+        return SelectedStages(mask_to_stages(self.selected_stages_mask), self.selected_stages_mask)
+
+    @selected_stages.setter
+    def selected_stages(self, stages):
+        self.selected_stages_mask = stages_to_mask(stages or [])
+
+    def has_stage(self, stage):
+        return bool(self.selected_stages_mask & stage_bit(stage))
         
     def get_end_date(self):
         if self.start_date and self.duration_months:
@@ -131,34 +228,231 @@ STAGE_ORDER = {
 class DemandStagePeriod(models.Model):
     demand = models.ForeignKey(Demand, on_delete=models.CASCADE, related_name='stages')
     stage = models.CharField(max_length=50, choices=Stage.choices)
+    # STAGE_ORDER number of `stage`, kept in sync on save (None for mini_progress)
+    stage_number = models.IntegerField(null=True, blank=True, editable=False)
     start_date = models.DateField()
     end_date = models.DateField()
 
     class Meta:
         unique_together = ('demand', 'stage')
+        indexes = [
+            models.Index(fields=['demand', 'stage_number'], name='stage_demand_number_idx'),
+            # Admin changelist: date hierarchy and newest-first ordering
+            models.Index(fields=['start_date'], name='stage_start_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.stage_number = STAGE_ORDER.get(self.stage)
+        super().save(*args, **kwargs)
 
     def duration_in_days(self):
         return (self.end_date - self.start_date).days + 1
 
+# Characters of challenges/achievements the dashboard shows before "View More"
+PREVIEW_LENGTH = 20
+
+
+def text_preview(text):
+    """(preview, truncated) for a long text field: its first PREVIEW_LENGTH characters as the
+    dashboard shows them, and whether the full text is longer"""
+    text = text or ''
+    return truncatechars(text, PREVIEW_LENGTH), len(text) > PREVIEW_LENGTH
+
+
 class WeeklyUpdate(models.Model):
     demand = models.ForeignKey(Demand, on_delete=models.CASCADE, related_name='weekly_updates')
     week_number = models.IntegerField()
     week_start_date = models.DateField()
     week_end_date = models.DateField()
     current_stage = models.CharField(max_length=50, choices=Stage.choices, null=True, blank=True)
+    # STAGE_ORDER number of `current_stage`, kept in sync on save
+    stage_number = models.IntegerField(null=True, blank=True, editable=False)
     progress_percentage = models.IntegerField(default=0)
     challenges = models.TextField(blank=True, null=True)
     achievements = models.TextField(blank=True, null=True)
     next_week_plan = models.TextField(blank=True, null=True)
+    # text_preview() of `challenges` and `achievements`, kept in sync on save so the
+    # dashboard can defer the full text
+    challenges_preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True, default='', editable=False)
+    challenges_truncated = models.BooleanField(default=False, editable=False)
+    achievements_preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True, default='', editable=False)
+    achievements_truncated = models.BooleanField(default=False, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Unbounded text the dashboard defers; weekly_update_text serves it on demand
+    FULL_TEXT_FIELDS = ('challenges', 'achievements', 'next_week_plan')
+
     class Meta:
         unique_together = ('demand', 'week_number')
         ordering = ['-week_number']
+        indexes = [
+            # Per-stage lookups in demand_list: filter(demand, current_stage).order_by('week_start_date').
+            # Latest-update lookups (demand, -week_number) are served by the unique_together index.
+            models.Index(fields=['demand', 'current_stage', 'week_start_date'], name='weekly_demand_stage_start_idx'),
+            models.Index(fields=['demand', 'stage_number'], name='weekly_demand_number_idx'),
+            # Admin changelist: date hierarchy and newest-first ordering (the index ends in the id)
+            models.Index(fields=['week_start_date'], name='weekly_start_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.stage_number = STAGE_ORDER.get(self.current_stage)
+        self.challenges_preview, self.challenges_truncated = text_preview(self.challenges)
+        self.achievements_preview, self.achievements_truncated = text_preview(self.achievements)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.demand.name} - Week {self.week_number}"
 
     def get_week_label(self):
         return f"Week {self.week_number} ({self.week_start_date.strftime('%b %d')} - {self.week_end_date.strftime('%b %d, %Y')})"
+
+class StageTransitionQuerySet(models.QuerySet):
+    def as_of(self, on_date):
+        """The latest transition per demand effective on or before `on_date`"""
+        latest = self.model.objects.filter(
+            demand=models.OuterRef('demand'),
+            effective_date__lte=on_date,
+        ).order_by('-effective_date', '-id').values('id')[:1]
+        return self.filter(effective_date__lte=on_date, id=models.Subquery(latest))
+
+class StageTransition(models.Model):
+    """Append-only log of changes to a demand's current stage (written from trackerapp.signals)"""
+
+    class Source(models.TextChoices):
+        STAGE_PERIOD_SAVED = 'stage_period_saved', _('Stage period saved')
+        STAGE_PERIOD_DELETED = 'stage_period_deleted', _('Stage period deleted')
+        WEEKLY_UPDATE_SAVED = 'weekly_update_saved', _('Weekly update saved')
+        WEEKLY_UPDATE_DELETED = 'weekly_update_deleted', _('Weekly update deleted')
+        BACKFILL = 'backfill', _('Backfill')
+
+    demand = models.ForeignKey(Demand, on_delete=models.CASCADE, related_name='stage_transitions')
+    from_stage = models.CharField(max_length=50, choices=Stage.choices, null=True, blank=True)
+    # None when the demand no longer has a current stage
+    stage = models.CharField(max_length=50, choices=Stage.choices, null=True, blank=True)
+    stage_number = models.IntegerField(null=True, blank=True)
+    # Date the stage took effect (week or stage period start), used for point-in-time queries
+    effective_date = models.DateField()
+    recorded_at = models.DateTimeField(auto_now_add=True)
+    source = models.CharField(max_length=30, choices=Source.choices)
+
+    objects = StageTransitionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['demand', 'effective_date', 'id'], name='transition_demand_date_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError('Stage transitions are append-only and cannot be updated.')
+        self.stage_number = STAGE_ORDER.get(self.stage)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.demand_id}: {self.from_stage} -> {self.stage} ({self.effective_date})"
+
+class WeeklyRollup(models.Model):
+    """Per-week portfolio totals by file type and stage, maintained from WeeklyUpdate writes"""
+    week_start_date = models.DateField()
+    # '' when the demand has no file type
+    file_type = models.CharField(max_length=100, blank=True, default='')
+    stage = models.CharField(max_length=50, choices=Stage.choices)
+    stage_number = models.IntegerField(null=True, blank=True)
+    demand_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('week_start_date', 'file_type', 'stage')
+        ordering = ['week_start_date', 'stage_number']
+
+    def __str__(self):
+        return f"{self.week_start_date} {self.file_type or '-'} {self.stage}: {self.demand_count}"
+
+class StageDurationStat(models.Model):
+    """Duration statistics (in days) for one stage within a file type/subtype group
+
+    '*' in file_type or file_subtype means "any"; '' means the demand field is empty.
+    """
+    ANY = '*'
+
+    file_type = models.CharField(max_length=100, blank=True, default='')
+    file_subtype = models.CharField(max_length=100, blank=True, default='')
+    stage = models.CharField(max_length=50, choices=Stage.choices)
+    stage_number = models.IntegerField(null=True, blank=True)
+    sample_count = models.IntegerField(default=0)
+    mean_days = models.FloatField(default=0)
+    p50_days = models.FloatField(default=0)
+    p90_days = models.FloatField(default=0)
+    min_days = models.IntegerField(default=0)
+    max_days = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('file_type', 'file_subtype', 'stage')
+
+    def __str__(self):
+        return f"{self.file_type}/{self.file_subtype} {self.stage}: p50 {self.p50_days:.0f}d (n={self.sample_count})"
+
+class ChangeEvent(models.Model):
+    """Feed of tracker writes streamed to open dashboards (written from trackerapp.events)
+
+    The auto-incrementing id doubles as the SSE event id, so a reconnecting client
+    resumes from Last-Event-ID and every worker process reads the same sequence.
+    """
+
+    class Kind(models.TextChoices):
+        DEMAND_SAVED = 'demand_saved', _('Demand saved')
+        DEMAND_DELETED = 'demand_deleted', _('Demand deleted')
+        STAGE_SAVED = 'stage_saved', _('Stage period saved')
+        STAGE_DELETED = 'stage_deleted', _('Stage period deleted')
+        STAGE_CHANGED = 'stage_changed', _('Current stage changed')
+        WEEKLY_UPDATE_SAVED = 'weekly_update_saved', _('Weekly update saved')
+        WEEKLY_UPDATE_DELETED = 'weekly_update_deleted', _('Weekly update deleted')
+        DEMAND_ARCHIVED = 'demand_archived', _('Demand archived or restored')
+
+    kind = models.CharField(max_length=30, choices=Kind.choices)
+    # Plain integer rather than a foreign key so events outlive a deleted demand
+    demand_id = models.IntegerField()
+    payload = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"#{self.id} {self.kind} demand {self.demand_id}"
+
+class Job(models.Model):
+    """Background job run by the run_workers command (see trackerapp.jobs)"""
+
+    class Status(models.TextChoices):
+        QUEUED = 'queued', _('Queued')
+        RUNNING = 'running', _('Running')
+        SUCCEEDED = 'succeeded', _('Succeeded')
+        FAILED = 'failed', _('Failed')
+
+    task = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.QUEUED)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_after = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    progress = models.IntegerField(default=0)
+    message = models.CharField(max_length=255, blank=True, default='')
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.task} ({self.status})"
@@ -0,0 +1,113 @@
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.db.models import F, Window
+from django.db.models.functions import Lag, RowNumber
+
+from .models import Demand, WeeklyUpdate
+from .stages import get_stage_catalog
+from .versioning import data_version
+
+REPORT_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+
+
+def latest_updates_with_previous():
+    """Each active demand's latest weekly update annotated with its previous update's stage and challenges
+
+    One query: LAG/ROW_NUMBER windows partitioned by demand and ordered by week_number,
+    over the updates of active demands only, filtered down to the latest row per demand.
+    """
+    by_demand = {'partition_by': [F('demand_id')], 'order_by': F('week_number').asc()}
+    return (
+        WeeklyUpdate.objects.filter(demand__archived_at__isnull=True).annotate(
+            previous_stage_number=Window(Lag('stage_number'), **by_demand),
+            previous_challenges=Window(Lag('challenges'), **by_demand),
+            previous_week_number=Window(Lag('week_number'), **by_demand),
+            recency=Window(RowNumber(), partition_by=[F('demand_id')], order_by=F('week_number').desc()),
+        )
+        .filter(recency=1)
+        .values(
+            'demand_id', 'demand__name', 'demand__file_type', 'week_number', 'week_end_date',
+            'current_stage', 'stage_number', 'challenges',
+            'previous_stage_number', 'previous_challenges', 'previous_week_number',
+        )
+    )
+
+
+def build_weekly_changes(stale_weeks, today=None):
+    today = today or date.today()
+    stale_before = today - timedelta(weeks=stale_weeks)
+    catalog = get_stage_catalog()
+
+    report = {
+        'advanced': [],
+        'stalled': [],
+        'new_challenges': [],
+        'no_recent_update': [],
+        'stale_weeks': stale_weeks,
+        'generated_on': today,
+    }
+
+    for row in latest_updates_with_previous():
+        entry = {
+            'demand_id': row['demand_id'],
+            'demand_name': row['demand__name'],
+            'file_type': row['demand__file_type'],
+            'week_number': row['week_number'],
+            'week_end_date': row['week_end_date'],
+            'stage_label': catalog.labels.get(row['current_stage'], '') if row['current_stage'] else '',
+            'stage_number': row['stage_number'],
+            'previous_stage_label': '',
+            'previous_stage_number': row['previous_stage_number'],
+            'challenges': row['challenges'],
+        }
+        if row['previous_stage_number'] is not None:
+            entry['previous_stage_label'] = catalog.labels[catalog.by_number[row['previous_stage_number']]]
+
+        if row['previous_week_number'] is not None and row['stage_number'] is not None:
+            if row['previous_stage_number'] is None or row['stage_number'] > row['previous_stage_number']:
+                report['advanced'].append(entry)
+            elif row['stage_number'] == row['previous_stage_number']:
+                report['stalled'].append(entry)
+
+        challenges = (row['challenges'] or '').strip()
+        if challenges and challenges != (row['previous_challenges'] or '').strip():
+            report['new_challenges'].append(entry)
+
+        if row['week_end_date'] < stale_before:
+            report['no_recent_update'].append(entry)
+
+    for demand in Demand.objects.active().filter(weekly_updates__isnull=True).values('id', 'name', 'file_type'):
+        report['no_recent_update'].append({
+            'demand_id': demand['id'],
+            'demand_name': demand['name'],
+            'file_type': demand['file_type'],
+            'week_number': None,
+            'week_end_date': None,
+            'stage_label': '',
+            'stage_number': None,
+            'previous_stage_label': '',
+            'previous_stage_number': None,
+            'challenges': '',
+        })
+
+    for key in ('advanced', 'stalled', 'new_challenges', 'no_recent_update'):
+        report[key].sort(key=lambda entry: entry['demand_name'])
+    return report
+
+
+def weekly_changes(stale_weeks=2, today=None):
+    """Week-over-week portfolio changes, cached per ISO week until tracker data changes
+
+    Staleness is measured from the Monday of the current week so one cached report
+    is valid for the whole week.
+    """
+    today = today or date.today()
+    week_start = today - timedelta(days=today.weekday())
+    cache_key = f'trackerapp:weekly_changes:{week_start.isoformat()}:{stale_weeks}:{data_version()}'
+
+    report = cache.get(cache_key)
+    if report is None:
+        report = build_weekly_changes(stale_weeks, week_start)
+        cache.set(cache_key, report, REPORT_CACHE_TIMEOUT)
+    return report
@@ -0,0 +1,60 @@
+from decimal import Decimal
+
+from django.db import transaction
+
+from .models import STAGE_ORDER, WeeklyRollup, WeeklyUpdate
+
+
+def _rollup_rows(updates):
+    """Aggregate (week, file_type, stage) totals, counting each demand once per group"""
+    seen = set()
+    totals = {}
+    for week_start_date, demand_id, file_type, stage, amount in updates:
+        key = (week_start_date, file_type or '', stage)
+        if (key, demand_id) in seen:
+            continue
+        seen.add((key, demand_id))
+        count, total = totals.get(key, (0, Decimal('0')))
+        totals[key] = (count + 1, total + (amount or 0))
+
+    return [
+        WeeklyRollup(
+            week_start_date=week_start_date,
+            file_type=file_type,
+            stage=stage,
+            stage_number=STAGE_ORDER.get(stage),
+            demand_count=count,
+            total_amount=total,
+        )
+        for (week_start_date, file_type, stage), (count, total) in totals.items()
+    ]
+
+
+def _staged_updates():
+    return (
+        WeeklyUpdate.objects.filter(current_stage__isnull=False)
+        .exclude(current_stage='')
+        .order_by()
+        .values_list('week_start_date', 'demand_id', 'demand__file_type', 'current_stage', 'demand__demand_amount')
+    )
+
+
+def refresh_weeks(week_start_dates):
+    """Recompute the rollup rows for the given weeks from their weekly updates"""
+    week_start_dates = {d for d in week_start_dates if d}
+    if not week_start_dates:
+        return
+
+    updates = _staged_updates().filter(week_start_date__in=week_start_dates)
+    with transaction.atomic():
+        WeeklyRollup.objects.filter(week_start_date__in=week_start_dates).delete()
+        WeeklyRollup.objects.bulk_create(_rollup_rows(updates))
+
+
+def rebuild_rollups():
+    """Recompute the whole rollup table; returns the number of rows written"""
+    rows = _rollup_rows(_staged_updates().iterator(chunk_size=2000))
+    with transaction.atomic():
+        WeeklyRollup.objects.all().delete()
+        WeeklyRollup.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
@@ -0,0 +1,143 @@
+"""Row types for the dashboard's stage bars and stage detail boxes
+
+demand_list builds one StageBar per stage period (two for a split mini progress bar),
+26 DetailBoxes and a DemandPosition per demand. They are NamedTuples like
+stages.LegendEntry, so they are small and immutable, and templates reach their
+fields as attributes under the same names as the dict keys they replaced. Fields that
+are only formatting of other fields (date strings, quarters, "12d" labels) are
+properties, computed when something reads them rather than for every row.
+"""
+from datetime import date
+from functools import lru_cache
+from typing import NamedTuple, Optional, Union
+
+
+def _date_text(value):
+    return value.strftime('%Y-%m-%d') if value else ''
+
+
+class StageBar(NamedTuple):
+    id: Union[int, str]
+    stage: str
+    stage_number: Optional[int]
+    stage_verbose: str
+    color: str
+    # Position and width as percentages of the timeline row
+    start_percent: float
+    width_percent: float
+    relative_start_percent: float
+    relative_width_percent: float
+    duration: int
+    # Dates shown for the bar (tooltip, edit form)
+    start: date
+    end: date
+    # Dates the bar is placed by; for mini progress bars the demand's own span
+    span_start: date
+    span_end: date
+    quarter_start_pos: float
+    quarter_end_pos: float
+    quarter_width: float
+    number: Optional[int]
+    should_show_number: bool
+
+    @property
+    def start_date(self):
+        return _date_text(self.start)
+
+    @property
+    def end_date(self):
+        return _date_text(self.end)
+
+    @property
+    def start_year(self):
+        return self.span_start.year
+
+    @property
+    def start_month(self):
+        return self.span_start.month
+
+    @property
+    def start_quarter(self):
+        return (self.span_start.month - 1) // 3
+
+    @property
+    def end_year(self):
+        return self.span_end.year
+
+    @property
+    def end_month(self):
+        return self.span_end.month
+
+    @property
+    def end_quarter(self):
+        return (self.span_end.month - 1) // 3
+
+
+class DetailBox(NamedTuple):
+    number: int
+    duration: int
+    color: str
+    id: Optional[int]
+    stage_name: str
+    start: Optional[date]
+    end: Optional[date]
+    has_data: bool
+
+    @property
+    def duration_text(self):
+        if not self.has_data and self.stage_name == 'N/A':
+            return 'N/A'
+        return f'{self.duration}d'
+
+    @property
+    def start_date(self):
+        return _date_text(self.start)
+
+    @property
+    def end_date(self):
+        return _date_text(self.end)
+
+
+@lru_cache(maxsize=None)
+def empty_detail_box(number, selected):
+    """The shared box for a stage with no stage period: '(Not Set)' if the demand selected it, else 'N/A'"""
+    return DetailBox(number, 0, '#ddd', None, '(Not Set)' if selected else 'N/A', None, None, False)
+
+
+class DemandPosition(NamedTuple):
+    start_percent: float
+    width_percent: float
+    start: date
+    end: date
+    duration_days: int
+
+    @property
+    def start_date(self):
+        return _date_text(self.start)
+
+    @property
+    def end_date(self):
+        return _date_text(self.end)
+
+
+# Fields each type showed as dict keys, in their old order; as_dict() builds that dict
+_DICT_FIELDS = {
+    StageBar: (
+        'id', 'stage', 'stage_number', 'stage_verbose', 'color', 'start_percent', 'width_percent',
+        'relative_start_percent', 'relative_width_percent', 'duration', 'start_date', 'end_date',
+        'start_year', 'start_month', 'start_quarter', 'end_year', 'end_month', 'end_quarter',
+        'quarter_start_pos', 'quarter_end_pos', 'quarter_width', 'number', 'should_show_number',
+    ),
+    DetailBox: (
+        'number', 'duration', 'duration_text', 'color', 'id', 'stage_name', 'start_date', 'end_date', 'has_data',
+    ),
+    DemandPosition: ('start_percent', 'width_percent', 'start_date', 'end_date', 'duration_days'),
+}
+
+
+def as_dict(row):
+    """The row as the dict demand_list used to build for it, derived fields included
+
+    Other NamedTuples give their stored fields.
+    """
+    return {field: getattr(row, field) for field in _DICT_FIELDS.get(type(row), row._fields)}
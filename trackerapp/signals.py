@@ -0,0 +1,219 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .events import publish
+from .forecast import schedule_stage_stats
+from .history import record_stage_change
+from .rollups import refresh_weeks
+from .snapshots import schedule_publish
+from .versioning import bump_data_version, bump_demand_version
+from .models import ChangeEvent, Demand, DemandStagePeriod, StageTransition, WeeklyUpdate
+
+
+@receiver(connection_created)
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """Apply SQLITE_PRAGMAS from settings to every new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def _refresh_stage_stats(demand_id, stages, groups=None):
+    # Queue a recompute of the duration stats the demand's file type/subtype group feeds for `stages`
+    if groups is None:
+        groups = list(Demand.objects.filter(pk=demand_id).values_list('file_type', 'file_subtype'))
+    schedule_stage_stats((stage, file_type, file_subtype) for stage in stages for file_type, file_subtype in groups)
+
+
+# True while a caller that refreshes derived data itself deletes demands (see bulk_deleting)
+_bulk_deleting = ContextVar('bulk_deleting', default=False)
+
+
+@contextmanager
+def bulk_deleting():
+    """Skip the delete receivers' per-row work for deletes made inside the block
+
+    For trackerapp.bulk.delete_demands, which publishes the events and refreshes the
+    rollups, stats and cache versions once per batch instead.
+    """
+    token = _bulk_deleting.set(True)
+    try:
+        yield
+    finally:
+        _bulk_deleting.reset(token)
+
+
+def _deleting_demand(origin):
+    # Cascade deletes of a demand remove its history too; its post_delete handles it once
+    # instead of logging transitions and refreshing derived data for each row
+    if _bulk_deleting.get() or isinstance(origin, Demand):
+        return True
+    return isinstance(origin, QuerySet) and origin.model is Demand
+
+
+# Fields the stage transition log, rollups and stage duration stats read from each
+# model; saves that change none of them skip those refreshes
+WEEKLY_UPDATE_TRACKED = ('demand_id', 'week_number', 'week_start_date', 'week_end_date', 'current_stage')
+STAGE_PERIOD_TRACKED = ('demand_id', 'stage', 'start_date', 'end_date')
+DEMAND_TRACKED = ('file_type', 'file_subtype', 'demand_amount')
+
+
+def _remember_stored(instance, fields, update_fields):
+    # The stored values of `fields` as instance._stored (None for a new row); a save
+    # limited to other fields can't change them, so nothing is read
+    instance._stored = None
+    instance._tracked_changed = True
+    if not instance.pk:
+        return
+    names = set(fields) | {field.removesuffix('_id') for field in fields}
+    if update_fields is not None and not names & set(update_fields):
+        instance._tracked_changed = False
+        return
+    instance._stored = type(instance).objects.filter(pk=instance.pk).values(*fields).first()
+    if instance._stored is not None:
+        instance._tracked_changed = any(getattr(instance, field) != instance._stored[field] for field in fields)
+
+
+def _stored(instance, field):
+    stored = getattr(instance, '_stored', None)
+    return stored[field] if stored else None
+
+
+@receiver(pre_save, sender=WeeklyUpdate)
+def weekly_update_saving(sender, instance, update_fields=None, **kwargs):
+    # Remember the stored week and stage so a moved update also refreshes its old rollup
+    # week and duration stats
+    _remember_stored(instance, WEEKLY_UPDATE_TRACKED, update_fields)
+
+
+@receiver(post_save, sender=WeeklyUpdate)
+def weekly_update_saved(sender, instance, **kwargs):
+    publish(
+        ChangeEvent.Kind.WEEKLY_UPDATE_SAVED, instance.demand_id,
+        update_id=instance.id, week_number=instance.week_number, current_stage=instance.current_stage,
+    )
+    if not getattr(instance, '_tracked_changed', True):
+        # e.g. only the progress or the texts changed
+        return
+    record_stage_change(instance.demand_id, StageTransition.Source.WEEKLY_UPDATE_SAVED)
+    refresh_weeks([instance.week_start_date, _stored(instance, 'week_start_date')])
+    _refresh_stage_stats(instance.demand_id, [instance.current_stage, _stored(instance, 'current_stage')])
+
+
+@receiver(post_delete, sender=WeeklyUpdate)
+def weekly_update_deleted(sender, instance, origin=None, **kwargs):
+    if _deleting_demand(origin):
+        # demand_deleted refreshes the demand's weeks and stages once
+        return
+    publish(ChangeEvent.Kind.WEEKLY_UPDATE_DELETED, instance.demand_id, update_id=instance.id)
+    record_stage_change(instance.demand_id, StageTransition.Source.WEEKLY_UPDATE_DELETED)
+    refresh_weeks([instance.week_start_date])
+    _refresh_stage_stats(instance.demand_id, [instance.current_stage])
+
+
+@receiver(pre_save, sender=Demand)
+def demand_saving(sender, instance, update_fields=None, **kwargs):
+    _remember_stored(instance, DEMAND_TRACKED, update_fields)
+
+
+@receiver(post_save, sender=Demand)
+def demand_saved(sender, instance, created, **kwargs):
+    publish(ChangeEvent.Kind.DEMAND_SAVED, instance.id, name=instance.name, created=created)
+    if created or not getattr(instance, '_tracked_changed', True):
+        return
+
+    # file_type and demand_amount feed the rollups of every week the demand reported in
+    stored = getattr(instance, '_stored', None) or {}
+    if (instance.file_type, instance.demand_amount) != (stored.get('file_type'), stored.get('demand_amount')):
+        refresh_weeks(instance.weekly_updates.order_by().values_list('week_start_date', flat=True).distinct())
+
+    # Moving a demand to another file type/subtype moves its stage durations between stat groups
+    previous_group = (stored['file_type'], stored['file_subtype']) if stored else None
+    current_group = (instance.file_type, instance.file_subtype)
+    if previous_group and previous_group != current_group:
+        stages = instance.stages.exclude(stage='mini_progress').values_list('stage', flat=True).distinct()
+        _refresh_stage_stats(instance.pk, list(stages), groups=[previous_group, current_group])
+
+
+@receiver(pre_delete, sender=Demand)
+def demand_deleting(sender, instance, **kwargs):
+    # The weeks and stages the demand's history feeds, read before the cascade removes it
+    if _bulk_deleting.get():
+        return
+    instance._deleted_weeks = list(instance.weekly_updates.order_by().values_list('week_start_date', flat=True).distinct())
+    instance._deleted_stages = (
+        set(instance.stages.exclude(stage='mini_progress').values_list('stage', flat=True))
+        | set(instance.weekly_updates.values_list('current_stage', flat=True))
+    )
+
+
+@receiver(post_delete, sender=Demand)
+def demand_deleted(sender, instance, **kwargs):
+    if _bulk_deleting.get():
+        return
+    publish(ChangeEvent.Kind.DEMAND_DELETED, instance.id, name=instance.name)
+    refresh_weeks(getattr(instance, '_deleted_weeks', []))
+    _refresh_stage_stats(
+        instance.id, getattr(instance, '_deleted_stages', []), groups=[(instance.file_type, instance.file_subtype)],
+    )
+
+
+@receiver(pre_save, sender=DemandStagePeriod)
+def stage_period_saving(sender, instance, update_fields=None, **kwargs):
+    _remember_stored(instance, STAGE_PERIOD_TRACKED, update_fields)
+
+
+@receiver(post_save, sender=DemandStagePeriod)
+def stage_period_saved(sender, instance, **kwargs):
+    publish(ChangeEvent.Kind.STAGE_SAVED, instance.demand_id, stage_id=instance.id, stage=instance.stage)
+    if not getattr(instance, '_tracked_changed', True):
+        return
+    if instance.stage != 'mini_progress':
+        record_stage_change(instance.demand_id, StageTransition.Source.STAGE_PERIOD_SAVED)
+    _refresh_stage_stats(instance.demand_id, [instance.stage, _stored(instance, 'stage')])
+
+
+@receiver(post_delete, sender=DemandStagePeriod)
+def stage_period_deleted(sender, instance, origin=None, **kwargs):
+    if _deleting_demand(origin):
+        return
+    publish(ChangeEvent.Kind.STAGE_DELETED, instance.demand_id, stage_id=instance.id, stage=instance.stage)
+    if instance.stage != 'mini_progress':
+        record_stage_change(instance.demand_id, StageTransition.Source.STAGE_PERIOD_DELETED)
+    _refresh_stage_stats(instance.demand_id, [instance.stage])
+
+
+@receiver(post_save, sender=StageTransition)
+def stage_transition_recorded(sender, instance, created, **kwargs):
+    if created:
+        publish(
+            ChangeEvent.Kind.STAGE_CHANGED, instance.demand_id,
+            from_stage=instance.from_stage, stage=instance.stage, stage_number=instance.stage_number,
+        )
+
+
+def tracker_data_changed(sender, instance, origin=None, **kwargs):
+    if _bulk_deleting.get() or (sender is not Demand and _deleting_demand(origin)):
+        # The demand's own post_delete bumps the versions once for its whole history
+        return
+    bump_data_version()
+    bump_demand_version(instance.pk if sender is Demand else instance.demand_id)
+    schedule_publish()
+
+
+for model in (Demand, DemandStagePeriod, WeeklyUpdate):
+    post_save.connect(tracker_data_changed, sender=model)
+    post_delete.connect(tracker_data_changed, sender=model)
@@ -0,0 +1,263 @@
+"""Static, precompressed HTML snapshots of the read-only dashboard pages
+
+publish() renders the pages to settings.TRACKER_SNAPSHOT_DIR as .html and .html.gz
+files, skipping pages whose data hasn't changed since the last run, and
+SnapshotMiddleware serves them to anonymous viewers when TRACKER_SERVE_SNAPSHOTS is on.
+Change detection reads the ChangeEvent feed, so writes that bypass model signals
+(e.g. QuerySet.update) need a publish with force=True.
+
+Snapshots carry no CSRF token of their own: the token rendered into the page would
+belong to the publish run. The hidden csrfmiddlewaretoken inputs are left empty and a
+short script fills them from the visitor's CSRF cookie, which SnapshotMiddleware sets,
+so the dashboard's forms and AJAX writes keep working. A front-end server that serves
+the directory directly sets no cookie; that only suits read-only viewers.
+
+While TRACKER_SERVE_SNAPSHOTS is on, every tracker write queues a publish_snapshots
+job (schedule_publish()), so the pages catch up once a worker (run_workers) runs it;
+until then they show the data as of the last publish.
+"""
+import gzip
+import json
+import multiprocessing
+import os
+import re
+from pathlib import Path
+from urllib.parse import urlencode
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.contrib.sessions.backends.base import SessionBase
+from django.db import connections, transaction
+from django.http import Http404
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+FILE_TYPES = ['CASH', 'GEM', 'LPC']
+MANIFEST = 'manifest.json'
+
+# The {% csrf_token %} input, whose value is the publish run's token
+CSRF_INPUT = re.compile(rb'(<input type="hidden" name="csrfmiddlewaretoken" value=")[^"]*(">)')
+# Fills those inputs from the CSRF cookie when the page loads
+CSRF_SCRIPT = """<script>
+(function () {
+  var match = document.cookie.match(/(?:^|;\\s*)%s=([^;]+)/);
+  if (!match) return;
+  document.querySelectorAll('input[name=csrfmiddlewaretoken]').forEach(function (input) {
+    input.value = decodeURIComponent(match[1]);
+  });
+})();
+</script>
+"""
+
+
+def snapshot_name(url_name, kwargs, query):
+    """File name of the snapshot for a resolved URL and its query dict, or None if not published"""
+    if url_name == 'demand_list':
+        if not query:
+            return 'index.html'
+        if list(query) == ['file_type'] and query['file_type'] in FILE_TYPES:
+            return f"file_type_{query['file_type'].lower()}.html"
+    elif query:
+        return None
+    elif url_name == 'weekly_summary':
+        return 'weekly_summary.html'
+    elif url_name == 'weekly_history':
+        return f"weekly_history_{kwargs['demand_id']}.html"
+    return None
+
+
+def _page(url_name, kwargs=None, query=None):
+    url = reverse(url_name, kwargs=kwargs)
+    if query:
+        url = f'{url}?{urlencode(query)}'
+    return snapshot_name(url_name, kwargs or {}, query or {}), url
+
+
+def portfolio_pages():
+    """Pages built from the whole portfolio, as (file name, url)"""
+    return [_page('demand_list'), _page('weekly_summary')] + [
+        _page('demand_list', query={'file_type': file_type}) for file_type in FILE_TYPES
+    ]
+
+
+def demand_pages(demand_ids):
+    return [_page('weekly_history', kwargs={'demand_id': demand_id}) for demand_id in demand_ids]
+
+
+class _UnsavedSession(SessionBase):
+    # Views may write to the session (demand_list caches current stages there);
+    # snapshot renders must not create session rows
+    def exists(self, session_key):
+        return False
+
+    def create(self):
+        pass
+
+    def save(self, must_create=False):
+        pass
+
+    def delete(self, session_key=None):
+        pass
+
+    def load(self):
+        return {}
+
+
+def render_page(name, url, output_dir):
+    """Render one page and write it as name and name.gz; returns the uncompressed size"""
+    if not apps.ready:
+        # Spawned (non-fork) worker processes start without Django set up
+        django.setup()
+
+    request = RequestFactory().get(url)
+    request.session = _UnsavedSession()
+    match = resolve(request.path_info)
+    target = Path(output_dir) / name
+    try:
+        response = match.func(request, *match.args, **match.kwargs)
+    except Http404:
+        # The demand was deleted after the page was planned
+        target.unlink(missing_ok=True)
+        target.with_name(name + '.gz').unlink(missing_ok=True)
+        return 0
+    if response.status_code != 200:
+        raise RuntimeError(f'{url} returned HTTP {response.status_code}')
+
+    # demand_list streams its rows when TRACKER_STREAM_DASHBOARD is on
+    content = b''.join(response.streaming_content) if response.streaming else response.content
+    content = _without_csrf_token(content)
+    for path, data in ((target, content), (target.with_name(name + '.gz'), gzip.compress(content, 9))):
+        tmp = path.with_name(path.name + '.tmp')
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    return len(content)
+
+
+def _without_csrf_token(content):
+    # Empty the rendered token and add the script that fills in the visitor's
+    content, count = CSRF_INPUT.subn(rb'\1\2', content)
+    if not count:
+        return content
+    script = (CSRF_SCRIPT % re.escape(settings.CSRF_COOKIE_NAME)).encode()
+    head, body_end, tail = content.rpartition(b'</body>')
+    return head + script + body_end + tail if body_end else content + script
+
+
+def _render_task(args):
+    return render_page(*args)
+
+
+def snapshot_path(request):
+    """Snapshot file for a request the snapshots can answer, or None"""
+    match = request.resolver_match
+    if match is None:
+        return None
+    name = snapshot_name(match.url_name, match.kwargs, request.GET.dict())
+    if name is None:
+        return None
+    path = Path(settings.TRACKER_SNAPSHOT_DIR) / name
+    return path if path.exists() else None
+
+
+def _read_manifest(output_dir):
+    try:
+        return json.loads((output_dir / MANIFEST).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def plan(output_dir, force=False):
+    """Work out which pages to render and which files to remove
+
+    Returns (pages, stale_files, manifest): pages as (file name, url) pairs and the
+    manifest to record once they are written.
+    """
+    from .models import ChangeEvent, Demand
+
+    demand_ids = set(Demand.objects.values_list('id', flat=True))
+    event_id = ChangeEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    manifest = _read_manifest(output_dir)
+
+    published = set(manifest['demand_ids']) if manifest else set()
+    new_manifest = {'event_id': event_id, 'demand_ids': sorted(demand_ids)}
+    stale_files = [name for name, _ in demand_pages(published - demand_ids)]
+    for name in list(stale_files):
+        stale_files.append(name + '.gz')
+
+    if force or manifest is None:
+        return portfolio_pages() + demand_pages(sorted(demand_ids)), stale_files, new_manifest
+
+    last_id = manifest['event_id']
+    if event_id == last_id:
+        return [], stale_files, new_manifest
+
+    # Events are pruned; if any between the last publish and now are gone, redo everything
+    oldest = ChangeEvent.objects.order_by('id').values_list('id', flat=True).first()
+    if oldest is None or oldest > last_id + 1:
+        return portfolio_pages() + demand_pages(sorted(demand_ids)), stale_files, new_manifest
+
+    changed = set(
+        ChangeEvent.objects.filter(id__gt=last_id).order_by().values_list('demand_id', flat=True).distinct()
+    )
+    # Demands that appeared since the last publish have no history page yet
+    changed |= demand_ids - published
+    return portfolio_pages() + demand_pages(sorted(changed & demand_ids)), stale_files, new_manifest
+
+
+def publish(processes=None, force=False, progress=None):
+    """Render the changed snapshot pages in parallel processes
+
+    Returns a dict of counts. `progress(done, total)` is called after each page.
+    """
+    output_dir = Path(settings.TRACKER_SNAPSHOT_DIR)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    pages, stale_files, manifest = plan(output_dir, force)
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if multiprocessing.current_process().daemon:
+        # Pool workers (e.g. run_workers) can't start processes of their own
+        processes = 1
+
+    tasks = [(name, url, str(output_dir)) for name, url in pages]
+    total_bytes = 0
+    if processes > 1 and len(tasks) > 1:
+        # Forked workers must not share this process's database connection
+        connections.close_all()
+        with multiprocessing.Pool(min(processes, len(tasks))) as pool:
+            for done, size in enumerate(pool.imap_unordered(_render_task, tasks), 1):
+                total_bytes += size
+                if progress:
+                    progress(done, len(tasks))
+    else:
+        for done, task in enumerate(tasks, 1):
+            total_bytes += _render_task(task)
+            if progress:
+                progress(done, len(tasks))
+
+    for name in stale_files:
+        (output_dir / name).unlink(missing_ok=True)
+
+    # Written last so an interrupted run is repeated next time
+    (output_dir / MANIFEST).write_text(json.dumps(manifest))
+    return {'rendered': len(tasks), 'removed': len(stale_files) // 2, 'bytes': total_bytes}
+
+
+def schedule_publish():
+    """Queue a publish_snapshots job after the current transaction commits
+
+    Does nothing unless TRACKER_SERVE_SNAPSHOTS is on, or while a publish is already
+    queued: that job reads the change feed when it starts, so it covers this write too.
+    """
+    if not settings.TRACKER_SERVE_SNAPSHOTS:
+        return
+
+    def enqueue():
+        from . import jobs
+        from .models import Job
+
+        if not Job.objects.filter(task='publish_snapshots', status=Job.Status.QUEUED).exists():
+            jobs.enqueue('publish_snapshots')
+
+    transaction.on_commit(enqueue)
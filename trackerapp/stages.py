@@ -0,0 +1,54 @@
+from functools import lru_cache
+from types import MappingProxyType
+from typing import NamedTuple
+
+from .models import STAGE_COLORS, STAGE_ORDER, Stage, mask_to_stages
+
+
+class LegendEntry(NamedTuple):
+    number: int
+    label: str
+    color: str
+
+
+class StageCatalog:
+    """Immutable lookup tables for the stage workflow, built once per process
+
+    Use get_stage_catalog() instead of instantiating this directly.
+    """
+
+    def __init__(self):
+        ordered = sorted(STAGE_ORDER.items(), key=lambda x: x[1])
+
+        # number -> Stage, indexable by stage number
+        self.by_number = tuple(stage for stage, _ in ordered)
+        # Stage -> number, in stage order (keys are Stage members, lookups accept plain strings)
+        self.numbers = MappingProxyType(dict(ordered))
+        self.labels = MappingProxyType({stage: stage.label for stage in Stage})
+        self.colors = MappingProxyType(dict(STAGE_COLORS))
+        self.legend = tuple(
+            LegendEntry(number, stage.label, STAGE_COLORS.get(stage, '#888'))
+            for stage, number in ordered
+        )
+
+    def stage_for_number(self, number):
+        if 0 <= number < len(self.by_number):
+            return self.by_number[number]
+        return None
+
+    def choices_for(self, selected_stages_mask):
+        """current_stage choices for a demand's selected stages, as a tuple of (value, label)"""
+        return _choices_for_mask(selected_stages_mask)
+
+
+@lru_cache(maxsize=1024)
+def _choices_for_mask(mask):
+    catalog = get_stage_catalog()
+    return (('', 'Select Stage'),) + tuple(
+        (stage, catalog.labels[stage]) for stage in mask_to_stages(mask)
+    )
+
+
+@lru_cache(maxsize=None)
+def get_stage_catalog():
+    return StageCatalog()
@@ -1,3 +1,965 @@
-from django.test import TestCase
+import copy
+import io
+import json
+import os
+import random
+import re
+import tempfile
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import archive, async_views, backup, bulk, checks, equivalence, forecast, jobs, reports, views
+from .models import (
+    STAGE_ORDER, ChangeEvent, Demand, DemandStagePeriod, Job, SelectedStages, Stage, StageDurationStat, StageTransition,
+    WeeklyRollup, WeeklyUpdate,
+)
+from .rollups import rebuild_rollups
+
+
+@skipUnlessDBFeature('supports_explaining_query_execution')
+class QueryPlanTests(TestCase):
+    """The views' querysets are answered from an index, not by scanning a table
+
+    Each test runs EXPLAIN QUERY PLAN (SQLite) on a queryset as a view builds it. A
+    missing or unusable index shows up as a bare "SCAN <table>" step, and an index
+    that no longer gives the requested order as "USE TEMP B-TREE FOR ORDER BY".
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.demand = Demand.objects.create(name='Query plans', file_type='GEM', demand_amount=100)
+
+    def plan(self, queryset):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plan assertions are written for SQLite')
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, index=None, allow_sort=False):
+        """Every table is searched or walked through an index (`index` among them, if given)
+
+        allow_sort accepts a sort after the search, for rows of one demand.
+        """
+        plan = self.plan(queryset)
+        indexed = re.findall(r'USING (?:COVERING )?INDEX (\w+)|USING INTEGER PRIMARY KEY', plan)
+        self.assertTrue(indexed, f'No index used:\n{plan}')
+        if index is not None:
+            self.assertIn(index, indexed, f'{index} not used:\n{plan}')
+        self.assertNotRegex(plan, r'(?m)\bSCAN \w+$', f'Full table scan:\n{plan}')
+        if not allow_sort:
+            self.assertNotIn('USE TEMP B-TREE', plan, f'Sorted outside an index:\n{plan}')
+
+    def test_dashboard_demands(self):
+        self.assertUsesIndex(Demand.objects.active().order_by('id'), 'demand_archived_idx')
+        self.assertUsesIndex(Demand.objects.active().filter(file_type='GEM').order_by('id'))
+
+    def test_demand_pickers(self):
+        self.assertUsesIndex(Demand.objects.order_by('name'), 'demand_name_idx')
+        self.assertUsesIndex(Demand.objects.filter(file_type='GEM').order_by('name'), 'demand_file_type_name_idx')
+
+    def test_archive(self):
+        self.assertUsesIndex(Demand.objects.archived().order_by('-archived_at', '-id'), 'demand_archived_idx')
+        self.assertUsesIndex(
+            DemandStagePeriod.objects.filter(demand_id__in=[self.demand.id], stage_number__isnull=False).order_by(),
+            'stage_demand_number_idx',
+        )
+
+    def test_stage_periods_by_demand(self):
+        self.assertUsesIndex(DemandStagePeriod.objects.filter(demand__in=[self.demand.id]))
+        self.assertUsesIndex(self.demand.stages.filter(stage='mini_progress'))
+        self.assertUsesIndex(self.demand.stages.exclude(stage='mini_progress').order_by('-start_date'), allow_sort=True)
+
+    def test_weekly_updates_by_demand(self):
+        self.assertUsesIndex(
+            self.demand.weekly_updates.filter(current_stage='mini_progress').order_by('week_start_date'),
+            'weekly_demand_stage_start_idx',
+        )
+        self.assertUsesIndex(WeeklyUpdate.objects.filter(demand=self.demand).order_by('-week_number'))
+
+    def test_admin_date_ordering(self):
+        self.assertUsesIndex(DemandStagePeriod.objects.order_by('-start_date', '-id'), 'stage_start_idx')
+        self.assertUsesIndex(WeeklyUpdate.objects.order_by('-week_start_date', '-id'), 'weekly_start_idx')
+
+    def test_stage_on_date(self):
+        self.assertUsesIndex(
+            StageTransition.objects.filter(demand=self.demand, effective_date__lte=date.today()).order_by('-effective_date', '-id'),
+            'transition_demand_date_idx',
+        )
+
+    def test_change_events_since(self):
+        self.assertUsesIndex(ChangeEvent.objects.filter(id__gt=1, id__lte=10).values('demand_id'))
+
+    def test_job_queue(self):
+        self.assertUsesIndex(
+            Job.objects.filter(status=Job.Status.QUEUED, run_after__lte=timezone.now()).order_by('run_after', 'id'),
+            'job_status_run_after_idx',
+        )
+
+
+def demand_data(name, **changes):
+    """A demand as the API takes it, valid for DemandApiForm"""
+    return {
+        'name': name, 'demand_ID': f'D-{name}', 'file_type': 'GEM', 'file_subtype': 'Build up',
+        'demand_amount': '1000.00', 'io_name': 'IO', 'start_date': '2025-01-06', 'duration_months': 6,
+        'selected_stages': [Stage.DEMAND_INITIATED, Stage.DEMAND_APPROVED], **changes,
+    }
+
+
+class ApiTests(TestCase):
+    """trackerapp.api: lists, bulk writes, ETags, since sync and authorization"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.demand = Demand.objects.create(**demand_data('Existing'))
+
+    def collection_url(self, resource='demands'):
+        return reverse('api_collection', kwargs={'resource': resource})
+
+    def item_url(self, pk, resource='demands'):
+        return reverse('api_item', kwargs={'resource': resource, 'pk': pk})
+
+    def send(self, method, url, data, client=None, **headers):
+        # Writes publish change events on commit; run those callbacks as a real commit would
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(client or self.client, method)(url, json.dumps(data), content_type='application/json', **headers)
+
+    def test_list_pages_in_id_order(self):
+        self.send('post', self.collection_url(), [demand_data(f'Demand {n}') for n in range(3)])
+
+        response = self.client.get(self.collection_url(), {'limit': 2, 'fields': 'name'})
+        self.assertEqual(response.status_code, 200)
+        first = response.json()
+        self.assertEqual([item['name'] for item in first['items']], ['Existing', 'Demand 0'])
+        self.assertEqual(set(first['items'][0]), {'id', 'name'})
+
+        rest = self.client.get(self.collection_url(), {'limit': 2, 'cursor': first['next_cursor']}).json()
+        self.assertEqual([item['name'] for item in rest['items']], ['Demand 1', 'Demand 2'])
+        self.assertIsNone(rest['next_cursor'])
+
+    def test_bulk_create(self):
+        response = self.send('post', self.collection_url(), [demand_data('First'), demand_data('Second')])
+        self.assertEqual(response.status_code, 201)
+        items = response.json()['items']
+        self.assertEqual([item['name'] for item in items], ['First', 'Second'])
+        self.assertEqual(items[0]['selected_stages'], [Stage.DEMAND_INITIATED, Stage.DEMAND_APPROVED])
+        self.assertEqual(Demand.objects.count(), 3)
+
+    def test_bulk_create_is_all_or_nothing(self):
+        response = self.send('post', self.collection_url(), [demand_data('Valid'), demand_data('Invalid', file_type='XYZ')])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()['errors']), ['1'])
+        self.assertFalse(Demand.objects.filter(name='Valid').exists())
+
+    def test_bulk_create_weekly_updates_validates_against_the_demand(self):
+        demand = Demand.objects.get(pk=self.send('post', self.collection_url(), [demand_data('Tracked')]).json()['items'][0]['id'])
+        week = {
+            'demand': demand.id, 'week_number': 1, 'week_start_date': '2025-01-06', 'week_end_date': '2025-01-12',
+            'progress_percentage': 10,
+        }
+        response = self.send('post', self.collection_url('weekly-updates'), [
+            {**week, 'current_stage': Stage.DEMAND_INITIATED},
+            {**week, 'week_number': 2, 'current_stage': Stage.TENDER_OPENING},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()['errors']), ['1'])
+
+        response = self.send('post', self.collection_url('weekly-updates'), [{**week, 'current_stage': Stage.DEMAND_INITIATED}])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(demand.weekly_updates.get().current_stage, Stage.DEMAND_INITIATED)
+
+    def test_bulk_update(self):
+        other = Demand.objects.get(pk=self.send('post', self.collection_url(), [demand_data('Other')]).json()['items'][0]['id'])
+        response = self.send('patch', self.collection_url(), [
+            {'id': self.demand.id, 'io_name': 'IO 2'},
+            {'id': other.id, 'demand_amount': '2500.00'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.demand.refresh_from_db()
+        other.refresh_from_db()
+        # Fields left out keep their stored values
+        self.assertEqual((self.demand.io_name, self.demand.name), ('IO 2', 'Existing'))
+        self.assertEqual(str(other.demand_amount), '2500.00')
+
+        response = self.send('patch', self.collection_url(), [{'id': self.demand.id, 'name': 'Renamed'}, {'id': 0}])
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['ids'], [0])
+        self.demand.refresh_from_db()
+        self.assertEqual(self.demand.name, 'Existing')
+
+    def test_item_patch_and_delete(self):
+        response = self.send('patch', self.item_url(self.demand.id), {'name': 'Renamed'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['item']['name'], 'Renamed')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(self.item_url(self.demand.id)).status_code, 200)
+        self.assertEqual(self.client.get(self.item_url(self.demand.id)).status_code, 404)
+
+    def test_collection_etag(self):
+        response = self.client.get(self.collection_url())
+        etag = response['ETag']
+
+        # Answered from the cached data version, before any query
+        with self.assertNumQueries(0):
+            response = self.client.get(self.collection_url(), headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        self.send('post', self.collection_url(), [demand_data('New')])
+        response = self.client.get(self.collection_url(), headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        response = self.send('patch', self.collection_url(), [{'id': self.demand.id, 'name': 'Stale'}], headers={'if-match': etag})
+        self.assertEqual(response.status_code, 412)
+
+    def test_etag_per_query_string(self):
+        self.send('post', self.collection_url(), [demand_data(f'Demand {n}') for n in range(3)])
+        first = self.client.get(self.collection_url(), {'limit': 2})
+        second = self.client.get(self.collection_url(), {'limit': 2, 'cursor': first.json()['next_cursor']})
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+        # Page 2 isn't answered 304 against page 1's validator
+        response = self.client.get(
+            self.collection_url(), {'limit': 2, 'cursor': first.json()['next_cursor']}, headers={'if-none-match': first['ETag']},
+        )
+        self.assertEqual(response.status_code, 200)
+        # The same parameters in another order are the same variant
+        response = self.client.get(
+            f"{self.collection_url()}?cursor={first.json()['next_cursor']}&limit=2", headers={'if-none-match': second['ETag']},
+        )
+        self.assertEqual(response.status_code, 304)
+
+        # A write compares the data version only, so a filtered read's ETag passes If-Match
+        response = self.send('patch', self.collection_url(), [{'id': self.demand.id, 'io_name': 'IO 2'}], headers={'if-match': second['ETag']})
+        self.assertEqual(response.status_code, 200)
+        response = self.send('patch', self.collection_url(), [{'id': self.demand.id, 'io_name': 'IO 3'}], headers={'if-match': second['ETag']})
+        self.assertEqual(response.status_code, 412)
+
+    def test_item_etag(self):
+        etag = self.client.get(self.item_url(self.demand.id))['ETag']
+        self.assertEqual(self.client.get(self.item_url(self.demand.id), headers={'if-none-match': etag}).status_code, 304)
+
+        response = self.send('patch', self.item_url(self.demand.id), {'io_name': 'IO 2'}, headers={'if-match': etag})
+        self.assertEqual(response.status_code, 200)
+        # The first write changed the row, so a second one based on the same read is refused
+        response = self.send('patch', self.item_url(self.demand.id), {'io_name': 'IO 3'}, headers={'if-match': etag})
+        self.assertEqual(response.status_code, 412)
+        self.demand.refresh_from_db()
+        self.assertEqual(self.demand.io_name, 'IO 2')
+
+    def test_since_returns_changed_and_deleted_rows(self):
+        created = self.send('post', self.collection_url(), [demand_data('Kept'), demand_data('Deleted')]).json()['items']
+        event_id = self.client.get(self.collection_url()).json()['event_id']
+
+        self.send('patch', self.item_url(created[0]['id']), {'io_name': 'IO 2'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(self.item_url(created[1]['id']))
+
+        response = self.client.get(self.collection_url(), {'since': event_id})
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertEqual([item['id'] for item in payload['items']], [created[0]['id']])
+        self.assertEqual(payload['deleted'], [created[1]['id']])
+        self.assertGreater(payload['event_id'], event_id)
+
+        # Nothing changed since the last sync
+        payload = self.client.get(self.collection_url(), {'since': payload['event_id']}).json()
+        self.assertEqual((payload['items'], payload['deleted']), ([], []))
+
+    def test_since_older_than_retained_events(self):
+        self.send('post', self.collection_url(), [demand_data(f'Demand {n}') for n in range(3)])
+        event_ids = list(ChangeEvent.objects.values_list('id', flat=True))
+        # As trackerapp.events prunes events past EVENT_RETENTION
+        ChangeEvent.objects.filter(id__lte=event_ids[1]).delete()
+
+        response = self.client.get(self.collection_url(), {'since': event_ids[0]})
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(self.client.get(self.collection_url(), {'since': event_ids[1]}).status_code, 200)
+
+    def test_writes_need_csrf_without_token_setting(self):
+        client = Client(enforce_csrf_checks=True)
+        self.assertEqual(client.get(self.collection_url()).status_code, 200)
+        response = self.send('post', self.collection_url(), [demand_data('No token')], client=client)
+        self.assertEqual(response.status_code, 403)
+
+        csrf_token = 'a' * 32
+        client.cookies['csrftoken'] = csrf_token
+        response = self.send('post', self.collection_url(), [demand_data('With token')], client=client, headers={'x-csrftoken': csrf_token})
+        self.assertEqual(response.status_code, 201)
+
+    @override_settings(TRACKER_API_TOKEN='api-secret')
+    def test_token_replaces_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        self.assertEqual(client.get(self.collection_url()).status_code, 401)
+        self.assertEqual(client.get(self.collection_url(), headers={'authorization': 'Bearer wrong'}).status_code, 401)
+
+        response = self.send('post', self.collection_url(), [demand_data('Token')], client=client, headers={'authorization': 'Bearer api-secret'})
+        self.assertEqual(response.status_code, 201)
+        response = self.send('patch', self.item_url(self.demand.id), {'name': 'Token'}, client=client)
+        self.assertEqual(response.status_code, 401)
+
+    def test_etags_need_authorization(self):
+        etag = self.client.get(self.collection_url())['ETag']
+        item_etag = self.client.get(self.item_url(self.demand.id))['ETag']
+        with override_settings(TRACKER_API_TOKEN='api-secret'):
+            self.assertEqual(self.client.get(self.collection_url(), headers={'if-none-match': etag}).status_code, 401)
+            self.assertEqual(self.client.get(self.item_url(self.demand.id), headers={'if-none-match': item_etag}).status_code, 401)
+            response = self.client.get(
+                self.collection_url(), headers={'if-none-match': etag, 'authorization': 'Bearer api-secret'},
+            )
+            self.assertEqual(response.status_code, 304)
+
+
+class ArchiveTests(TestCase):
+    """trackerapp.archive: the rules, and archive/restore as the dashboard and API see them"""
+
+    @classmethod
+    def setUpTestData(cls):
+        today = timezone.localdate()
+        cls.integrated = Demand.objects.create(**demand_data('Integrated', start_date=today))
+        DemandStagePeriod.objects.create(
+            demand=cls.integrated, stage=Stage.AVAILABLE_FOR_INTEGRATION, start_date=today, end_date=today,
+        )
+        cls.ended = Demand.objects.create(**demand_data('Ended', start_date=today - timedelta(days=800)))
+        cls.running = Demand.objects.create(**demand_data('Running', start_date=today))
+
+    def test_candidates(self):
+        matched = archive.archive_candidates({'stages': [Stage.AVAILABLE_FOR_INTEGRATION], 'ended_days': 365})
+        self.assertEqual(matched, {'stages': {self.integrated.id}, 'ended_days': {self.ended.id}})
+
+    def test_archive_and_restore(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(archive.archive([self.integrated.id, self.ended.id]), [self.integrated.id, self.ended.id])
+        # Already archived
+        self.assertEqual(archive.archive([self.ended.id]), [])
+        self.assertEqual(list(Demand.objects.active()), [self.running])
+        self.assertEqual(
+            ChangeEvent.objects.filter(kind=ChangeEvent.Kind.DEMAND_ARCHIVED).count(), 2,
+        )
+
+        response = self.client.get(reverse('archived_demands'))
+        self.assertEqual([row['demand'].id for row in response.context['rows']], [self.ended.id, self.integrated.id])
+
+        response = self.client.post(reverse('restore_demand', kwargs={'demand_id': self.ended.id}))
+        self.assertRedirects(response, reverse('archived_demands'))
+        self.assertEqual(list(Demand.objects.active().order_by('id')), [self.ended, self.running])
+
+    def test_item_etag_changes_on_archive_and_restore(self):
+        url = reverse('api_item', kwargs={'resource': 'demands', 'pk': self.running.id})
+        etag = self.client.get(url)['ETag']
+
+        archive.archive([self.running.id])
+        response = self.client.get(url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.json()['item']['archived_at'])
+
+        etag = response['ETag']
+        archive.restore([self.running.id])
+        response = self.client.get(url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()['item']['archived_at'])
+
+
+def add_weeks(demand, *stages, first=date(2025, 1, 6)):
+    """A weekly update per stage in `stages`, in consecutive weeks from `first`"""
+    for number, stage in enumerate(stages, 1):
+        start = first + timedelta(weeks=number - 1)
+        WeeklyUpdate.objects.create(
+            demand=demand, week_number=number, week_start_date=start, week_end_date=start + timedelta(days=6),
+            current_stage=stage,
+        )
+
+
+def add_periods(demand, *stages, first=date(2025, 1, 6)):
+    """Consecutive two-week stage periods for `stages`, from `first`"""
+    for number, stage in enumerate(stages):
+        start = first + timedelta(weeks=2 * number)
+        DemandStagePeriod.objects.create(demand=demand, stage=stage, start_date=start, end_date=start + timedelta(days=13))
+
+
+def derived_data():
+    """The weekly rollup and stage duration stats rows, comparable with rebuilt_data()"""
+    rollups = WeeklyRollup.objects.values_list('week_start_date', 'file_type', 'stage', 'stage_number', 'demand_count', 'total_amount')
+    stats = [
+        (*row[:5], *(round(value, 9) for value in row[5:]))
+        for row in StageDurationStat.objects.values_list(
+            'file_type', 'file_subtype', 'stage', 'stage_number', 'sample_count',
+            'mean_days', 'p50_days', 'p90_days', 'min_days', 'max_days',
+        )
+    ]
+    return sorted(rollups), sorted(stats)
+
+
+def rebuilt_data():
+    """derived_data() as the full rebuilds compute it from the stage history"""
+    rebuild_rollups()
+    forecast.rebuild_stage_stats()
+    return derived_data()
+
+
+class WeeklyChangesTests(TestCase):
+    """reports.build_weekly_changes over the active portfolio"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.advanced = Demand.objects.create(**demand_data('Advanced'))
+        add_weeks(cls.advanced, Stage.DEMAND_INITIATED, Stage.DEMAND_APPROVED)
+        cls.stalled = Demand.objects.create(**demand_data('Stalled'))
+        add_weeks(cls.stalled, Stage.DEMAND_INITIATED, Stage.DEMAND_INITIATED)
+        cls.silent = Demand.objects.create(**demand_data('Silent'))
+
+        archived_with_updates = Demand.objects.create(**demand_data('Archived with updates'))
+        add_weeks(archived_with_updates, Stage.DEMAND_APPROVED, Stage.DEMAND_INITIATED)
+        archived_silent = Demand.objects.create(**demand_data('Archived silent'))
+        archive.archive([archived_with_updates.id, archived_silent.id])
+
+    def names(self, entries):
+        return [entry['demand_name'] for entry in entries]
+
+    def test_report_leaves_out_archived_demands(self):
+        report = reports.build_weekly_changes(2, today=date(2025, 3, 3))
+        self.assertEqual(self.names(report['advanced']), ['Advanced'])
+        self.assertEqual(self.names(report['stalled']), ['Stalled'])
+        self.assertEqual(self.names(report['no_recent_update']), ['Advanced', 'Silent', 'Stalled'])
+
+    def test_latest_updates_of_active_demands(self):
+        rows = reports.latest_updates_with_previous()
+        self.assertEqual(
+            sorted((row['demand__name'], row['week_number'], row['previous_stage_number']) for row in rows),
+            [('Advanced', 2, STAGE_ORDER[Stage.DEMAND_INITIATED]), ('Stalled', 2, STAGE_ORDER[Stage.DEMAND_INITIATED])],
+        )
+
+
+class VersionCacheCheckTests(TestCase):
+    """trackerapp.checks: the cache holding the version counters"""
+
+    def cache(self, backend):
+        return override_settings(CACHES={'default': {'BACKEND': f'django.core.cache.backends.{backend}'}})
+
+    def ids(self, check):
+        return [error.id for error in check(None)]
+
+    def test_dummy_cache(self):
+        with self.cache('dummy.DummyCache'):
+            self.assertEqual(self.ids(checks.check_version_cache), ['trackerapp.E001'])
+        with self.cache('locmem.LocMemCache'):
+            self.assertEqual(self.ids(checks.check_version_cache), [])
+
+    def test_deployments_need_a_shared_cache(self):
+        with self.cache('locmem.LocMemCache'):
+            self.assertEqual(self.ids(checks.check_shared_version_cache), ['trackerapp.E002'])
+        with self.cache('filebased.FileBasedCache'):
+            self.assertEqual(self.ids(checks.check_shared_version_cache), [])
+
+
+class BackupTests(TestCase):
+    """trackerapp.backup: dump() then load() gives back exactly what dumpdata saw"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.demand = Demand.objects.create(**demand_data('Backed up'))
+        DemandStagePeriod.objects.create(
+            demand=cls.demand, stage=Stage.DEMAND_INITIATED, start_date=date(2025, 1, 6), end_date=date(2025, 1, 31),
+        )
+        add_weeks(cls.demand, Stage.DEMAND_INITIATED, Stage.DEMAND_APPROVED)
+        WeeklyUpdate.objects.filter(week_number=2).update(challenges='Café ✓', progress_percentage=40)
+        Demand.objects.create(**demand_data('Second', demand_amount='1234567.89'))
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'tracker.jsonl.gz')
+
+    def dumpdata(self):
+        out = io.StringIO()
+        call_command('dumpdata', *(model._meta.label for model in backup.MODELS), format='json', stdout=out)
+        return json.loads(out.getvalue())
+
+    def restore(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return backup.load(self.path, **kwargs)
+
+    def test_restore_matches_dumpdata(self):
+        expected = self.dumpdata()
+        counts = backup.dump(self.path)
+        self.assertEqual(sum(counts.values()), len(expected))
+
+        # Changes after the backup are undone by the restore
+        Demand.objects.create(**demand_data('Added later'))
+        self.demand.stages.all().delete()
+        WeeklyUpdate.objects.filter(week_number=2).update(challenges='Edited')
+
+        self.assertEqual(self.restore(replace=True), counts)
+        self.assertEqual(self.dumpdata(), expected)
+
+    def test_restore_needs_replace_over_existing_rows(self):
+        backup.dump(self.path)
+        with self.assertRaises(backup.BackupError):
+            backup.load(self.path)
+
+    def test_restore_publishes_changes(self):
+        backup.dump(self.path)
+        with self.captureOnCommitCallbacks(execute=True):
+            added = Demand.objects.create(**demand_data('Added later'))
+            stage = DemandStagePeriod.objects.create(
+                demand=self.demand, stage=Stage.DEMAND_APPROVED, start_date=date(2025, 2, 3), end_date=date(2025, 2, 28),
+            )
+        event_id = ChangeEvent.objects.order_by('-id').values_list('id', flat=True).first()
+
+        self.restore(replace=True)
+
+        response = self.client.get(reverse('api_collection', kwargs={'resource': 'demands'}), {'since': event_id})
+        payload = response.json()
+        self.assertEqual(sorted(item['name'] for item in payload['items']), ['Backed up', 'Second'])
+        self.assertEqual(payload['deleted'], [added.id])
+        response = self.client.get(reverse('api_collection', kwargs={'resource': 'stages'}), {'since': event_id})
+        self.assertEqual(response.json()['deleted'], [stage.id])
+
+
+class SelectedStagesTests(TestCase):
+    """Demand.selected_stages over the stage bitmask, and with_stage()"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.early = Demand.objects.create(**demand_data('Early', selected_stages=[Stage.DEMAND_INITIATED, Stage.SPC_CLEARED]))
+        cls.late = Demand.objects.create(**demand_data('Late', selected_stages=[Stage.AVAILABLE_FOR_INTEGRATION]))
+        cls.none = Demand.objects.create(**demand_data('None', selected_stages=[]))
+
+    def test_mask_round_trip(self):
+        demand = Demand.objects.get(pk=self.early.pk)
+        self.assertEqual(demand.selected_stages_mask, 1 << STAGE_ORDER[Stage.DEMAND_INITIATED] | 1 << STAGE_ORDER[Stage.SPC_CLEARED])
+        # Stage order, whatever order they were given in
+        demand.selected_stages = [Stage.SPC_CLEARED, Stage.DEMAND_INITIATED, 'not_a_stage']
+        self.assertEqual(demand.selected_stages, [Stage.DEMAND_INITIATED, Stage.SPC_CLEARED])
+        self.assertIn(Stage.SPC_CLEARED, demand.selected_stages)
+        self.assertNotIn(Stage.DEMAND_APPROVED, demand.selected_stages)
+        self.assertTrue(demand.has_stage(Stage.DEMAND_INITIATED))
+
+    def test_selected_stages_are_read_only(self):
+        stages = self.early.selected_stages
+        for change in (
+            lambda: stages.append(Stage.DEMAND_APPROVED),
+            lambda: stages.remove(Stage.SPC_CLEARED),
+            lambda: stages.extend([Stage.DEMAND_APPROVED]),
+            lambda: stages.__setitem__(0, Stage.DEMAND_APPROVED),
+            lambda: stages.clear(),
+        ):
+            with self.assertRaises(TypeError):
+                change()
+        self.assertEqual(stages, [Stage.DEMAND_INITIATED, Stage.SPC_CLEARED])
+        # Copies keep the mask
+        copied = copy.deepcopy(stages)
+        self.assertIsInstance(copied, SelectedStages)
+        self.assertEqual((copied, copied.mask), (stages, stages.mask))
+
+    def test_with_stage(self):
+        self.assertEqual(list(Demand.objects.with_stage(Stage.SPC_CLEARED)), [self.early])
+        self.assertEqual(list(Demand.objects.with_stage(Stage.AVAILABLE_FOR_INTEGRATION)), [self.late])
+        self.assertEqual(list(Demand.objects.with_stage(Stage.DEMAND_APPROVED)), [])
+
+
+class SelectedStagesMaskMigrationTests(TransactionTestCase):
+    """0011_selected_stages_mask moves the JSON stage lists into the bitmask and back"""
+
+    before = [('trackerapp', '0010_stage_number')]
+    after = [('trackerapp', '0011_selected_stages_mask')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes('trackerapp'))
+
+    def test_forwards_and_backwards(self):
+        apps = self.migrate(self.before)
+        Demand = apps.get_model('trackerapp', 'Demand')
+        selected = Demand.objects.create(name='Selected', selected_stages=[Stage.TENDER_OPENING, Stage.DEMAND_INITIATED, 'gone'])
+        empty = Demand.objects.create(name='Empty', selected_stages=[])
+
+        apps = self.migrate(self.after)
+        masks = dict(apps.get_model('trackerapp', 'Demand').objects.values_list('id', 'selected_stages_mask'))
+        self.assertEqual(masks, {
+            selected.id: 1 << STAGE_ORDER[Stage.DEMAND_INITIATED] | 1 << STAGE_ORDER[Stage.TENDER_OPENING],
+            empty.id: 0,
+        })
+
+        apps = self.migrate(self.before)
+        stages = dict(apps.get_model('trackerapp', 'Demand').objects.values_list('id', 'selected_stages'))
+        self.assertEqual(stages, {selected.id: [Stage.DEMAND_INITIATED, Stage.TENDER_OPENING], empty.id: []})
+
+
+class JobQueueTests(TestCase):
+    """Claiming, retrying and requeueing trackerapp.jobs jobs"""
+
+    def setUp(self):
+        self.calls = []
+        tasks = {'flaky': self.flaky, 'record': lambda job, **kwargs: self.calls.append(kwargs) or kwargs}
+        patcher = mock.patch.dict(jobs.TASKS, tasks)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def flaky(self, job):
+        raise RuntimeError('boom')
+
+    def test_claim_takes_due_jobs_in_order(self):
+        later = jobs.enqueue('record', delay=timedelta(hours=1), n=0)
+        first = jobs.enqueue('record', n=1)
+        second = jobs.enqueue('record', n=2)
+
+        job = jobs.claim('w1')
+        self.assertEqual((job.pk, job.status, job.locked_by, job.attempts), (first.pk, Job.Status.RUNNING, 'w1', 1))
+        self.assertEqual(jobs.claim('w2').pk, second.pk)
+        self.assertIsNone(jobs.claim('w3'))
+
+        jobs.run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.locked_by), (Job.Status.SUCCEEDED, {'n': 1}, ''))
+        later.refresh_from_db()
+        self.assertEqual((later.status, later.attempts), (Job.Status.QUEUED, 0))
+
+    def test_retry_then_fail(self):
+        job = jobs.enqueue('flaky', max_attempts=2)
+
+        jobs.run_job(jobs.claim('w1'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.QUEUED, 1))
+        self.assertIn('RuntimeError: boom', job.error)
+        self.assertGreater(job.run_after, timezone.now() + jobs.RETRY_DELAY / 2)
+        self.assertIsNone(jobs.claim('w1'))
+
+        Job.objects.update(run_after=timezone.now())
+        jobs.run_job(jobs.claim('w1'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.FAILED, 2))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(jobs.work(burst=True), 0)
+
+    def test_requeue_stale(self):
+        retry = jobs.enqueue('record', max_attempts=2)
+        spent = jobs.enqueue('record', max_attempts=1)
+        fresh = jobs.enqueue('record')
+        for _ in range(3):
+            jobs.claim('crashed')
+        Job.objects.exclude(pk=fresh.pk).update(locked_at=timezone.now() - jobs.STALE_AFTER * 2)
+
+        self.assertEqual(jobs.requeue_stale(), 1)
+        retry.refresh_from_db()
+        self.assertEqual((retry.status, retry.attempts, retry.locked_by), (Job.Status.QUEUED, 1, ''))
+        self.assertIn('crashed', retry.error)
+        self.assertGreater(retry.run_after, timezone.now())
+        spent.refresh_from_db()
+        self.assertEqual((spent.status, spent.attempts), (Job.Status.FAILED, 1))
+        self.assertIsNotNone(spent.finished_at)
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, Job.Status.RUNNING)
+
+        # The retry runs once its backoff is over and is then out of attempts
+        Job.objects.filter(pk=retry.pk).update(run_after=timezone.now())
+        self.assertEqual(jobs.work(burst=True), 1)
+        retry.refresh_from_db()
+        self.assertEqual((retry.status, retry.attempts), (Job.Status.SUCCEEDED, 2))
+        self.assertEqual(self.calls, [{}])
+
+
+class StreamedDashboardTests(TestCase):
+    """demand_list sends the same page, and leaves the same session, streamed or not"""
+
+    def capture(self, query, session_stages, stream):
+        with override_settings(TRACKER_STREAM_DASHBOARD=stream, CACHES=equivalence.HARNESS_CACHES):
+            result, _ = equivalence.capture(views.demand_list, query, session_stages)
+        self.assertNotIn('error', result)
+        return result['html'], result['session']
+
+    def test_streamed_page_and_session_match(self):
+        rng = random.Random(1)
+        for size in (0, 1, 25):
+            with self.subTest(size=size):
+                session_stages = equivalence.build_portfolio(rng, size)
+                for query in ['', *equivalence.portfolio_queries(rng)]:
+                    for stages in (session_stages, {}):
+                        expected = self.capture(query, stages, stream=False)
+                        self.assertEqual(self.capture(query, stages, stream=True), expected, query)
+                Demand.objects.all().delete()
+
+    def test_streamed_page_saves_current_stages(self):
+        demand = Demand.objects.create(**demand_data('Mini'))
+        for stage, start, end in [
+            (Stage.DEMAND_INITIATED, date(2025, 1, 6), date(2025, 1, 31)),
+            (Stage.DEMAND_APPROVED, date(2025, 2, 3), date(2025, 2, 28)),
+            ('mini_progress', date(2025, 1, 6), date(2025, 3, 31)),
+        ]:
+            DemandStagePeriod.objects.create(demand=demand, stage=stage, start_date=start, end_date=end)
+        with override_settings(TRACKER_STREAM_DASHBOARD=True):
+            response = self.client.get(reverse('demand_list'))
+            b''.join(response.streaming_content)
+        self.assertEqual(self.client.session['demand_current_stages'], {str(demand.id): Stage.DEMAND_APPROVED})
+
+
+class BulkActionTests(TestCase):
+    """trackerapp.bulk actions keep the stage history's derived tables and events current"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gem = Demand.objects.create(**demand_data('Gem'))
+        add_periods(cls.gem, Stage.DEMAND_INITIATED, Stage.DEMAND_APPROVED)
+        add_weeks(cls.gem, Stage.DEMAND_INITIATED, Stage.DEMAND_INITIATED, Stage.DEMAND_APPROVED)
+        cls.cash = Demand.objects.create(**demand_data('Cash', file_type='CASH', file_subtype='Project', file_detail='MTR 21'))
+        add_periods(cls.cash, Stage.DEMAND_INITIATED)
+        add_weeks(cls.cash, Stage.DEMAND_INITIATED, Stage.DEMAND_INITIATED)
+        cls.new = Demand.objects.create(**demand_data('New'))
+
+    def setUp(self):
+        rebuilt_data()
+        self.last_event = ChangeEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    def events(self):
+        return list(ChangeEvent.objects.filter(id__gt=self.last_event).values_list('kind', 'demand_id'))
+
+    def assertDerivedDataCurrent(self):
+        jobs.work(burst=True)
+        self.assertEqual(derived_data(), rebuilt_data())
+
+    def test_advance_stage(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            result = bulk.advance_stage([self.gem.id, self.cash.id, self.new.id], date(2025, 3, 3), date(2025, 3, 14))
+
+        stage_for_number = {number: stage for stage, number in STAGE_ORDER.items()}
+        self.assertEqual(result.stages, {
+            self.gem.id: stage_for_number[STAGE_ORDER[Stage.DEMAND_APPROVED] + 1],
+            self.cash.id: stage_for_number[STAGE_ORDER[Stage.DEMAND_INITIATED] + 1],
+            self.new.id: stage_for_number[0],
+        })
+        for demand_id, stage in result.stages.items():
+            period = DemandStagePeriod.objects.get(demand_id=demand_id, stage=stage)
+            self.assertEqual((period.start_date, period.end_date), (date(2025, 3, 3), date(2025, 3, 14)))
+            self.assertTrue(DemandStagePeriod.objects.filter(demand_id=demand_id, stage='mini_progress').exists())
+        self.assertEqual(StageTransition.objects.filter(demand=self.new).latest('id').stage, stage_for_number[0])
+        self.assertIn((ChangeEvent.Kind.STAGE_SAVED, self.new.id), self.events())
+        self.assertDerivedDataCurrent()
+
+    def test_set_file_type(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            result = bulk.set_file_type([self.gem.id, self.cash.id], file_type='LPC', file_subtype='Build up')
+
+        self.assertEqual((result.changed, result.errors), ([self.gem.id, self.cash.id], {}))
+        self.assertEqual(
+            sorted(Demand.objects.filter(id__in=result.changed).values_list('file_type', 'file_subtype', 'file_detail')),
+            [('LPC', 'Build up', None)] * 2,
+        )
+        self.assertEqual(WeeklyRollup.objects.exclude(file_type='LPC').count(), 0)
+        self.assertDerivedDataCurrent()
+
+    def test_set_file_type_follows_the_file_detail_rule(self):
+        result = bulk.set_file_type([self.gem.id, self.cash.id], file_subtype='Project')
+        self.assertEqual(result.changed, [self.cash.id])
+        self.assertEqual(result.errors, {self.gem.id: 'File Detail is required when File Subtype is Project.'})
+
+    def test_delete_demands(self):
+        missing = self.new.id + 100
+        with self.captureOnCommitCallbacks(execute=True):
+            result = bulk.delete_demands([self.gem.id, self.cash.id, missing])
+
+        self.assertEqual((result.changed, result.errors), ([self.gem.id, self.cash.id], {missing: 'Demand not found.'}))
+        self.assertEqual(list(Demand.objects.all()), [self.new])
+        for model in (DemandStagePeriod, WeeklyUpdate, StageTransition):
+            self.assertFalse(model.objects.exclude(demand=self.new).exists(), model.__name__)
+        # One event per demand rather than one per deleted row
+        self.assertEqual(sorted(self.events()), [
+            (ChangeEvent.Kind.DEMAND_DELETED, self.gem.id), (ChangeEvent.Kind.DEMAND_DELETED, self.cash.id),
+        ])
+        self.assertEqual(WeeklyRollup.objects.count(), 0)
+        self.assertDerivedDataCurrent()
+        self.assertEqual(StageDurationStat.objects.count(), 0)
+
+
+class StageTransitionTests(TestCase):
+    """The stage transition log and the point-in-time snapshots read from it"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.demand = Demand.objects.create(**demand_data('Logged'))
+        add_weeks(cls.demand, Stage.DEMAND_INITIATED, Stage.DEMAND_INITIATED, Stage.DEMAND_APPROVED)
+        cls.quiet = Demand.objects.create(**demand_data('Quiet'))
+
+    def stages_on(self, on_date):
+        return dict(Demand.objects.with_stage_on(on_date).values_list('name', 'stage_on_date'))
+
+    def test_writes_log_stage_changes(self):
+        self.assertEqual(
+            list(self.demand.stage_transitions.order_by('id').values_list('from_stage', 'stage', 'effective_date')),
+            [(None, Stage.DEMAND_INITIATED, date(2025, 1, 6)), (Stage.DEMAND_INITIATED, Stage.DEMAND_APPROVED, date(2025, 1, 20))],
+        )
+
+    def test_with_stage_on(self):
+        self.assertEqual(self.stages_on(date(2025, 1, 5)), {'Logged': None, 'Quiet': None})
+        self.assertEqual(self.stages_on(date(2025, 1, 19))['Logged'], Stage.DEMAND_INITIATED)
+        self.assertEqual(self.stages_on(date(2025, 1, 20))['Logged'], Stage.DEMAND_APPROVED)
+        self.assertEqual(
+            list(StageTransition.objects.as_of(date(2025, 1, 19)).values_list('demand__name', 'stage')),
+            [('Logged', Stage.DEMAND_INITIATED)],
+        )
+
+    def test_reverts_keep_earlier_snapshots(self):
+        self.demand.weekly_updates.get(week_number=3).delete()
+        # The revert can't take effect before the transition it retracts
+        self.assertEqual(self.stages_on(date(2025, 1, 20))['Logged'], Stage.DEMAND_INITIATED)
+        self.assertEqual(self.stages_on(date(2025, 1, 19))['Logged'], Stage.DEMAND_INITIATED)
+        self.assertEqual(self.demand.stage_transitions.count(), 3)
+
+    def test_portfolio_snapshot(self):
+        response = self.client.get(reverse('portfolio_snapshot'), {'date': '2025-01-20'})
+        self.assertEqual(response.json()['demands'], [
+            {
+                'demand_id': self.demand.id, 'demand_name': 'Logged', 'file_type': 'GEM',
+                'stage': Stage.DEMAND_APPROVED, 'stage_number': STAGE_ORDER[Stage.DEMAND_APPROVED],
+            },
+            {'demand_id': self.quiet.id, 'demand_name': 'Quiet', 'file_type': 'GEM', 'stage': None, 'stage_number': None},
+        ])
+        self.assertEqual(self.client.get(reverse('portfolio_snapshot'), {'date': '20 Jan'}).status_code, 400)
+
+
+class DerivedDataTests(TestCase):
+    """Saves and deletes keep the weekly rollups and stage duration stats equal to a rebuild"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.other = Demand.objects.create(**demand_data('Other', file_type='CASH'))
+        add_periods(cls.other, Stage.DEMAND_INITIATED, Stage.DEMAND_APPROVED)
+        add_weeks(cls.other, Stage.DEMAND_INITIATED, Stage.DEMAND_APPROVED)
+
+    def setUp(self):
+        rebuilt_data()
+
+    def write(self, func, *args):
+        with self.captureOnCommitCallbacks(execute=True):
+            func(*args)
+        jobs.work(burst=True)
+
+    def history(self, name, weeks=3):
+        demand = Demand.objects.create(**demand_data(name))
+        add_periods(demand, Stage.DEMAND_INITIATED, Stage.DEMAND_APPROVED)
+        add_weeks(demand, *[Stage.DEMAND_INITIATED] * (weeks - 1), Stage.DEMAND_APPROVED)
+        return demand
+
+    def assertDerivedDataCurrent(self):
+        current = derived_data()
+        self.assertEqual(current, rebuilt_data())
+        return current
+
+    def test_saves(self):
+        self.write(self.history, 'Saved')
+        rollups, stats = self.assertDerivedDataCurrent()
+        self.assertIn((date(2025, 1, 6), 'GEM', Stage.DEMAND_INITIATED), [row[:3] for row in rollups])
+        self.assertIn(('GEM', 'Build up', Stage.DEMAND_INITIATED), [row[:3] for row in stats])
+
+    def test_moved_weekly_update_refreshes_both_weeks(self):
+        demand = self.history('Moved')
+        rebuilt_data()
+        update = demand.weekly_updates.get(week_number=3)
+        update.week_start_date += timedelta(weeks=4)
+        update.week_end_date += timedelta(weeks=4)
+        update.current_stage = Stage.DEMAND_INITIATED
+        self.write(update.save)
+        self.assertDerivedDataCurrent()
+
+    def test_file_type_change_moves_stats_group(self):
+        demand = self.history('Regrouped')
+        rebuilt_data()
+        demand.file_type = 'LPC'
+        self.write(demand.save)
+        rollups, stats = self.assertDerivedDataCurrent()
+        self.assertNotIn('GEM', {row[1] for row in rollups})
+        self.assertIn(('LPC', 'Build up', Stage.DEMAND_APPROVED), [row[:3] for row in stats])
+
+    def test_deletes(self):
+        demand = self.history('Pruned')
+        rebuilt_data()
+        self.write(demand.weekly_updates.get(week_number=3).delete)
+        self.assertDerivedDataCurrent()
+        self.write(demand.stages.get(stage=Stage.DEMAND_APPROVED).delete)
+        self.assertDerivedDataCurrent()
+
+    def test_cascade_delete(self):
+        short, long = self.history('Short', weeks=2), self.history('Long', weeks=12)
+        rebuilt_data()
+        queries = []
+        for demand in (short, long):
+            with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as captured:
+                demand.delete()
+            queries.append(len(captured))
+            jobs.work(burst=True)
+            self.assertDerivedDataCurrent()
+        # The demand's history is refreshed once, not once per deleted row
+        self.assertEqual(queries[0], queries[1])
+
+
+class AsyncViewTests(TestCase):
+    """trackerapp.async_views answer exactly as their namesakes in trackerapp.views"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.demand = Demand.objects.create(**demand_data('Async'))
+        add_periods(cls.demand, Stage.DEMAND_INITIATED, Stage.DEMAND_APPROVED)
+        add_weeks(cls.demand, Stage.DEMAND_INITIATED, Stage.DEMAND_APPROVED)
+        WeeklyUpdate.objects.filter(week_number=2).update(challenges='Vendor delay', achievements='Spec signed')
+        Demand.objects.create(**demand_data('Other', file_type='CASH'))
+        rebuilt_data()
+
+    def assertSameResponse(self, name, request, *args):
+        expected = getattr(views, name)(request, *args)
+        actual = async_to_sync(getattr(async_views, name))(request, *args)
+        self.assertEqual(
+            (actual.status_code, json.loads(actual.content)), (expected.status_code, json.loads(expected.content)), name,
+        )
+
+    def test_get_endpoints(self):
+        factory = RequestFactory()
+        update_id = self.demand.weekly_updates.get(week_number=2).id
+        cases = [
+            ('portfolio_snapshot', {}),
+            ('portfolio_snapshot', {'date': '2025-01-13'}),
+            ('portfolio_snapshot', {'date': 'not a date'}),
+            ('trends_data', {}),
+            ('trends_data', {'file_type': 'CASH'}),
+            ('portfolio_forecast_data', {}),
+            ('portfolio_forecast_data', {'file_type': 'GEM'}),
+        ]
+        for name, query in cases:
+            with self.subTest(name, **query):
+                self.assertSameResponse(name, factory.get('/', query))
+        self.assertSameResponse('weekly_update_text', factory.get('/'), update_id)
+        self.assertSameResponse('debug_demand_stages', factory.get('/'), self.demand.id)
+
+    def test_post_endpoints(self):
+        factory = RequestFactory()
+        ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        demand_id = str(self.demand.id)
+        cases = [
+            ('update_weekly_dates', {'demand_id': demand_id, 'weekly_start_date': '2025-02-03', 'weekly_end_date': '2025-02-09'}),
+            ('update_weekly_dates', {'demand_id': demand_id, 'weekly_start_date': '2025-02-09', 'weekly_end_date': '2025-02-03'}),
+            ('update_weekly_dates', {'demand_id': demand_id, 'weekly_start_date': '3 Feb', 'weekly_end_date': '9 Feb'}),
+            ('update_weekly_dates', {'demand_id': '0', 'weekly_start_date': '2025-02-03', 'weekly_end_date': '2025-02-09'}),
+            ('update_weekly_stage', {'demand_id': demand_id, 'weekly_update_stage': Stage.DEMAND_APPROVED}),
+            ('update_weekly_stage', {'demand_id': demand_id}),
+            ('update_weekly_progress', {'demand_id': demand_id, 'weekly_update_progress': '40'}),
+            ('update_weekly_challenge', {'demand_id': '', 'weekly_update_challenge': 'Late'}),
+        ]
+        for name, data in cases:
+            with self.subTest(name, **data):
+                self.assertSameResponse(name, factory.post('/', data, **ajax))
+        for name in ('update_weekly_dates', 'update_weekly_stage', 'update_weekly_progress', 'update_weekly_challenge'):
+            with self.subTest(name, method='GET'):
+                self.assertSameResponse(name, factory.get('/'))
+        self.demand.refresh_from_db()
+        self.assertEqual((self.demand.weekly_start_date, self.demand.weekly_end_date), (date(2025, 2, 3), date(2025, 2, 9)))
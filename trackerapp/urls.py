@@ -1,26 +1,51 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, views
+
+# Under ASGI, serve the JSON endpoints from their async ORM versions
+if settings.TRACKER_ASYNC_VIEWS:
+    from . import async_views as json_views
+else:
+    json_views = views
 
 urlpatterns = [
     path('', views.demand_list, name='demand_list'),
     path('add/', views.add_demand, name='add_demand'),
     path('edit/<int:demand_id>/', views.edit_demand, name='edit_demand'),
     path('delete/<int:demand_id>/', views.delete_demand, name='delete_demand'),
+    path('bulk/', views.bulk_demand_action, name='bulk_demand_action'),
     path('update_stage/', views.update_stage, name='update_stage'),
     path('edit_stage_dates/', views.edit_stage_dates, name='edit_stage_dates'),
-    path('update_weekly_dates/', views.update_weekly_dates, name='update_weekly_dates'),
-    path('update_weekly_stage/', views.update_weekly_stage, name='update_weekly_stage'),
-    path('update_weekly_progress/', views.update_weekly_progress, name='update_weekly_progress'),
-    path('update_weekly_challenge/', views.update_weekly_challenge, name='update_weekly_challenge'),
+    path('update_weekly_dates/', json_views.update_weekly_dates, name='update_weekly_dates'),
+    path('update_weekly_stage/', json_views.update_weekly_stage, name='update_weekly_stage'),
+    path('update_weekly_progress/', json_views.update_weekly_progress, name='update_weekly_progress'),
+    path('update_weekly_challenge/', json_views.update_weekly_challenge, name='update_weekly_challenge'),
     
     # Weekly Update URLs
     path('demand/<int:demand_id>/weekly/add/', views.add_weekly_update, name='add_weekly_update'),
     path('demand/<int:demand_id>/weekly/history/', views.weekly_history, name='weekly_history'),
     path('weekly/<int:update_id>/edit/', views.edit_weekly_update, name='edit_weekly_update'),
     path('weekly/<int:update_id>/delete/', views.delete_weekly_update, name='delete_weekly_update'),
+    path('weekly/<int:update_id>/text/', json_views.weekly_update_text, name='weekly_update_text'),
     path('weekly/summary/', views.weekly_summary, name='weekly_summary'),
+    path('weekly/changes/', views.weekly_changes, name='weekly_changes'),
+    path('portfolio/snapshot/', json_views.portfolio_snapshot, name='portfolio_snapshot'),
+    path('trends/', views.trends, name='trends'),
+    path('trends/data/', json_views.trends_data, name='trends_data'),
+    path('forecast/', views.portfolio_forecast, name='portfolio_forecast'),
+    path('forecast/data/', json_views.portfolio_forecast_data, name='portfolio_forecast_data'),
+    path('events/', views.demand_events, name='demand_events'),
+    path('jobs/', views.job_status, name='job_status'),
+    path('jobs/enqueue/', views.enqueue_job, name='enqueue_job'),
+    path('jobs/<int:job_id>/', views.job_detail, name='job_detail'),
+    path('archive/', views.archived_demands, name='archived_demands'),
+    path('archive/<int:demand_id>/restore/', views.restore_demand, name='restore_demand'),
+
+    # JSON API (trackerapp.api); <resource> is demands, stages or weekly-updates
+    path('api/<str:resource>/', api.collection, name='api_collection'),
+    path('api/<str:resource>/<int:pk>/', api.item, name='api_item'),
     
     # Debug URL
-    path('debug/demand/<int:demand_id>/stages/', views.debug_demand_stages, name='debug_demand_stages'),
+    path('debug/demand/<int:demand_id>/stages/', json_views.debug_demand_stages, name='debug_demand_stages'),
 ]
 
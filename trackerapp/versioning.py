@@ -0,0 +1,53 @@
+"""Cache version counters bumped on tracker writes
+
+Derived data cached under a key that includes a version (API ETags, the gantt SVGs,
+the forecast and report caches) is invalidated by bumping the counter. The counters
+live in the default cache, so every process serving the app must share it; the
+trackerapp.E001/E002 system checks (trackerapp.checks) refuse backends that don't.
+"""
+from django.core.cache import cache
+
+DATA_VERSION_KEY = 'trackerapp:data_version'
+
+
+def _version(key):
+    version = cache.get(key)
+    if version is None:
+        version = 1
+        cache.add(key, version, timeout=None)
+    return version
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Key missing (first write or evicted); any fresh value invalidates old entries
+        cache.set(key, 2, timeout=None)
+
+
+def data_version():
+    """Counter bumped on every tracker write; include it in cache keys for derived data"""
+    return _version(DATA_VERSION_KEY)
+
+
+def bump_data_version():
+    _bump(DATA_VERSION_KEY)
+
+
+def demand_version(demand_id):
+    """Counter bumped on writes to one demand, its stage periods or its weekly updates"""
+    return _version(f'{DATA_VERSION_KEY}:demand:{demand_id}')
+
+
+def bump_demand_version(demand_id):
+    _bump(f'{DATA_VERSION_KEY}:demand:{demand_id}')
+
+
+def stats_version():
+    """Counter bumped when stage duration stats are recomputed (trackerapp.forecast)"""
+    return _version(f'{DATA_VERSION_KEY}:stats')
+
+
+def bump_stats_version():
+    _bump(f'{DATA_VERSION_KEY}:stats')
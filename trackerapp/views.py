@@ -1,15 +1,42 @@
+import re
+from itertools import chain, islice
+from tempfile import SpooledTemporaryFile
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import get_template, render_to_string
 from django.urls import reverse
 from django.contrib import messages
-from django.http import JsonResponse
-from .models import Demand, STAGE_COLORS, DemandStagePeriod, Stage, STAGE_ORDER, WeeklyUpdate
+from django.core.paginator import Paginator
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from .models import Demand, DemandStagePeriod, Job, Stage, WeeklyRollup, WeeklyUpdate
 from .forms import DemandForm, DemandStagePeriodForm, WeeklyUpdateForm
+from . import archive, bulk, events, forecast, gantt, jobs, reports
+from .rows import DemandPosition, DetailBox, StageBar, empty_detail_box
+from .stages import get_stage_catalog
 from datetime import datetime, date
 from dateutil.relativedelta import relativedelta
 from django.db import models
 
+# Demands per query and per template pass when the dashboard streams its rows
+STREAM_CHUNK_SIZE = 50
+# Rendered rows for the file type tabs are kept in memory up to this many characters,
+# then spooled to disk until their tab is sent
+STREAM_SPOOL_SIZE = 4 * 1024 * 1024
+STREAM_SPOOL_READ = 64 * 1024
+STREAM_MARKER = re.compile(r'<!-- stream:(\w+) -->')
+
+
 def demand_list(request):
-    demands = Demand.objects.all().prefetch_related('stages')
+    catalog = get_stage_catalog()
+    # Archived demands (trackerapp.archive) are listed on archived_demands instead
+    # Stage periods in id (creation) order: bars that start on the same day are drawn in that
+    # order, whichever index the planner picks for the prefetch
+    demands = Demand.objects.active().prefetch_related(
+        models.Prefetch('stages', queryset=DemandStagePeriod.objects.order_by('id'))
+    )
     
     # If there are no demands, return early with empty context
     if not demands.exists():
@@ -18,36 +45,147 @@ def demand_list(request):
             'stage_legend': []
         })
     
+    global_timeline_start, global_timeline_end = _global_timeline(demands)
+    global_timeline_days = (global_timeline_end - global_timeline_start).days + 1
+
+    # ?demand=<id> renders only that demand's rows against the full timeline; the
+    # dashboard fetches this to patch a single row when a change event arrives.
+    # ?file_type=<type> likewise limits the rows to one file type.
+    row_demand_id = request.GET.get('demand')
+    row_file_type = request.GET.get('file_type')
+    if row_demand_id:
+        demands = demands.filter(id=row_demand_id) if row_demand_id.isdigit() else demands.none()
+    if row_file_type:
+        demands = demands.filter(file_type=row_file_type)
+
+    # === Demand and Stage Bars ===
+    rows = (
+        _demand_row(request, demand, catalog, global_timeline_start, global_timeline_days)
+        # id order, as an unfiltered scan returns them; the file_type filter would otherwise
+        # come back in demand_file_type_name_idx order
+        for demand in demands.order_by('id').iterator(chunk_size=STREAM_CHUNK_SIZE)
+    )
+
+    # === Stage Legend ===
+    # Entries for ALL possible stages, in order
+    stage_legend = catalog.legend
+
+    # === File Type Summary ===
+    file_type_summary = []
+    file_types = ['CASH', 'GEM', 'LPC']  # Order as requested
+    
+    for file_type in file_types:
+        count = Demand.objects.active().filter(file_type=file_type).count()
+        file_type_summary.append({
+            'type': file_type,
+            'count': count
+        })
+
+    context = {
+        'stage_legend': stage_legend,
+        **_timeline_markers(global_timeline_start, global_timeline_end),
+        'file_type_summary': file_type_summary,
+    }
+    if settings.TRACKER_STREAM_DASHBOARD:
+        # The session is saved with the response headers, before any row is rendered, so
+        # the current stages the mini progress bars would remember are saved up front
+        remembered = request.session.get('demand_current_stages', {})
+        for demand in demands.filter(stages__stage='mini_progress').exclude(id__in=[
+            int(demand_id) for demand_id in remembered if demand_id.isdigit()
+        ]).distinct().prefetch_related(None).only('id'):
+            _remember_current_stage(request, demand)
+        content = _stream_demand_list(request, context, rows)
+        if isinstance(request, ASGIRequest):
+            content = _async_chunks(content)
+        return StreamingHttpResponse(content)
+
+    return render(request, 'trackerapp/demand_list.html', {
+        'demand_data': [row for row in rows if row],
+        **context,
+    })
+
+
+def _stream_demand_list(request, context, rows):
+    """Yield the dashboard page, sending the header, legend and timeline before any rows
+
+    The page is rendered once with each table of rows replaced by a marker, then the
+    rows are rendered STREAM_CHUNK_SIZE demands at a time. The All tab's rows go out as
+    they are rendered; the file type tabs come later in the page, so their rows are
+    spooled to temporary files until then. The rows must not change the session, as
+    it is saved with the response headers; demand_list stores the current stages they
+    read before streaming starts.
+    """
+    rows = (row for row in rows if row)
+    first_row = next(rows, None)
+    if first_row is None:
+        # Every demand was skipped; the page shows its "no demands" message instead of the tabs
+        yield render_to_string('trackerapp/demand_list.html', {**context, 'demand_data': []}, request)
+        return
+    rows = chain([first_row], rows)
+
+    parts = STREAM_MARKER.split(render_to_string('trackerapp/demand_list.html', {**context, 'stream': True}, request))
+    # parts: page text, 'all', page text, then a file type and the page text after it for each tab
+    yield parts[0]
+
+    all_rows = get_template('trackerapp/demand_rows.html')
+    file_type_rows = get_template('trackerapp/demand_rows_file_type.html')
+    file_types = parts[3::2]
+    spools = {file_type: SpooledTemporaryFile(max_size=STREAM_SPOOL_SIZE, mode='w+') for file_type in file_types}
+    try:
+        while chunk := list(islice(rows, STREAM_CHUNK_SIZE)):
+            yield all_rows.render({'rows': chunk}, request)
+            for file_type, spool in spools.items():
+                spool.write(file_type_rows.render({'rows': chunk, 'file_type': file_type}, request))
+
+        yield parts[2]
+        for file_type, after in zip(file_types, parts[4::2]):
+            spool = spools[file_type]
+            spool.seek(0)
+            while text := spool.read(STREAM_SPOOL_READ):
+                yield text
+            yield after
+    finally:
+        for spool in spools.values():
+            spool.close()
+
+
+async def _async_chunks(chunks):
+    # ASGI reads a sync iterator to the end before sending anything; step through it
+    # in a worker thread instead so each chunk goes out as soon as it is rendered
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await next_chunk(chunks, None)) is not None:
+        yield chunk
+
+
+def _global_timeline(demands):
+    """(start, end) of the dashboard timeline: whole years covering every demand and stage period
+
+    Reads the bounds with aggregates rather than loading every demand's stages, so the
+    streaming dashboard can send its header before touching the rows.
+    """
     # Find the earliest start date and latest end date across all demands to determine the global timeline
-    earliest_start_date = None
+    earliest_start_date = demands.aggregate(earliest=models.Min('start_date'))['earliest']
     latest_end_date = None
-    
-    for demand in demands:
-        # Check demand start date
-        if demand.start_date:
-            if earliest_start_date is None or demand.start_date < earliest_start_date:
-                earliest_start_date = demand.start_date
-            
-            # Calculate end date based on duration_months if available
-            if demand.duration_months:
-                demand_end = demand.get_end_date()
-                if demand_end and (latest_end_date is None or demand_end > latest_end_date):
-                    latest_end_date = demand_end
-        
-        # Check all stage dates for this demand
-        stages = list(demand.stages.all())
-        if stages:
-            stage_start_dates = [s.start_date for s in stages]
-            stage_end_dates = [s.end_date for s in stages]
-            
-            min_stage_date = min(stage_start_dates) if stage_start_dates else None
-            max_stage_date = max(stage_end_dates) if stage_end_dates else None
-            
-            if min_stage_date and (earliest_start_date is None or min_stage_date < earliest_start_date):
-                earliest_start_date = min_stage_date
-            
-            if max_stage_date and (latest_end_date is None or max_stage_date > latest_end_date):
-                latest_end_date = max_stage_date
+
+    # Calculate end dates based on duration_months where available
+    end_inputs = demands.prefetch_related(None).filter(start_date__isnull=False).values_list('start_date', 'duration_months')
+    for start_date, duration_months in end_inputs.iterator():
+        demand_end = Demand(start_date=start_date, duration_months=duration_months).get_end_date()
+        if demand_end and (latest_end_date is None or demand_end > latest_end_date):
+            latest_end_date = demand_end
+
+    # Check all stage dates
+    stage_dates = DemandStagePeriod.objects.filter(demand__in=demands).aggregate(
+        min_stage_date=models.Min('start_date'), max_stage_date=models.Max('end_date'),
+    )
+    min_stage_date = stage_dates['min_stage_date']
+    max_stage_date = stage_dates['max_stage_date']
+
+    if min_stage_date and (earliest_start_date is None or min_stage_date < earliest_start_date):
+        earliest_start_date = min_stage_date
+
+    if max_stage_date and (latest_end_date is None or max_stage_date > latest_end_date):
+        latest_end_date = max_stage_date
     
     # Default values if no dates found
     if earliest_start_date is None:
@@ -62,10 +200,11 @@ def demand_list(request):
     # Add a buffer at the end for better visualization (extend to the end of the year)
     global_timeline_end = latest_end_date.replace(month=12, day=31)
     
-    # Use exact timeline based on demand durations without minimum years constraint
-    # Just ensure we always show complete years by adjusting to year boundaries
-    # No minimum timeline span enforced - shows exactly what's needed by demands
-    
+    return global_timeline_start, global_timeline_end
+
+
+def _timeline_markers(global_timeline_start, global_timeline_end):
+    """Quarter, year and month markers for the dashboard's timeline header"""
     # Calculate the total duration in days for the global timeline
     global_timeline_days = (global_timeline_end - global_timeline_start).days + 1
     
@@ -120,504 +259,424 @@ def demand_list(request):
             'position': position_percent
         })
         current_date += relativedelta(months=1)
-    
-    # === Demand and Stage Bars ===
-    demand_data = []
-    
+
+    return {
+        'timeline_markers': quarter_markers,
+        'month_markers': month_markers,
+        'timeline_years': timeline_years,
+        'global_timeline_start': global_timeline_start.strftime('%Y-%m-%d'),
+        'global_timeline_end': global_timeline_end.strftime('%Y-%m-%d'),
+    }
+
+
+def _remember_current_stage(request, demand):
+    """The demand's most recent stage period's stage, saved in the session for the mini progress bar
+
+    Returns None, and saves nothing, when the demand has no periods besides mini_progress.
+    """
+    # Get the highest stage number for this demand
+    demand_stages = demand.stages.exclude(stage='mini_progress').order_by('-start_date')
+    latest_stage = demand_stages.first()
+    if latest_stage is None:
+        return None
+
+    # Update session for future requests
+    demand_current_stages = request.session.get('demand_current_stages', {})
+    demand_current_stages[str(demand.id)] = latest_stage.stage
+    request.session['demand_current_stages'] = demand_current_stages
+    request.session.modified = True
+    return latest_stage.stage
+
+
+def _demand_row(request, demand, catalog, global_timeline_start, global_timeline_days):
+    """One dashboard row: the demand's stage bars, detail boxes and latest weekly update
+
+    Returns None for demands with no dates to place on the timeline.
+    """
     # Get current stages from session if available
     demand_current_stages = request.session.get('demand_current_stages', {})
-    for demand in demands:
-        stages = list(demand.stages.all())
-        stage_bars = []
-        
-        # Determine demand start and end dates
-        demand_start = demand.start_date
-        demand_end = demand.get_end_date() if demand_start and demand.duration_months else None
-        
-        # If demand doesn't have dates but has stages, use stage dates
-        if (not demand_start or not demand_end) and stages:
-            all_dates = [s.start_date for s in stages] + [s.end_date for s in stages]
-            if all_dates:  # Check if list is not empty
-                demand_start = min(all_dates)
-                demand_end = max(all_dates)
-        
-        # Skip if we still don't have valid dates
-        if not demand_start or not demand_end:
+
+    stages = list(demand.stages.all())
+    stage_bars = []
+
+    # Determine demand start and end dates
+    demand_start = demand.start_date
+    demand_end = demand.get_end_date() if demand_start and demand.duration_months else None
+
+    # If demand doesn't have dates but has stages, use stage dates
+    if (not demand_start or not demand_end) and stages:
+        all_dates = [s.start_date for s in stages] + [s.end_date for s in stages]
+        if all_dates:  # Check if list is not empty
+            demand_start = min(all_dates)
+            demand_end = max(all_dates)
+
+    # Skip if we still don't have valid dates
+    if not demand_start or not demand_end:
+        return None
+
+    # Calculate demand duration in global timeline
+    demand_duration_days = (demand_end - demand_start).days + 1
+    demand_start_offset = (demand_start - global_timeline_start).days
+    demand_start_percent = max(0, (demand_start_offset / global_timeline_days) * 100)
+    # Apply a scaling factor to make progress bars shorter
+    scaling_factor = 0.8  # Reduce width by 20%
+    demand_width_percent = max(0.5, (demand_duration_days / global_timeline_days) * 100 * scaling_factor)
+
+    for s in stages:
+        if not (s.start_date and s.end_date):
             continue
-            
-        # Calculate demand duration in global timeline
-        demand_duration_days = (demand_end - demand_start).days + 1
-        demand_start_offset = (demand_start - global_timeline_start).days
-        demand_start_percent = max(0, (demand_start_offset / global_timeline_days) * 100)
-        # Apply a scaling factor to make progress bars shorter
-        scaling_factor = 0.8  # Reduce width by 20%
-        demand_width_percent = max(0.5, (demand_duration_days / global_timeline_days) * 100 * scaling_factor)
-        
-        for s in stages:
-            if not (s.start_date and s.end_date):
-                continue
-                
-            # Calculate stage position relative to the demand's timeline
-            # Check if there are multiple weekly updates for this stage
-            weekly_updates_for_stage = demand.weekly_updates.filter(current_stage=s.stage).order_by('week_start_date')
-            
-            if weekly_updates_for_stage.count() > 1:
-                # Multiple weekly updates exist for this stage - calculate total duration
-                earliest_start = min(update.week_start_date for update in weekly_updates_for_stage)
-                latest_end = max(update.week_end_date for update in weekly_updates_for_stage)
-                stage_duration = (latest_end - earliest_start).days + 1
-            else:
-                # Single weekly update or no weekly updates - use the stage object duration
-                stage_duration = (s.end_date - s.start_date).days + 1
-            
-            # Calculate stage position relative to its demand's timeline (not global timeline)
-            stage_start_offset = (s.start_date - demand_start).days
-            stage_relative_start = (stage_start_offset / demand_duration_days) * 100
-            stage_relative_width = (stage_duration / demand_duration_days) * 100
-            
-            # Convert relative position within demand to position within the container
-            # This ensures the stage bar appears inside the demand timeline
-            stage_start_percent = demand_start_percent + (demand_width_percent * stage_relative_start / 100)
-            stage_width_percent = demand_width_percent * stage_relative_width / 100
-            
-            # For mini progress bars, use the full demand timeline instead of stage timeline
-            if s.stage == 'mini_progress':
-                # Use demand start and end dates for the full timeline
-                start_year = demand_start.year
-                start_month = demand_start.month
-                start_day = demand_start.day
-                
-                end_year = demand_end.year
-                end_month = demand_end.month
-                end_day = demand_end.day
-            else:
-                # Use stage start and end dates for regular stages
-                start_year = s.start_date.year
-                start_month = s.start_date.month
-                start_day = s.start_date.day
-                
-                end_year = s.end_date.year
-                end_month = s.end_date.month
-                end_day = s.end_date.day
-            
-            # Calculate month-based positions (more precise than quarters)
-            # For each year, add 20% to the position
-            # For each month, add 1.667% to the position
-            year_diff_start = start_year - 2025
-            month_position_start = (start_month - 1) * (20/12)  # Each month is 1/12 of a year's 20%
-            # Add partial month based on day (optional for more precision)
-            day_position_start = (start_day - 1) * (20/12/30)  # Approximate days in month
-            
-            year_diff_end = end_year - 2025
-            month_position_end = (end_month - 1) * (20/12)
-            # Add partial month based on day (optional for more precision)
-            day_position_end = (end_day - 1) * (20/12/30)  # Approximate days in month
-            
-            # Final positions as percentages
-            start_pos = (year_diff_start * 20) + month_position_start + day_position_start
-            end_pos = (year_diff_end * 20) + month_position_end + day_position_end
-            
-            # Calculate width precisely based on actual start and end positions
-            width = end_pos - start_pos
-            
-            # For mini progress bars, ensure they have a reasonable width
-            if s.stage == 'mini_progress':
-                # Calculate width based on demand duration in months
-                demand_duration_months = demand.duration_months or 1
-                # Each month should be at least 1% of the timeline width
-                min_width_based_on_duration = max(2.0, demand_duration_months * 1.0)
-                
-                if width < min_width_based_on_duration:
-                    # Expand the width to minimum while keeping it centered
-                    center_pos = (start_pos + end_pos) / 2
-                    start_pos = center_pos - (min_width_based_on_duration / 2)
-                    end_pos = center_pos + (min_width_based_on_duration / 2)
-                    width = min_width_based_on_duration
+
+        # Calculate stage position relative to the demand's timeline
+        # Check if there are multiple weekly updates for this stage
+        weekly_updates_for_stage = demand.weekly_updates.filter(current_stage=s.stage).order_by('week_start_date')
+
+        if weekly_updates_for_stage.count() > 1:
+            # Multiple weekly updates exist for this stage - calculate total duration
+            earliest_start = min(update.week_start_date for update in weekly_updates_for_stage)
+            latest_end = max(update.week_end_date for update in weekly_updates_for_stage)
+            stage_duration = (latest_end - earliest_start).days + 1
+        else:
+            # Single weekly update or no weekly updates - use the stage object duration
+            stage_duration = (s.end_date - s.start_date).days + 1
+
+        # Calculate stage position relative to its demand's timeline (not global timeline)
+        stage_start_offset = (s.start_date - demand_start).days
+        stage_relative_start = (stage_start_offset / demand_duration_days) * 100
+        stage_relative_width = (stage_duration / demand_duration_days) * 100
+
+        # Convert relative position within demand to position within the container
+        # This ensures the stage bar appears inside the demand timeline
+        stage_start_percent = demand_start_percent + (demand_width_percent * stage_relative_start / 100)
+        stage_width_percent = demand_width_percent * stage_relative_width / 100
+
+        # For mini progress bars, use the full demand timeline instead of stage timeline
+        if s.stage == 'mini_progress':
+            # Use demand start and end dates for the full timeline
+            span_start, span_end = demand_start, demand_end
+            start_year = demand_start.year
+            start_month = demand_start.month
+            start_day = demand_start.day
+
+            end_year = demand_end.year
+            end_month = demand_end.month
+            end_day = demand_end.day
+        else:
+            # Use stage start and end dates for regular stages
+            span_start, span_end = s.start_date, s.end_date
+            start_year = s.start_date.year
+            start_month = s.start_date.month
+            start_day = s.start_date.day
+
+            end_year = s.end_date.year
+            end_month = s.end_date.month
+            end_day = s.end_date.day
+
+        # Calculate month-based positions (more precise than quarters)
+        # For each year, add 20% to the position
+        # For each month, add 1.667% to the position
+        year_diff_start = start_year - 2025
+        month_position_start = (start_month - 1) * (20/12)  # Each month is 1/12 of a year's 20%
+        # Add partial month based on day (optional for more precision)
+        day_position_start = (start_day - 1) * (20/12/30)  # Approximate days in month
+
+        year_diff_end = end_year - 2025
+        month_position_end = (end_month - 1) * (20/12)
+        # Add partial month based on day (optional for more precision)
+        day_position_end = (end_day - 1) * (20/12/30)  # Approximate days in month
+
+        # Final positions as percentages
+        start_pos = (year_diff_start * 20) + month_position_start + day_position_start
+        end_pos = (year_diff_end * 20) + month_position_end + day_position_end
+
+        # Calculate width precisely based on actual start and end positions
+        width = end_pos - start_pos
+
+        # For mini progress bars, ensure they have a reasonable width
+        if s.stage == 'mini_progress':
+            # Calculate width based on demand duration in months
+            demand_duration_months = demand.duration_months or 1
+            # Each month should be at least 1% of the timeline width
+            min_width_based_on_duration = max(2.0, demand_duration_months * 1.0)
+
+            if width < min_width_based_on_duration:
+                # Expand the width to minimum while keeping it centered
+                center_pos = (start_pos + end_pos) / 2
+                start_pos = center_pos - (min_width_based_on_duration / 2)
+                end_pos = center_pos + (min_width_based_on_duration / 2)
+                width = min_width_based_on_duration
+        else:
+            # For regular stages, ensure minimum width for visibility
+            min_width = 1.0  # 1% of the timeline
+            if width < min_width:
+                # Expand the width to minimum while keeping it centered
+                center_pos = (start_pos + end_pos) / 2
+                start_pos = center_pos - (min_width / 2)
+                end_pos = center_pos + (min_width / 2)
+                width = min_width
+
+        # Handle stage number and label safely based on stage type
+        stage_number = catalog.numbers.get(s.stage, 0)
+        stage_color = catalog.colors.get(s.stage, '#888')
+        should_show_number = True
+
+        # Check if this is our custom mini progress stage
+        if s.stage == 'mini_progress':
+            # Get the current stage for this demand from the session
+            demand_id_str = str(demand.id)
+            current_stage = None
+
+            # First try to get from session
+            if demand_id_str in demand_current_stages:
+                current_stage = demand_current_stages[demand_id_str]
             else:
-                # For regular stages, ensure minimum width for visibility
-                min_width = 1.0  # 1% of the timeline
-                if width < min_width:
-                    # Expand the width to minimum while keeping it centered
-                    center_pos = (start_pos + end_pos) / 2
-                    start_pos = center_pos - (min_width / 2)
-                    end_pos = center_pos + (min_width / 2)
-                    width = min_width
-            
-            # For quarter display in the template, still keep quarter calculations
-            start_quarter = (start_month - 1) // 3
-            end_quarter = (end_month - 1) // 3
-            
-            # Handle stage number and label safely based on stage type
-            stage_number = STAGE_ORDER.get(s.stage, 0)
-            stage_color = STAGE_COLORS.get(s.stage, '#888')
-            should_show_number = True
-            
-            # Check if this is our custom mini progress stage
-            if s.stage == 'mini_progress':
-                # Get the current stage for this demand from the session
-                demand_id_str = str(demand.id)
-                current_stage = None
-                
-                # First try to get from session
-                if demand_id_str in demand_current_stages:
-                    current_stage = demand_current_stages[demand_id_str]
-                else:
-                    # Fallback: derive current stage from database
-                    # Get the highest stage number for this demand
-                    demand_stages = demand.stages.exclude(stage='mini_progress').order_by('-start_date')
-                    if demand_stages.exists():
-                        # Get the most recent stage (highest stage number)
-                        latest_stage = demand_stages.first()
-                        current_stage = latest_stage.stage
-                        
-                        # Update session for future requests
-                        if 'demand_current_stages' not in request.session:
-                            request.session['demand_current_stages'] = {}
-                        demand_current_stages = request.session.get('demand_current_stages', {})
-                        demand_current_stages[demand_id_str] = current_stage
-                        request.session['demand_current_stages'] = demand_current_stages
-                        request.session.modified = True
-                
-                # Check if there's a weekly update with current_stage that should override
-                latest_weekly_update = WeeklyUpdate.objects.filter(demand=demand).order_by('-week_number').first()
-                if latest_weekly_update and latest_weekly_update.current_stage:
-                    current_stage = latest_weekly_update.current_stage
-                
-                if current_stage:
-                    stage_color = STAGE_COLORS.get(current_stage, '#444444')
-                    stage_verbose = Stage(current_stage).label
-                    should_show_number = True
-                    
-                    # Find the current stage's end date to calculate the split point
-                    current_stage_obj = demand.stages.filter(stage=current_stage).first()
-                    if current_stage_obj:
-                        # Check if there are multiple weekly updates for this stage
-                        weekly_updates_for_current_stage = demand.weekly_updates.filter(current_stage=current_stage).order_by('week_start_date')
-                        
-                        if weekly_updates_for_current_stage.exists():
-                            # Use first weekly update start as stage start when any update exists
-                            earliest_start = min(update.week_start_date for update in weekly_updates_for_current_stage)
-                            # End date remains the latest known end for the current stage
-                            if weekly_updates_for_current_stage.count() > 1:
-                                split_date = max(update.week_end_date for update in weekly_updates_for_current_stage)
-                            else:
-                                split_date = current_stage_obj.end_date
-                            current_stage_duration = (split_date - earliest_start).days + 1
+                # Fallback: derive current stage from database
+                current_stage = _remember_current_stage(request, demand)
+
+            # Check if there's a weekly update with current_stage that should override
+            latest_weekly_update = WeeklyUpdate.objects.filter(demand=demand).defer(*WeeklyUpdate.FULL_TEXT_FIELDS).order_by('-week_number').first()
+            if latest_weekly_update and latest_weekly_update.current_stage:
+                current_stage = latest_weekly_update.current_stage
+
+            if current_stage:
+                stage_color = catalog.colors.get(current_stage, '#444444')
+                stage_verbose = catalog.labels[current_stage]
+                should_show_number = True
+
+                # Find the current stage's end date to calculate the split point
+                current_stage_obj = demand.stages.filter(stage=current_stage).first()
+                if current_stage_obj:
+                    # Check if there are multiple weekly updates for this stage
+                    weekly_updates_for_current_stage = demand.weekly_updates.filter(current_stage=current_stage).order_by('week_start_date')
+
+                    if weekly_updates_for_current_stage.exists():
+                        # Use first weekly update start as stage start when any update exists
+                        earliest_start = min(update.week_start_date for update in weekly_updates_for_current_stage)
+                        # End date remains the latest known end for the current stage
+                        if weekly_updates_for_current_stage.count() > 1:
+                            split_date = max(update.week_end_date for update in weekly_updates_for_current_stage)
                         else:
-                            # No weekly updates yet; fall back to stage object's dates
-                            earliest_start = current_stage_obj.start_date
                             split_date = current_stage_obj.end_date
-                            current_stage_duration = (split_date - earliest_start).days + 1
+                        current_stage_duration = (split_date - earliest_start).days + 1
+                    else:
+                        # No weekly updates yet; fall back to stage object's dates
+                        earliest_start = current_stage_obj.start_date
+                        split_date = current_stage_obj.end_date
+                        current_stage_duration = (split_date - earliest_start).days + 1
 
-                        # Override start with the very first weekly update's start for the demand, if any
-                        first_weekly_update = demand.weekly_updates.order_by('week_number', 'week_start_date').first()
-                        if first_weekly_update and first_weekly_update.week_start_date:
-                            overall_start = first_weekly_update.week_start_date
-                        else:
-                            overall_start = earliest_start
-                        overall_duration = (split_date - overall_start).days + 1
-                        
-                        # Calculate position of the split point within the timeline
-                        split_year = split_date.year
-                        split_month = split_date.month
-                        split_day = split_date.day
-                        
-                        year_diff_split = split_year - 2025
-                        month_position_split = (split_month - 1) * (20/12)
-                        day_position_split = (split_day - 1) * (20/12/30)
-                        split_pos = (year_diff_split * 20) + month_position_split + day_position_split
-                        
-                        # Create two segments for the mini progress bar
-                        # Segment 1: Colored portion from demand start to current stage end
-                        segment1_width = split_pos - start_pos
-                        if segment1_width > 0:
-                            # Ensure minimum width for segment 1
-                            if segment1_width < 1.0:  # At least 1% of timeline
-                                segment1_width = 1.0
-                            stage_bars.append({
-                                'id': f"{s.id}_colored",
-                                'stage': 'mini_progress_colored',
-                                'stage_number': STAGE_ORDER.get(current_stage, 0),
-                                'stage_verbose': stage_verbose,
-                                'color': stage_color,
-                                'start_percent': start_pos,
-                                'width_percent': segment1_width,
-                                'relative_start_percent': stage_relative_start,
-                                'relative_width_percent': stage_relative_width * (segment1_width / width),
-                                'duration': overall_duration,
-                                'start_date': overall_start.strftime('%Y-%m-%d'),
-                                'end_date': split_date.strftime('%Y-%m-%d'),
-                                'start_year': start_year,
-                                'start_month': start_month,
-                                'start_quarter': start_quarter,
-                                'end_year': split_year,
-                                'end_month': split_month,
-                                'end_quarter': (split_month - 1) // 3,
-                                'quarter_start_pos': start_pos,
-                                'quarter_end_pos': split_pos,
-                                'quarter_width': segment1_width,
-                                'number': STAGE_ORDER.get(current_stage, 0),
-                                'should_show_number': should_show_number
-                            })
-                        
-                        # Segment 2: Dark grey portion from current stage end to demand end
-                        segment2_width = end_pos - split_pos
-                        if segment2_width > 0:
-                            # Ensure minimum width for segment 2
-                            if segment2_width < 1.0:  # At least 1% of timeline
-                                segment2_width = 1.0
-                            # Calculate the start position for the second segment
-                            segment2_start_percent = stage_start_percent + (stage_width_percent * (segment1_width / width))
-                            segment2_relative_start = stage_relative_start + (stage_relative_width * (segment1_width / width))
-                            
-                            stage_bars.append({
-                                'id': f"{s.id}_grey",
-                                'stage': 'mini_progress_grey',
-                                'stage_number': None,
-                                'stage_verbose': "Remaining Duration",
-                                'color': '#444444',  # Dark grey
-                                'start_percent': split_pos,
-                                'width_percent': segment2_width,
-                                'relative_start_percent': segment2_relative_start,
-                                'relative_width_percent': stage_relative_width * (segment2_width / width),
-                                'duration': (s.end_date - split_date).days,
-                                'start_date': split_date.strftime('%Y-%m-%d'),
-                                'end_date': s.end_date.strftime('%Y-%m-%d'),
-                                'start_year': split_year,
-                                'start_month': split_month,
-                                'start_quarter': (split_month - 1) // 3,
-                                'end_year': end_year,
-                                'end_month': end_month,
-                                'end_quarter': end_quarter,
-                                'quarter_start_pos': split_pos,
-                                'quarter_end_pos': end_pos,
-                                'quarter_width': segment2_width,
-                                'number': None,
-                                'should_show_number': False
-                            })
+                    # Override start with the very first weekly update's start for the demand, if any
+                    first_weekly_update = demand.weekly_updates.order_by('week_number', 'week_start_date').first()
+                    if first_weekly_update and first_weekly_update.week_start_date:
+                        overall_start = first_weekly_update.week_start_date
                     else:
-                        # Fallback if current stage not found - use original behavior
-                        stage_bars.append({
-                            'id': s.id,
-                            'stage': s.stage,
-                            'stage_number': STAGE_ORDER.get(current_stage, 0),
-                            'stage_verbose': stage_verbose,
-                            'color': stage_color,
-                            'start_percent': start_pos,
-                            'width_percent': width,
-                            'relative_start_percent': stage_relative_start,
-                            'relative_width_percent': stage_relative_width,
-                            'duration': stage_duration,
-                            'start_date': s.start_date.strftime('%Y-%m-%d'),
-                            'end_date': s.end_date.strftime('%Y-%m-%d'),
-                            'start_year': start_year,
-                            'start_month': start_month,
-                            'start_quarter': start_quarter,
-                            'end_year': end_year,
-                            'end_month': end_month,
-                            'end_quarter': end_quarter,
-                            'quarter_start_pos': start_pos,
-                            'quarter_end_pos': end_pos,
-                            'quarter_width': width,
-                            'number': STAGE_ORDER.get(current_stage, 0),
-                            'should_show_number': should_show_number
-                        })
+                        overall_start = earliest_start
+                    overall_duration = (split_date - overall_start).days + 1
+
+                    # Calculate position of the split point within the timeline
+                    split_year = split_date.year
+                    split_month = split_date.month
+                    split_day = split_date.day
+
+                    year_diff_split = split_year - 2025
+                    month_position_split = (split_month - 1) * (20/12)
+                    day_position_split = (split_day - 1) * (20/12/30)
+                    split_pos = (year_diff_split * 20) + month_position_split + day_position_split
+
+                    # Create two segments for the mini progress bar
+                    # Segment 1: Colored portion from demand start to current stage end
+                    segment1_width = split_pos - start_pos
+                    if segment1_width > 0:
+                        # Ensure minimum width for segment 1
+                        if segment1_width < 1.0:  # At least 1% of timeline
+                            segment1_width = 1.0
+                        stage_bars.append(StageBar(
+                            id=f"{s.id}_colored",
+                            stage='mini_progress_colored',
+                            stage_number=catalog.numbers.get(current_stage, 0),
+                            stage_verbose=stage_verbose,
+                            color=stage_color,
+                            start_percent=start_pos,
+                            width_percent=segment1_width,
+                            relative_start_percent=stage_relative_start,
+                            relative_width_percent=stage_relative_width * (segment1_width / width),
+                            duration=overall_duration,
+                            start=overall_start,
+                            end=split_date,
+                            span_start=span_start,
+                            span_end=split_date,
+                            quarter_start_pos=start_pos,
+                            quarter_end_pos=split_pos,
+                            quarter_width=segment1_width,
+                            number=catalog.numbers.get(current_stage, 0),
+                            should_show_number=should_show_number,
+                        ))
+
+                    # Segment 2: Dark grey portion from current stage end to demand end
+                    segment2_width = end_pos - split_pos
+                    if segment2_width > 0:
+                        # Ensure minimum width for segment 2
+                        if segment2_width < 1.0:  # At least 1% of timeline
+                            segment2_width = 1.0
+                        # Calculate the start position for the second segment
+                        segment2_start_percent = stage_start_percent + (stage_width_percent * (segment1_width / width))
+                        segment2_relative_start = stage_relative_start + (stage_relative_width * (segment1_width / width))
+
+                        stage_bars.append(StageBar(
+                            id=f"{s.id}_grey",
+                            stage='mini_progress_grey',
+                            stage_number=None,
+                            stage_verbose="Remaining Duration",
+                            color='#444444',  # Dark grey,
+                            start_percent=split_pos,
+                            width_percent=segment2_width,
+                            relative_start_percent=segment2_relative_start,
+                            relative_width_percent=stage_relative_width * (segment2_width / width),
+                            duration=(s.end_date - split_date).days,
+                            start=split_date,
+                            end=s.end_date,
+                            span_start=split_date,
+                            span_end=span_end,
+                            quarter_start_pos=split_pos,
+                            quarter_end_pos=end_pos,
+                            quarter_width=segment2_width,
+                            number=None,
+                            should_show_number=False,
+                        ))
                 else:
-                    # Default mini progress bar appearance (no current stage)
-                    stage_verbose = "Duration"
-                    stage_color = '#444444'  # Dark gray
-                    should_show_number = False
-                    
-                    stage_bars.append({
-                        'id': s.id,
-                        'stage': s.stage,
-                        'stage_number': 0,
-                        'stage_verbose': stage_verbose,
-                        'color': stage_color,
-                        'start_percent': start_pos,
-                        'width_percent': width,
-                        'relative_start_percent': stage_relative_start,
-                        'relative_width_percent': stage_relative_width,
-                        'duration': stage_duration,
-                        'start_date': s.start_date.strftime('%Y-%m-%d'),
-                        'end_date': s.end_date.strftime('%Y-%m-%d'),
-                        'start_year': start_year,
-                        'start_month': start_month,
-                        'start_quarter': start_quarter,
-                        'end_year': end_year,
-                        'end_month': end_month,
-                        'end_quarter': end_quarter,
-                        'quarter_start_pos': start_pos,
-                        'quarter_end_pos': end_pos,
-                        'quarter_width': width,
-                        'number': 0,
-                        'should_show_number': should_show_number
-                    })
+                    # Fallback if current stage not found - use original behavior
+                    stage_bars.append(StageBar(
+                        id=s.id,
+                        stage=s.stage,
+                        stage_number=catalog.numbers.get(current_stage, 0),
+                        stage_verbose=stage_verbose,
+                        color=stage_color,
+                        start_percent=start_pos,
+                        width_percent=width,
+                        relative_start_percent=stage_relative_start,
+                        relative_width_percent=stage_relative_width,
+                        duration=stage_duration,
+                        start=s.start_date,
+                        end=s.end_date,
+                        span_start=span_start,
+                        span_end=span_end,
+                        quarter_start_pos=start_pos,
+                        quarter_end_pos=end_pos,
+                        quarter_width=width,
+                        number=catalog.numbers.get(current_stage, 0),
+                        should_show_number=should_show_number,
+                    ))
             else:
-                stage_verbose = Stage(s.stage).label
-                
-                stage_bars.append({
-                    'id': s.id,
-                    'stage': s.stage,
-                    'stage_number': stage_number,
-                    'stage_verbose': stage_verbose,
-                    'color': stage_color,
-                    'start_percent': stage_start_percent,
-                    'width_percent': stage_width_percent,
-                    'relative_start_percent': stage_relative_start,
-                    'relative_width_percent': stage_relative_width,
-                    'duration': stage_duration,
-                    'start_date': s.start_date.strftime('%Y-%m-%d'),
-                    'end_date': s.end_date.strftime('%Y-%m-%d'),
-                    'start_year': start_year,
-                    'start_month': start_month,
-                    'start_quarter': start_quarter,
-                    'end_year': end_year,
-                    'end_month': end_month,
-                    'end_quarter': end_quarter,
-                    'quarter_start_pos': start_pos,
-                    'quarter_end_pos': end_pos,
-                    'quarter_width': width,
-                    'number': stage_number,
-                    'should_show_number': should_show_number
-                })
-        
-        stage_bars.sort(key=lambda x: x['start_date'])
-        
-        # === Create Stage Detail Boxes (exactly 26 boxes for stage numbers 0-25) ===
-        stage_detail_boxes = []
-        
-        # Get the latest weekly update to check for current_stage
-        latest_weekly_update = WeeklyUpdate.objects.filter(demand=demand).order_by('-week_number').first()
-        weekly_current_stage = latest_weekly_update.current_stage if latest_weekly_update else None
-        
-        for stage_num in range(26):
-            # Look for the stage in the database first to get accurate data
-            stage_name = None
-            for stage_key, number in STAGE_ORDER.items():
-                if number == stage_num:
-                    stage_name = stage_key
-                    break
-            
-            # Find the stage object in the database
-            stage_obj = demand.stages.filter(stage=stage_name).exclude(stage='mini_progress').first()
-            
-            if stage_obj:
-                # Check if there are multiple weekly updates for this stage
-                weekly_updates_for_stage = demand.weekly_updates.filter(current_stage=stage_name).order_by('week_start_date')
-                
-                if weekly_updates_for_stage.count() > 1:
-                    # Multiple weekly updates exist for this stage - calculate total duration
-                    earliest_start = min(update.week_start_date for update in weekly_updates_for_stage)
-                    latest_end = max(update.week_end_date for update in weekly_updates_for_stage)
-                    total_duration = (latest_end - earliest_start).days + 1
-                    
-                    stage_detail_boxes.append({
-                        'number': stage_num,
-                        'duration': total_duration,
-                        'duration_text': f"{total_duration}d",
-                        'color': STAGE_COLORS.get(stage_name, '#888'),
-                        'id': stage_obj.id,
-                        'stage_name': Stage(stage_name).label,
-                        'start_date': earliest_start.strftime('%Y-%m-%d'),
-                        'end_date': latest_end.strftime('%Y-%m-%d'),
-                        'has_data': True
-                    })
-                else:
-                    # Single weekly update or no weekly updates - use the stage object duration
-                    stage_detail_boxes.append({
-                        'number': stage_num,
-                        'duration': stage_obj.duration_in_days(),
-                        'duration_text': f"{stage_obj.duration_in_days()}d",
-                        'color': STAGE_COLORS.get(stage_name, '#888'),
-                        'id': stage_obj.id,
-                        'stage_name': Stage(stage_name).label,
-                        'start_date': stage_obj.start_date.strftime('%Y-%m-%d'),
-                        'end_date': stage_obj.end_date.strftime('%Y-%m-%d'),
-                        'has_data': True
-                    })
+                # Default mini progress bar appearance (no current stage)
+                stage_verbose = "Duration"
+                stage_color = '#444444'  # Dark gray
+                should_show_number = False
+
+                stage_bars.append(StageBar(
+                    id=s.id,
+                    stage=s.stage,
+                    stage_number=0,
+                    stage_verbose=stage_verbose,
+                    color=stage_color,
+                    start_percent=start_pos,
+                    width_percent=width,
+                    relative_start_percent=stage_relative_start,
+                    relative_width_percent=stage_relative_width,
+                    duration=stage_duration,
+                    start=s.start_date,
+                    end=s.end_date,
+                    span_start=span_start,
+                    span_end=span_end,
+                    quarter_start_pos=start_pos,
+                    quarter_end_pos=end_pos,
+                    quarter_width=width,
+                    number=0,
+                    should_show_number=should_show_number,
+                ))
+        else:
+            stage_verbose = catalog.labels[s.stage]
+
+            stage_bars.append(StageBar(
+                id=s.id,
+                stage=s.stage,
+                stage_number=stage_number,
+                stage_verbose=stage_verbose,
+                color=stage_color,
+                start_percent=stage_start_percent,
+                width_percent=stage_width_percent,
+                relative_start_percent=stage_relative_start,
+                relative_width_percent=stage_relative_width,
+                duration=stage_duration,
+                start=s.start_date,
+                end=s.end_date,
+                span_start=span_start,
+                span_end=span_end,
+                quarter_start_pos=start_pos,
+                quarter_end_pos=end_pos,
+                quarter_width=width,
+                number=stage_number,
+                should_show_number=should_show_number,
+            ))
+
+    stage_bars.sort(key=lambda x: x.start)
+
+    # === Create Stage Detail Boxes (exactly 26 boxes for stage numbers 0-25) ===
+    stage_detail_boxes = []
+
+    # Get the latest weekly update to check for current_stage
+    latest_weekly_update = WeeklyUpdate.objects.filter(demand=demand).defer(*WeeklyUpdate.FULL_TEXT_FIELDS).order_by('-week_number').first()
+    weekly_current_stage = latest_weekly_update.current_stage if latest_weekly_update else None
+
+    # Index the prefetched stages by their stored stage number
+    stages_by_number = {s.stage_number: s for s in stages if s.stage_number is not None}
+
+    for stage_num in range(26):
+        stage_name = catalog.stage_for_number(stage_num)
+
+        # Find the stage object for this number
+        stage_obj = stages_by_number.get(stage_num)
+
+        if stage_obj:
+            # Check if there are multiple weekly updates for this stage
+            weekly_updates_for_stage = demand.weekly_updates.filter(current_stage=stage_name).order_by('week_start_date')
+
+            if weekly_updates_for_stage.count() > 1:
+                # Multiple weekly updates exist for this stage - calculate total duration
+                earliest_start = min(update.week_start_date for update in weekly_updates_for_stage)
+                latest_end = max(update.week_end_date for update in weekly_updates_for_stage)
+                total_duration = (latest_end - earliest_start).days + 1
+
+                stage_detail_boxes.append(DetailBox(
+                    stage_num, total_duration, catalog.colors.get(stage_name, '#888'), stage_obj.id,
+                    catalog.labels[stage_name], earliest_start, latest_end, True,
+                ))
             else:
-                # Check if this stage was selected when creating the demand
-                if stage_name and stage_name in demand.selected_stages:
-                    # Stage was selected but no data yet
-                    stage_detail_boxes.append({
-                        'number': stage_num,
-                        'duration': 0,
-                        'duration_text': '0d',
-                        'color': '#ddd',
-                        'id': None,
-                        'stage_name': f'(Not Set)',
-                        'start_date': '',
-                        'end_date': '',
-                        'has_data': False
-                    })
-                else:
-                    # Stage was not selected - show N/A
-                    stage_detail_boxes.append({
-                        'number': stage_num,
-                        'duration': 0,
-                        'duration_text': 'N/A',
-                        'color': '#ddd',
-                        'id': None,
-                        'stage_name': 'N/A',
-                        'start_date': '',
-                        'end_date': '',
-                        'has_data': False
-                    })
-        
-        demand_position = {
-            'start_percent': demand_start_percent,
-            'width_percent': demand_width_percent,
-            'start_date': demand_start.strftime('%Y-%m-%d'),
-            'end_date': demand_end.strftime('%Y-%m-%d'),
-            'duration_days': demand_duration_days
-        }
-        
-        # Get only the latest weekly update for this demand
-        latest_weekly_update = WeeklyUpdate.objects.filter(demand=demand).order_by('-week_number').first()
-        
-        demand_data.append({
-            'demand': demand, 
-            'stages': stage_bars,
-            'stage_detail_boxes': stage_detail_boxes,
-            'position': demand_position,
-            'latest_weekly_update': latest_weekly_update,
-            'total_weekly_updates': WeeklyUpdate.objects.filter(demand=demand).count()
-        })
+                # Single weekly update or no weekly updates - use the stage object duration
+                stage_detail_boxes.append(DetailBox(
+                    stage_num, stage_obj.duration_in_days(), catalog.colors.get(stage_name, '#888'), stage_obj.id,
+                    catalog.labels[stage_name], stage_obj.start_date, stage_obj.end_date, True,
+                ))
+        else:
+            # Stage was selected but has no data yet ('(Not Set)'), or wasn't selected ('N/A')
+            stage_detail_boxes.append(empty_detail_box(stage_num, bool(stage_name and demand.has_stage(stage_name))))
 
-    # === Stage Legend ===
-    stage_legend = []
-    # Make sure we create entries for ALL possible stages, in order
-    for stage_key, number in sorted(STAGE_ORDER.items(), key=lambda x: x[1]):
-        label = Stage(stage_key).label
-        color = STAGE_COLORS.get(stage_key, '#888')
-        stage_legend.append({'number': number, 'label': label, 'color': color})
-        # print(f"Added stage: {number}. {label} with color {color}")
-    
-    # Ensure we have all stages (debug check)
-    print(f"Generated {len(stage_legend)} stage legend entries")
+    demand_position = DemandPosition(
+        demand_start_percent, demand_width_percent, demand_start, demand_end, demand_duration_days,
+    )
 
-    # === File Type Summary ===
-    file_type_summary = []
-    file_types = ['CASH', 'GEM', 'LPC']  # Order as requested
-    
-    for file_type in file_types:
-        count = Demand.objects.filter(file_type=file_type).count()
-        file_type_summary.append({
-            'type': file_type,
-            'count': count
-        })
+    # Get only the latest weekly update for this demand
+    latest_weekly_update = WeeklyUpdate.objects.filter(demand=demand).defer(*WeeklyUpdate.FULL_TEXT_FIELDS).order_by('-week_number').first()
+
+    return {
+        'demand': demand, 
+        'stages': stage_bars,
+        'stage_detail_boxes': stage_detail_boxes,
+        'gantt': gantt.demand_gantt(
+            demand.id, stage_bars, stage_detail_boxes, demand_current_stages.get(str(demand.id)),
+        ),
+        'position': demand_position,
+        'latest_weekly_update': latest_weekly_update,
+        'total_weekly_updates': WeeklyUpdate.objects.filter(demand=demand).count()
+    }
 
-    return render(request, 'trackerapp/demand_list.html', {
-        'demand_data': demand_data,
-        'stage_legend': stage_legend,
-        'timeline_markers': quarter_markers,
-        'month_markers': month_markers,
-        'timeline_years': timeline_years,
-        'global_timeline_start': global_timeline_start.strftime('%Y-%m-%d'),
-        'global_timeline_end': global_timeline_end.strftime('%Y-%m-%d'),
-        'file_type_summary': file_type_summary,
-    })
 
 def add_demand(request):
     if request.method == "POST":
@@ -734,17 +793,17 @@ def update_stage(request):
             new_stage = form.cleaned_data['stage']
             
             # Get the stage number for the new stage
-            new_stage_number = STAGE_ORDER.get(new_stage, -1)
+            new_stage_number = get_stage_catalog().numbers.get(new_stage, -1)
             
-            # Get existing stages for this demand
-            existing_stages = DemandStagePeriod.objects.filter(demand=demand).exclude(stage='mini_progress')
-            existing_stage_numbers = [STAGE_ORDER.get(s.stage, -1) for s in existing_stages]
+            # Get the furthest stage number reached by this demand (mini_progress has no number)
+            max_existing_number = DemandStagePeriod.objects.filter(
+                demand=demand, stage_number__isnull=False
+            ).aggregate(max_number=models.Max('stage_number'))['max_number']
             
             # Check if this is the first stage (should be 0) or follows the sequence
             valid_sequence = True
-            if existing_stages.exists():
+            if max_existing_number is not None:
                 # If there are existing stages, the new one should be the next in sequence
-                max_existing_number = max(existing_stage_numbers)
                 if new_stage_number != max_existing_number + 1:
                     valid_sequence = False
                     error_message = f"Invalid stage sequence. Expected stage {max_existing_number + 1}, but got {new_stage_number}."
@@ -822,16 +881,14 @@ def update_stage(request):
     else:
         form = DemandStagePeriodForm()
     
-    # Prepare stage reference with numbering
-    stage_order = {}
-    for stage_key, number in sorted(STAGE_ORDER.items(), key=lambda x: x[1]):
-        stage_order[Stage(stage_key)] = number
+    # Stage reference with numbering
+    catalog = get_stage_catalog()
         
     return render(request, 'trackerapp/update_stage.html', {
         'form': form,
-        'stage_order': stage_order,
+        'stage_order': catalog.numbers,
         'error_message': error_message,
-        'stage_colors': STAGE_COLORS,
+        'stage_colors': catalog.colors,
     })
 
 def edit_stage_dates(request):
@@ -865,9 +922,6 @@ def edit_stage_dates(request):
 def update_weekly_dates(request):
     """Handle AJAX request to update weekly start and end dates for a demand"""
     if request.method == 'POST' and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        from django.http import JsonResponse
-        from django.views.decorators.csrf import csrf_exempt
-        
         try:
             demand_id = request.POST.get('demand_id')
             weekly_start_date = request.POST.get('weekly_start_date')
@@ -902,9 +956,6 @@ def update_weekly_dates(request):
 def update_weekly_stage(request):
     """Handle AJAX request to update weekly stage for a demand"""
     if request.method == 'POST' and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        from django.http import JsonResponse
-        from django.views.decorators.csrf import csrf_exempt
-        
         try:
             demand_id = request.POST.get('demand_id')
             weekly_update_stage = request.POST.get('weekly_update_stage')
@@ -928,9 +979,6 @@ def update_weekly_stage(request):
 def update_weekly_progress(request):
     """Handle AJAX request to update weekly progress for a demand"""
     if request.method == 'POST' and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        from django.http import JsonResponse
-        from django.views.decorators.csrf import csrf_exempt
-        
         try:
             demand_id = request.POST.get('demand_id')
             weekly_update_progress = request.POST.get('weekly_update_progress')
@@ -954,9 +1002,6 @@ def update_weekly_progress(request):
 def update_weekly_challenge(request):
     """Handle AJAX request to update weekly challenge for a demand"""
     if request.method == 'POST' and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        from django.http import JsonResponse
-        from django.views.decorators.csrf import csrf_exempt
-        
         try:
             demand_id = request.POST.get('demand_id')
             weekly_update_challenge = request.POST.get('weekly_update_challenge')
@@ -1168,6 +1213,20 @@ def delete_weekly_update(request, update_id):
         'demand': weekly_update.demand
     })
 
+def weekly_update_text(request, update_id):
+    """Full text of a weekly update, fetched when a dashboard row's "View More" is first clicked"""
+    weekly_update = get_object_or_404(WeeklyUpdate.objects.only('id', *WeeklyUpdate.FULL_TEXT_FIELDS), id=update_id)
+    return JsonResponse(_weekly_update_text(weekly_update))
+
+
+def _weekly_update_text(weekly_update):
+    return {
+        'success': True,
+        'id': weekly_update.id,
+        **{field: getattr(weekly_update, field) or '' for field in WeeklyUpdate.FULL_TEXT_FIELDS},
+    }
+
+
 def weekly_summary(request):
     """View for overall weekly summary across all demands"""
     # Get all demands for the dropdown
@@ -1225,7 +1284,10 @@ def debug_demand_stages(request, demand_id):
     
     demand = get_object_or_404(Demand, id=demand_id)
     
-    debug_info = {
+    return JsonResponse(_debug_stage_info(demand))
+
+def _debug_stage_info(demand):
+    return {
         'demand_id': demand.id,
         'demand_name': demand.name,
         'selected_stages': demand.selected_stages,
@@ -1233,5 +1295,358 @@ def debug_demand_stages(request, demand_id):
         'all_stage_choices': list(Stage.choices),
         'stage_values': list(Stage.values),
     }
-    
-    return JsonResponse(debug_info)
\ No newline at end of file
+
+
+def portfolio_snapshot(request):
+    """JSON view of every demand's stage as of ?date=YYYY-MM-DD (defaults to today)"""
+    date_str = request.GET.get('date')
+    try:
+        on_date = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else date.today()
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid date format'}, status=400)
+
+    return JsonResponse(_snapshot_payload(on_date, _snapshot_rows(on_date)))
+
+def _snapshot_rows(on_date):
+    return Demand.objects.with_stage_on(on_date).order_by('name').values('id', 'name', 'file_type', 'stage_on_date')
+
+def _snapshot_payload(on_date, demands):
+    catalog = get_stage_catalog()
+    return {
+        'success': True,
+        'date': on_date.strftime('%Y-%m-%d'),
+        'demands': [
+            {
+                'demand_id': d['id'],
+                'demand_name': d['name'],
+                'file_type': d['file_type'],
+                'stage': d['stage_on_date'],
+                'stage_number': catalog.numbers.get(d['stage_on_date']),
+            }
+            for d in demands
+        ],
+    }
+
+def _trend_data(file_type):
+    """Week-by-stage demand counts and amounts, read only from the WeeklyRollup table"""
+    return _group_trend_rows(_trend_rows(file_type))
+
+def _trend_rows(file_type):
+    rollups = WeeklyRollup.objects.all()
+    if file_type and file_type != 'all':
+        rollups = rollups.filter(file_type=file_type)
+
+    return (
+        rollups.values('week_start_date', 'stage', 'stage_number')
+        .annotate(demands=models.Sum('demand_count'), amount=models.Sum('total_amount'))
+        .order_by('week_start_date', 'stage_number')
+    )
+
+def _group_trend_rows(rows):
+    catalog = get_stage_catalog()
+    weeks = {}
+    stage_numbers = set()
+    for row in rows:
+        week = weeks.setdefault(row['week_start_date'], {})
+        week[row['stage_number']] = (row['demands'], row['amount'])
+        stage_numbers.add(row['stage_number'])
+
+    stages = [catalog.legend[number] for number in sorted(stage_numbers) if number is not None]
+    return [
+        {
+            'week_start_date': week_start_date,
+            'total_demands': sum(demands for demands, _ in by_stage.values()),
+            'total_amount': sum(amount for _, amount in by_stage.values()),
+            'stages': [
+                {
+                    'number': stage.number,
+                    'label': stage.label,
+                    'color': stage.color,
+                    'demands': by_stage.get(stage.number, (0, 0))[0],
+                    'amount': by_stage.get(stage.number, (0, 0))[1],
+                }
+                for stage in stages
+            ],
+        }
+        for week_start_date, by_stage in weeks.items()
+    ], stages
+
+def trends(request):
+    """Portfolio trend page: demands and amounts per stage for each week"""
+    file_type = request.GET.get('file_type', 'all')
+    weeks, stages = _trend_data(file_type)
+
+    max_demands = max((week['total_demands'] for week in weeks), default=0)
+    for week in weeks:
+        for stage in week['stages']:
+            stage['width_percent'] = (stage['demands'] / max_demands * 100) if max_demands else 0
+
+    return render(request, 'trackerapp/trends.html', {
+        'weeks': weeks,
+        'stages': stages,
+        'file_type': file_type,
+        'file_types': ['CASH', 'GEM', 'LPC'],
+    })
+
+def trends_data(request):
+    """JSON version of the trends page for charts"""
+    file_type = request.GET.get('file_type', 'all')
+    weeks, stages = _trend_data(file_type)
+
+    return JsonResponse(_trends_payload(file_type, weeks, stages))
+
+def _trends_payload(file_type, weeks, stages):
+    return {
+        'file_type': file_type,
+        'stages': [stage._asdict() for stage in stages],
+        'weeks': [
+            {
+                'week_start_date': week['week_start_date'].strftime('%Y-%m-%d'),
+                'total_demands': week['total_demands'],
+                'total_amount': str(week['total_amount']),
+                'demands': [stage['demands'] for stage in week['stages']],
+                'amounts': [str(stage['amount']) for stage in week['stages']],
+            }
+            for week in weeks
+        ],
+    }
+
+def weekly_changes(request):
+    """What changed this week: stage advances, stalled demands, new challenges and stale demands"""
+    try:
+        stale_weeks = max(1, int(request.GET.get('weeks', 2)))
+    except ValueError:
+        stale_weeks = 2
+
+    report = reports.weekly_changes(stale_weeks)
+    return render(request, 'trackerapp/weekly_changes.html', {
+        'report': report,
+        'stale_weeks': stale_weeks,
+    })
+
+def portfolio_forecast(request):
+    """Forecast stage dates and completion for every active demand from stage duration stats"""
+    file_type = request.GET.get('file_type', 'all')
+    forecasts = forecast.portfolio_forecast()
+    if file_type != 'all':
+        forecasts = [f for f in forecasts if f['file_type'] == file_type]
+
+    return render(request, 'trackerapp/forecast.html', {
+        'forecasts': forecasts,
+        'late_count': sum(1 for f in forecasts if f['slip_days'] and f['slip_days'] > 0),
+        'file_type': file_type,
+        'file_types': ['CASH', 'GEM', 'LPC'],
+    })
+
+def portfolio_forecast_data(request):
+    """JSON version of the forecast page"""
+    file_type = request.GET.get('file_type', 'all')
+    return JsonResponse(_forecast_payload(file_type, forecast.portfolio_forecast()))
+
+def _forecast_payload(file_type, forecasts):
+    if file_type != 'all':
+        forecasts = [f for f in forecasts if f['file_type'] == file_type]
+
+    def iso(value):
+        return value.strftime('%Y-%m-%d') if value else None
+
+    return {
+        'file_type': file_type,
+        'demands': [
+            {
+                'demand_id': f['demand_id'],
+                'demand_name': f['demand_name'],
+                'current_stage': f['current_stage'],
+                'forecast_completion': iso(f['forecast_completion']),
+                'planned_end': iso(f['planned_end']),
+                'slip_days': f['slip_days'],
+                'stages': [
+                    {'stage': s['stage'], 'label': s['label'], 'start': iso(s['start']), 'end': iso(s['end'])}
+                    for s in f['stages']
+                ],
+            }
+            for f in forecasts
+        ],
+    }
+
+async def demand_events(request):
+    """Server-Sent Events stream of tracker changes for live dashboard updates
+
+    Under ASGI the stream stays open; under WSGI each request returns the pending
+    events and the browser reconnects, so serve mastertracker.asgi for live updates.
+    """
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_id = int(last_id)
+    except (TypeError, ValueError):
+        # New subscribers only want changes from now on
+        last_id = await events.latest_event_id()
+
+    response = StreamingHttpResponse(
+        events.stream(last_id, follow=isinstance(request, ASGIRequest)),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# Jobs the status page lets users start, with their button labels
+ENQUEUEABLE_JOBS = {
+    'rebuild_rollups': 'Rebuild weekly rollups',
+    'rebuild_stage_stats': 'Rebuild stage duration stats',
+    'warm_caches': 'Warm report caches',
+    'publish_snapshots': 'Publish static snapshots',
+    'archive_demands': 'Archive finished demands',
+}
+
+def job_status(request):
+    """Background job status page: queue counts and the most recent jobs"""
+    counts = dict(Job.objects.order_by().values_list('status').annotate(total=models.Count('id')))
+    return render(request, 'trackerapp/jobs.html', {
+        'jobs': Job.objects.all()[:50],
+        'counts': [(label, counts.get(value, 0)) for value, label in Job.Status.choices],
+        'enqueueable_jobs': ENQUEUEABLE_JOBS,
+    })
+
+def enqueue_job(request):
+    """Queue one of ENQUEUEABLE_JOBS and return immediately"""
+    if request.method != 'POST':
+        return redirect('job_status')
+
+    task_name = request.POST.get('task')
+    if task_name not in ENQUEUEABLE_JOBS:
+        messages.error(request, 'Unknown job.')
+        return redirect('job_status')
+
+    job = jobs.enqueue(task_name)
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({'success': True, 'job_id': job.id, 'status_url': reverse('job_detail', args=[job.id])})
+
+    messages.success(request, f'Queued "{ENQUEUEABLE_JOBS[task_name]}" as job #{job.id}.')
+    return redirect('job_status')
+
+def job_detail(request, job_id):
+    """JSON status of one job, for polling from pages that enqueue work"""
+    job = get_object_or_404(Job, id=job_id)
+    return JsonResponse({
+        'id': job.id,
+        'task': job.task,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'result': job.result,
+        'error': job.error,
+    })
+
+# Demands per page of the archive
+ARCHIVE_PAGE_SIZE = 50
+
+def archived_demands(request):
+    """Archived demands, newest first, a page at a time; row details are computed only for the page shown"""
+    archived = Demand.objects.archived().order_by('-archived_at', '-id').only(
+        'id', 'name', 'demand_ID', 'file_type', 'file_subtype', 'demand_amount', 'start_date', 'duration_months', 'archived_at',
+    )
+    file_type = request.GET.get('file_type')
+    if file_type:
+        archived = archived.filter(file_type=file_type)
+    page = Paginator(archived, ARCHIVE_PAGE_SIZE).get_page(request.GET.get('page'))
+
+    demand_ids = [demand.id for demand in page]
+    update_counts = dict(
+        WeeklyUpdate.objects.filter(demand_id__in=demand_ids).order_by().values_list('demand_id').annotate(total=models.Count('id'))
+    )
+    last_stages = DemandStagePeriod.objects.filter(demand_id__in=demand_ids, stage_number__isnull=False).order_by()
+    last_stage_numbers = dict(last_stages.values_list('demand_id').annotate(number=models.Max('stage_number')))
+    last_dates = dict(last_stages.values_list('demand_id').annotate(end=models.Max('end_date')))
+
+    catalog = get_stage_catalog()
+    rows = []
+    for demand in page:
+        stage = catalog.stage_for_number(last_stage_numbers.get(demand.id, -1))
+        rows.append({
+            'demand': demand,
+            'end_date': demand.get_end_date() or last_dates.get(demand.id),
+            'last_stage': catalog.labels[stage] if stage else None,
+            'weekly_update_count': update_counts.get(demand.id, 0),
+        })
+
+    return render(request, 'trackerapp/archived_demands.html', {
+        'page': page,
+        'rows': rows,
+        'file_type': file_type or '',
+        'file_types': ['CASH', 'GEM', 'LPC'],
+    })
+
+def restore_demand(request, demand_id):
+    """Put an archived demand back on the dashboard"""
+    demand = get_object_or_404(Demand, id=demand_id)
+    if request.method == 'POST':
+        if archive.restore([demand.id]):
+            messages.success(request, f'Restored "{demand.name}" to the dashboard.')
+    return redirect('archived_demands')
+
+def bulk_demand_action(request):
+    """Apply one of bulk.ACTIONS to the demands selected on the dashboard
+
+    POST demand_ids (repeated), action, and the action's inputs: start_date/end_date
+    for advance_stage, file_type, file_subtype and/or file_detail for set_file_type. Answers JSON
+    with the changed ids and per-demand errors; non-AJAX posts redirect back.
+    """
+    if request.method != 'POST':
+        return redirect('demand_list')
+
+    action = request.POST.get('action')
+    try:
+        demand_ids = [int(demand_id) for demand_id in request.POST.getlist('demand_ids')]
+    except ValueError:
+        demand_ids = None
+    error = None
+    if action not in bulk.ACTIONS:
+        error = 'Unknown action'
+    elif not demand_ids:
+        error = 'No demands selected'
+
+    if error is None and action == 'advance_stage':
+        try:
+            start_date = datetime.strptime(request.POST.get('start_date', ''), '%Y-%m-%d').date()
+            end_date = datetime.strptime(request.POST.get('end_date', ''), '%Y-%m-%d').date()
+        except ValueError:
+            error = 'Invalid date format'
+        else:
+            if start_date > end_date:
+                error = 'Start date cannot be after end date'
+            else:
+                result = bulk.advance_stage(demand_ids, start_date, end_date)
+                # As update_stage does, remember the new current stage for demand_list
+                demand_current_stages = request.session.get('demand_current_stages', {})
+                for demand_id, stage in result.stages.items():
+                    demand_current_stages[str(demand_id)] = stage
+                request.session['demand_current_stages'] = demand_current_stages
+    elif error is None and action == 'set_file_type':
+        # Blank inputs leave the field as it is
+        fields = {
+            field: request.POST.get(field, '').strip()
+            for field in ('file_type', 'file_subtype', 'file_detail')
+            if request.POST.get(field, '').strip()
+        }
+        if not fields:
+            error = 'Nothing to change'
+        else:
+            result = bulk.set_file_type(demand_ids, **fields)
+    elif error is None and action == 'archive':
+        result = bulk.archive_demands(demand_ids)
+    elif error is None:
+        result = bulk.delete_demands(demand_ids)
+
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        if error:
+            return JsonResponse({'success': False, 'error': error}, status=400)
+        return JsonResponse({'success': True, **result.as_dict()})
+
+    if error:
+        messages.error(request, error)
+    else:
+        messages.success(request, f'{bulk.ACTIONS[action]}: {len(result.changed)} demands updated, {len(result.errors)} skipped.')
+    return redirect('demand_list')